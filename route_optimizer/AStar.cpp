@@ -0,0 +1,176 @@
+#include "graph.h"
+#include <cmath>
+#include <limits>
+#include <algorithm>
+#include <functional>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+static const double EARTH_RADIUS_M = 6371008.8;
+static const double DEG_TO_RAD = 3.14159265358979323846 / 180.0;
+
+double haversineMeters(double lat1, double lon1, double lat2, double lon2) {
+    double dlat = (lat2 - lat1) * DEG_TO_RAD;
+    double dlon = (lon2 - lon1) * DEG_TO_RAD;
+    double a = sin(dlat / 2) * sin(dlat / 2) +
+               cos(lat1 * DEG_TO_RAD) * cos(lat2 * DEG_TO_RAD) * sin(dlon / 2) * sin(dlon / 2);
+    return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)));
+}
+
+void RouteGraph::prepareSearch(SearchAlgorithm algorithm, const MetricWeights& metric) {
+    if (algorithm == SearchAlgorithm::ASTAR && (astar_scale < 0 || astar_metric != metric)) {
+        // The cheapest edge per metre of straight-line distance bounds every
+        // path, so scaling the remaining great-circle distance by it never
+        // overestimates. A zero-cost edge makes the bound zero.
+        double scale = INF;
+        for (size_t u = 0; u + 1 < offsets.size(); u++) {
+            for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+                const Node& a = nodes[u];
+                const Node& b = nodes[targets[e]];
+                double meters = haversineMeters(a.latitude, a.longitude, b.latitude, b.longitude);
+                if (meters > 0) scale = min(scale, edgeCost(e, metric) / meters);
+            }
+        }
+        astar_scale = scale == INF ? 0.0 : max(0.0, scale);
+        astar_metric = metric;
+    }
+    if (algorithm == SearchAlgorithm::ALT && (landmarks.empty() || landmark_metric != metric)) {
+        prepareLandmarks(landmark_count, metric);
+    }
+    if (algorithm == SearchAlgorithm::CH && (ch_rank.empty() || ch_metric != metric)) {
+        prepareContractionHierarchy(0, metric);
+    }
+}
+
+template <class Heuristic>
+void RouteGraph::goalDirectedSearch(SearchWorkspace& ws, int source, int target, Heuristic h,
+                                    const MetricWeights& metric, SearchStats& stats) const {
+    // A* keyed on distance + h(v); ws.distance still holds exact g values.
+    auto cmp = greater<pair<double, int>>();
+    ws.prepare(nodes.size());
+    ws.relax(source, 0.0, -1);
+    ws.heap.push_back({h(source), source});
+    stats.heap_pushes++;
+
+    while (!ws.heap.empty()) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        stats.heap_pops++;
+        int u = current.second;
+        double g = ws.distance[u];
+
+        if (current.first > g + h(u)) {
+            stats.stale_pops++;
+            continue;
+        }
+        stats.nodes_settled++;
+        if (u == target) break;
+
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int v = targets[e];
+            double new_dist = g + edgeCost(e, metric);
+            stats.edges_relaxed++;
+
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist + h(v), v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                stats.heap_pushes++;
+            }
+        }
+    }
+}
+
+void RouteGraph::astarSearch(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                             SearchStats& stats) const {
+    const Node& goal = nodes[target];
+    double scale = astar_scale;
+    goalDirectedSearch(ws, source, target, [&](int v) {
+        return scale * haversineMeters(nodes[v].latitude, nodes[v].longitude, goal.latitude, goal.longitude);
+    }, metric, stats);
+}
+
+void RouteGraph::altSearch(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                           SearchStats& stats) const {
+    // Triangle inequality over every landmark L:
+    //   d(v, t) >= d(L, t) - d(L, v)  and  d(v, t) >= d(v, L) - d(t, L).
+    // Landmarks that cannot reach (or be reached from) either node give no bound.
+    size_t k = landmarks.size();
+    const double* from_t = &landmark_from[target * k];
+    const double* to_t = &landmark_to[target * k];
+    goalDirectedSearch(ws, source, target, [&](int v) {
+        const double* from_v = &landmark_from[v * k];
+        const double* to_v = &landmark_to[v * k];
+        double bound = 0.0;
+        for (size_t l = 0; l < k; l++) {
+            if (from_t[l] != INF && from_v[l] != INF) bound = max(bound, from_t[l] - from_v[l]);
+            if (to_v[l] != INF && to_t[l] != INF) bound = max(bound, to_v[l] - to_t[l]);
+        }
+        return bound;
+    }, metric, stats);
+}
+
+vector<int> RouteGraph::landmarkIds() const {
+    vector<int> ids;
+    for (int l : landmarks) ids.push_back(nodes[l].id);
+    return ids;
+}
+
+vector<int> RouteGraph::prepareLandmarks(int count, const MetricWeights& metric) {
+    ensureFinalized();
+    landmark_count = count;
+    size_t n = nodes.size();
+    size_t k = (size_t)max(0, min<int>(count, (int)n));
+    landmarks.clear();
+    landmark_metric = metric;
+    landmark_from.assign(n * k, INF);
+    landmark_to.assign(n * k, INF);
+    if (k == 0) return {};
+
+    // Farthest selection: each new landmark is the node with the largest
+    // round-trip distance to its closest landmark so far. Nodes no landmark
+    // reaches count as infinitely far, so every component gets covered.
+    SearchWorkspace ws;
+    vector<double> closest(n, INF);
+    oneToAll(ws, 0, false, metric);
+    int next = 0;
+    for (size_t v = 0; v < n; v++) {
+        if (ws.distance[v] != INF && ws.distance[v] > ws.distance[next]) next = (int)v;
+    }
+
+    for (size_t l = 0; l < k; l++) {
+        landmarks.push_back(next);
+        oneToAll(ws, next, false, metric);
+        for (size_t v = 0; v < n; v++) landmark_from[v * k + l] = ws.distance[v];
+        oneToAll(ws, next, true, metric);
+        for (size_t v = 0; v < n; v++) landmark_to[v * k + l] = ws.distance[v];
+
+        next = -1;
+        for (size_t v = 0; v < n; v++) {
+            double round_trip = landmark_from[v * k + l] + landmark_to[v * k + l];
+            closest[v] = min(closest[v], round_trip);
+            bool taken = find(landmarks.begin(), landmarks.end(), (int)v) != landmarks.end();
+            if (!taken && (next < 0 || closest[v] > closest[next])) next = (int)v;
+        }
+        if (next < 0) break;
+    }
+
+    landmarks.shrink_to_fit();
+    vector<int> ids;
+    for (int l : landmarks) ids.push_back(nodes[l].id);
+    if (landmarks.size() < k) {
+        // Fewer distinct nodes than requested: compact the tables.
+        size_t used = landmarks.size();
+        vector<double> from(n * used), to(n * used);
+        for (size_t v = 0; v < n; v++) {
+            for (size_t l = 0; l < used; l++) {
+                from[v * used + l] = landmark_from[v * k + l];
+                to[v * used + l] = landmark_to[v * k + l];
+            }
+        }
+        landmark_from.swap(from);
+        landmark_to.swap(to);
+    }
+    return ids;
+}
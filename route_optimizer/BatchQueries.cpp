@@ -0,0 +1,87 @@
+#include "graph.h"
+#include "thread_pool.h"
+#include <limits>
+#include <algorithm>
+#include <chrono>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+
+void RouteGraph::distanceMatrix(const vector<int>& sources, const vector<int>& target_ids,
+                                const MetricWeights& metric, int threads, double* out) {
+    ensureFinalized();
+    size_t cols = target_ids.size();
+    fill(out, out + sources.size() * cols, INF);
+
+    // Unknown target ids keep their inf column and are left out of the search.
+    vector<int> dense_targets;
+    vector<size_t> columns;
+    for (size_t j = 0; j < cols; j++) {
+        int t = indexOf(target_ids[j]);
+        if (t < 0) continue;
+        dense_targets.push_back(t);
+        columns.push_back(j);
+    }
+    if (dense_targets.empty() || sources.empty()) return;
+
+    int workers = resolveThreadCount(threads, sources.size());
+    vector<SearchWorkspace> workspaces(workers);
+    vector<vector<double>> rows(workers, vector<double>(dense_targets.size()));
+    parallelFor(sources.size(), workers, [&](size_t i, int worker) {
+        int s = indexOf(sources[i]);
+        if (s < 0) return;
+        SearchStats stats;
+        vector<double>& row = rows[worker];
+        oneToMany(workspaces[worker], s, dense_targets, metric, row.data(), stats);
+        for (size_t j = 0; j < row.size(); j++) out[i * cols + columns[j]] = row[j];
+    });
+}
+
+void RouteGraph::findShortestPaths(const vector<pair<int, int>>& pairs, const MetricWeights& metric,
+                                   SearchAlgorithm algorithm, int threads, vector<double>& costs,
+                                   vector<long long>& offsets, vector<int>& ids, double prepared_seconds) {
+    auto started = chrono::steady_clock::now();
+    ensureFinalized();
+    // Landmarks or the hierarchy are built here, before any worker starts,
+    // so the workers only ever read shared state.
+    prepareSearch(algorithm, metric);
+    double prepare_seconds = prepared_seconds + chrono::duration<double>(chrono::steady_clock::now() - started).count();
+
+    size_t count = pairs.size();
+    costs.assign(count, INF);
+    vector<vector<int>> paths(count);
+    vector<SearchStats> stats(count);
+    int workers = resolveThreadCount(threads, count);
+    vector<SearchWorkspace> forward(workers), backward(workers);
+    parallelFor(count, workers, [&](size_t i, int worker) {
+        int s = indexOf(pairs[i].first);
+        int t = indexOf(pairs[i].second);
+        if (s < 0 || t < 0) return;
+        QueryKey key{pairs[i].first, pairs[i].second, metric};
+        CachedRoute cached;
+        if (cachedRoute(key, cached)) {
+            costs[i] = cached.cost;
+            paths[i].swap(cached.path);
+            stats[i].cache_hit = true;
+            return;
+        }
+        paths[i] = runQuery(forward[worker], backward[worker], s, t, algorithm, metric, stats[i], &costs[i]);
+        storeRoute(key, costs[i], paths[i]);
+    });
+
+    // The shared preparation is charged to the first query.
+    if (count > 0) {
+        stats[0].prepare_seconds = prepare_seconds;
+        stats[0].elapsed_seconds += prepare_seconds;
+    }
+    for (size_t i = 0; i < count; i++) recordQuery(pairs[i].first, pairs[i].second, stats[i]);
+
+    offsets.assign(count + 1, 0);
+    for (size_t i = 0; i < count; i++) offsets[i + 1] = offsets[i] + (long long)paths[i].size();
+    ids.clear();
+    ids.reserve(offsets[count]);
+    for (vector<int>& path : paths) {
+        ids.insert(ids.end(), path.begin(), path.end());
+        vector<int>().swap(path);
+    }
+}
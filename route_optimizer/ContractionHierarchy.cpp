@@ -0,0 +1,370 @@
+#include "graph.h"
+#include <limits>
+#include <algorithm>
+#include <functional>
+#include <queue>
+#include <random>
+#include <chrono>
+#include <cmath>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+
+// Witness searches give up after settling this many nodes; the cheaper limit
+// is used when only estimating a node's priority. Giving up early only means
+// an unneeded shortcut may be added, never a wrong distance.
+static const int WITNESS_SETTLE_LIMIT = 500;
+static const int ESTIMATE_SETTLE_LIMIT = 50;
+
+namespace {
+
+struct Arc {
+    int node;
+    double cost;
+    int edge;
+};
+
+// Remaining (not yet contracted) graph plus the hierarchy edges built so far.
+struct Contractor {
+    size_t n;
+    vector<vector<Arc>> out;
+    vector<vector<Arc>> in;
+    vector<char> contracted;
+    vector<int> deleted_neighbors;
+    SearchWorkspace ws;
+    vector<char> is_target;
+
+    vector<int> from, to, child1, child2;
+    vector<double> cost;
+    long long shortcuts = 0;
+
+    explicit Contractor(size_t n)
+        : n(n), out(n), in(n), contracted(n, 0), deleted_neighbors(n, 0), is_target(n, 0) {}
+
+    int newEdge(int u, int w, double c, int c1, int c2) {
+        from.push_back(u);
+        to.push_back(w);
+        cost.push_back(c);
+        child1.push_back(c1);
+        child2.push_back(c2);
+        return (int)from.size() - 1;
+    }
+
+    void addArc(int u, int w, double c, int edge) {
+        // Keep a single arc per (u, w): a cheaper edge replaces the old one.
+        for (Arc& a : out[u]) {
+            if (a.node != w) continue;
+            if (a.cost <= c) return;
+            a.cost = c;
+            a.edge = edge;
+            for (Arc& b : in[w]) {
+                if (b.node == u) { b.cost = c; b.edge = edge; }
+            }
+            return;
+        }
+        out[u].push_back({w, c, edge});
+        in[w].push_back({u, c, edge});
+    }
+
+    // Distances from source avoiding via, stopping once every node flagged
+    // in is_target (target_count of them) is settled or a limit is hit.
+    void witnessSearch(int source, int via, double max_cost, int target_count, int settle_limit) {
+        auto cmp = greater<pair<double, int>>();
+        ws.prepare(n);
+        ws.relax(source, 0.0, -1);
+        ws.heap.push_back({0.0, source});
+        int settled = 0;
+        int targets_left = target_count;
+
+        while (!ws.heap.empty()) {
+            pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+            auto current = ws.heap.back();
+            ws.heap.pop_back();
+            int u = current.second;
+            if (current.first > ws.distance[u]) continue;
+            if (current.first > max_cost || ++settled > settle_limit) break;
+            if (is_target[u] && --targets_left == 0) break;
+
+            for (const Arc& a : out[u]) {
+                if (a.node == via || contracted[a.node]) continue;
+                double new_dist = current.first + a.cost;
+                if (new_dist < ws.distance[a.node]) {
+                    ws.relax(a.node, new_dist, u);
+                    ws.heap.push_back({new_dist, a.node});
+                    push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                }
+            }
+        }
+    }
+
+    // Number of shortcuts contracting v needs; adds them when apply is set.
+    int contract(int v, bool apply) {
+        if (out[v].empty()) return 0;
+        double max_out = 0.0;
+        for (const Arc& a : out[v]) max_out = max(max_out, a.cost);
+
+        int needed = 0;
+        vector<Arc> incoming = in[v];
+        vector<Arc> outgoing = out[v];
+        for (const Arc& a : outgoing) is_target[a.node] = 1;
+        int limit = apply ? WITNESS_SETTLE_LIMIT : ESTIMATE_SETTLE_LIMIT;
+        for (const Arc& a_in : incoming) {
+            int u = a_in.node;
+            witnessSearch(u, v, a_in.cost + max_out, (int)outgoing.size(), limit);
+            for (const Arc& a_out : outgoing) {
+                int w = a_out.node;
+                if (w == u) continue;
+                double c = a_in.cost + a_out.cost;
+                if (ws.distance[w] <= c) continue;
+                needed++;
+                if (apply) {
+                    addArc(u, w, c, newEdge(u, w, c, a_in.edge, a_out.edge));
+                    shortcuts++;
+                }
+            }
+        }
+        for (const Arc& a : outgoing) is_target[a.node] = 0;
+        return needed;
+    }
+
+    long long priority(int v) {
+        long long removed = (long long)in[v].size() + (long long)out[v].size();
+        return contract(v, false) - removed + deleted_neighbors[v];
+    }
+
+    vector<int> removeNode(int v) {
+        vector<int> neighbors;
+        for (const Arc& a : in[v]) {
+            auto& arcs = out[a.node];
+            arcs.erase(remove_if(arcs.begin(), arcs.end(), [v](const Arc& b) { return b.node == v; }), arcs.end());
+            neighbors.push_back(a.node);
+        }
+        for (const Arc& a : out[v]) {
+            auto& arcs = in[a.node];
+            arcs.erase(remove_if(arcs.begin(), arcs.end(), [v](const Arc& b) { return b.node == v; }), arcs.end());
+            neighbors.push_back(a.node);
+        }
+        sort(neighbors.begin(), neighbors.end());
+        neighbors.erase(unique(neighbors.begin(), neighbors.end()), neighbors.end());
+        vector<Arc>().swap(in[v]);
+        vector<Arc>().swap(out[v]);
+        contracted[v] = 1;
+        return neighbors;
+    }
+};
+
+}  // namespace
+
+ContractionReport RouteGraph::prepareContractionHierarchy(int sample_queries, const MetricWeights& metric) {
+    ensureFinalized();
+    ContractionReport report;
+    auto started = chrono::steady_clock::now();
+    size_t n = nodes.size();
+    Contractor c(n);
+
+    // Seed with the original edges, keeping the cheapest of parallel edges
+    // and dropping self-loops, which never lie on a shortest path.
+    for (size_t u = 0; u < n; u++) {
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int v = targets[e];
+            if (v == (int)u) continue;
+            double cost = edgeCost(e, metric);
+            c.addArc((int)u, v, cost, c.newEdge((int)u, v, cost, -1, -1));
+        }
+    }
+    report.original_edges = (long long)c.from.size();
+
+    // Bottom-up contraction by edge difference. Queue entries whose priority
+    // no longer matches the node's current one are stale and skipped; a
+    // fresh entry is re-checked lazily before the node is contracted.
+    typedef pair<long long, int> Entry;
+    priority_queue<Entry, vector<Entry>, greater<Entry>> order;
+    vector<long long> current(n);
+    for (size_t v = 0; v < n; v++) {
+        current[v] = c.priority((int)v);
+        order.push({current[v], (int)v});
+    }
+
+    vector<int> rank(n, -1);
+    int next_rank = 0;
+    while (!order.empty()) {
+        Entry top = order.top();
+        int v = top.second;
+        order.pop();
+        if (c.contracted[v] || top.first != current[v]) continue;
+        long long p = c.priority(v);
+        if (p != current[v]) {
+            current[v] = p;
+            if (!order.empty() && p > order.top().first) {
+                order.push({p, v});
+                continue;
+            }
+        }
+        c.contract(v, true);
+        rank[v] = next_rank++;
+        // Neighbours only get the cheap deleted-neighbour bump here; their
+        // shortcut count is re-simulated when they reach the queue front.
+        for (int nb : c.removeNode(v)) {
+            c.deleted_neighbors[nb]++;
+            current[nb]++;
+            order.push({current[nb], nb});
+        }
+    }
+
+    ch_metric = metric;
+    ch_rank.swap(rank);
+    ch_from.swap(c.from);
+    ch_to.swap(c.to);
+    ch_cost.swap(c.cost);
+    ch_child1.swap(c.child1);
+    ch_child2.swap(c.child2);
+    report.shortcuts = c.shortcuts;
+
+    // Split the edges into the upward graph (searched from the source) and
+    // the downward graph reversed (searched from the target).
+    size_t m = ch_from.size();
+    ch_up_offsets.assign(n + 1, 0);
+    ch_down_offsets.assign(n + 1, 0);
+    for (size_t e = 0; e < m; e++) {
+        if (ch_rank[ch_to[e]] > ch_rank[ch_from[e]]) ch_up_offsets[ch_from[e] + 1]++;
+        else ch_down_offsets[ch_to[e] + 1]++;
+    }
+    for (size_t i = 0; i < n; i++) {
+        ch_up_offsets[i + 1] += ch_up_offsets[i];
+        ch_down_offsets[i + 1] += ch_down_offsets[i];
+    }
+    ch_up_edges.assign(ch_up_offsets[n], 0);
+    ch_down_edges.assign(ch_down_offsets[n], 0);
+    vector<int> up_cursor(ch_up_offsets.begin(), ch_up_offsets.end() - 1);
+    vector<int> down_cursor(ch_down_offsets.begin(), ch_down_offsets.end() - 1);
+    for (size_t e = 0; e < m; e++) {
+        if (ch_rank[ch_to[e]] > ch_rank[ch_from[e]]) ch_up_edges[up_cursor[ch_from[e]]++] = (int)e;
+        else ch_down_edges[down_cursor[ch_to[e]]++] = (int)e;
+    }
+    report.preprocessing_seconds = chrono::duration<double>(chrono::steady_clock::now() - started).count();
+
+    if (sample_queries > 0 && n > 0) {
+        mt19937 rng(42);
+        uniform_int_distribution<int> pick(0, (int)n - 1);
+        SearchWorkspace fwd, bwd;
+        for (int q = 0; q < sample_queries; q++) {
+            int s = pick(rng), t = pick(rng);
+            SearchStats plain, hierarchy;
+            double plain_cost = INF, ch_cost_value = INF;
+            runQuery(fwd, bwd, s, t, SearchAlgorithm::DIJKSTRA, metric, plain, &plain_cost);
+            runQuery(fwd, bwd, s, t, SearchAlgorithm::CH, metric, hierarchy, &ch_cost_value);
+            report.dijkstra_query_seconds += plain.elapsed_seconds;
+            report.ch_query_seconds += hierarchy.elapsed_seconds;
+            bool same = plain_cost == ch_cost_value ||
+                        fabs(plain_cost - ch_cost_value) <= 1e-9 * max(1.0, fabs(plain_cost));
+            if (!same) report.mismatches++;
+        }
+        report.sample_queries = sample_queries;
+        report.dijkstra_query_seconds /= sample_queries;
+        report.ch_query_seconds /= sample_queries;
+    }
+    return report;
+}
+
+vector<int> RouteGraph::chSearch(SearchWorkspace& fwd, SearchWorkspace& bwd, int source, int target,
+                                 SearchStats& stats, double* cost) const {
+    // Bidirectional search that only climbs in rank: forward over the up
+    // graph, backward over the reversed down graph. Predecessors hold the
+    // hierarchy edge each node was reached by.
+    auto cmp = greater<pair<double, int>>();
+    size_t n = nodes.size();
+    fwd.prepare(n);
+    bwd.prepare(n);
+    fwd.relax(source, 0.0, -1);
+    bwd.relax(target, 0.0, -1);
+    fwd.heap.push_back({0.0, source});
+    bwd.heap.push_back({0.0, target});
+    stats.heap_pushes += 2;
+    double best = INF;
+    int meet = -1;
+
+    while (!fwd.heap.empty() || !bwd.heap.empty()) {
+        bool forward = bwd.heap.empty() ||
+                       (!fwd.heap.empty() && fwd.heap.front().first <= bwd.heap.front().first);
+        SearchWorkspace& ws = forward ? fwd : bwd;
+        const SearchWorkspace& other = forward ? bwd : fwd;
+        if (ws.heap.front().first >= best) {
+            ws.heap.clear();
+            continue;
+        }
+
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        stats.heap_pops++;
+        int u = current.second;
+        if (current.first > ws.distance[u]) {
+            stats.stale_pops++;
+            continue;
+        }
+        stats.nodes_settled++;
+        if (current.first + other.distance[u] < best) {
+            best = current.first + other.distance[u];
+            meet = u;
+        }
+
+        // Stall on demand: if a higher-ranked node already reached in this
+        // direction gives u a shorter distance, u is not on a shortest
+        // up-down path and its edges need not be relaxed.
+        const FlatArray<int>& stall_off = forward ? ch_down_offsets : ch_up_offsets;
+        const FlatArray<int>& stall_list = forward ? ch_down_edges : ch_up_edges;
+        bool stalled = false;
+        for (int i = stall_off[u]; i < stall_off[u + 1] && !stalled; i++) {
+            int e = stall_list[i];
+            int w = forward ? ch_from[e] : ch_to[e];
+            stalled = ws.distance[w] + ch_cost[e] < current.first;
+        }
+        if (stalled) continue;
+
+        const FlatArray<int>& off = forward ? ch_up_offsets : ch_down_offsets;
+        const FlatArray<int>& list = forward ? ch_up_edges : ch_down_edges;
+        for (int i = off[u]; i < off[u + 1]; i++) {
+            int e = list[i];
+            int v = forward ? ch_to[e] : ch_from[e];
+            double new_dist = current.first + ch_cost[e];
+            stats.edges_relaxed++;
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, e);
+                ws.heap.push_back({new_dist, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                stats.heap_pushes++;
+            }
+        }
+    }
+
+    if (cost) *cost = best;
+    if (meet < 0) return {};
+    auto searched = chrono::steady_clock::now();
+
+    vector<int> chain;
+    for (int at = meet; at != source; at = ch_from[fwd.predecessor[at]]) chain.push_back(fwd.predecessor[at]);
+    reverse(chain.begin(), chain.end());
+    for (int at = meet; at != target; at = ch_to[bwd.predecessor[at]]) chain.push_back(bwd.predecessor[at]);
+
+    vector<int> path = {source};
+    for (int e : chain) unpackEdge(e, path);
+    for (int& v : path) v = nodes[v].id;
+    stats.path_seconds = chrono::duration<double>(chrono::steady_clock::now() - searched).count();
+    return path;
+}
+
+void RouteGraph::unpackEdge(int edge, vector<int>& path) const {
+    // Expand a hierarchy edge into original edges, appending the nodes after
+    // its tail in travel order.
+    vector<int> stack = {edge};
+    while (!stack.empty()) {
+        int e = stack.back();
+        stack.pop_back();
+        if (ch_child1[e] < 0) {
+            path.push_back(ch_to[e]);
+        } else {
+            stack.push_back(ch_child2[e]);
+            stack.push_back(ch_child1[e]);
+        }
+    }
+}
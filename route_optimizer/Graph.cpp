@@ -1,76 +1,476 @@
 #include "graph.h"
-#include <queue>
 #include <limits>
 #include <algorithm>
+#include <functional>
+#include <stdexcept>
+#include <chrono>
 #define _WIN32_WINNT 0x0601
 #include <string.h>
 using namespace std;
 
+static const double INF = numeric_limits<double>::infinity();
+
+void SearchWorkspace::prepare(size_t node_count) {
+    if (distance.size() != node_count) {
+        distance.assign(node_count, INF);
+        predecessor.assign(node_count, -1);
+        touched.clear();
+    } else {
+        reset();
+    }
+    heap.clear();
+}
+
+void SearchWorkspace::reset() {
+    for (int i : touched) {
+        distance[i] = INF;
+        predecessor[i] = -1;
+    }
+    touched.clear();
+}
+
+void SearchWorkspace::relax(int index, double dist, int pred) {
+    if (distance[index] == INF) touched.push_back(index);
+    distance[index] = dist;
+    predecessor[index] = pred;
+}
+
+long long SearchWorkspace::bytesReserved() const {
+    return (long long)(distance.capacity() * sizeof(double) + predecessor.capacity() * sizeof(int) +
+                       touched.capacity() * sizeof(int) + heap.capacity() * sizeof(pair<double, int>) +
+                       is_target.capacity());
+}
+
+void SearchStats::add(const SearchStats& other) {
+    nodes_settled += other.nodes_settled;
+    edges_relaxed += other.edges_relaxed;
+    heap_pushes += other.heap_pushes;
+    heap_pops += other.heap_pops;
+    stale_pops += other.stale_pops;
+    bytes_allocated += other.bytes_allocated;
+    cache_hit = cache_hit || other.cache_hit;
+    prepare_seconds += other.prepare_seconds;
+    search_seconds += other.search_seconds;
+    path_seconds += other.path_seconds;
+    elapsed_seconds += other.elapsed_seconds;
+}
+
+static double secondsSince(chrono::steady_clock::time_point started) {
+    return chrono::duration<double>(chrono::steady_clock::now() - started).count();
+}
+
 void RouteGraph::addNode(const Node& node) {
+    invalidateCache();
+    merge_index_valid = false;
+    spatial_index_valid = false;
+    auto it = id_to_index.find(node.id);
+    if (it != id_to_index.end()) {
+        nodes[it->second] = node;
+        return;
+    }
+    // A new node changes the dense index space, so the frozen arrays go stale.
+    if (finalized) thaw();
+    id_to_index[node.id] = (int)nodes.size();
     nodes.push_back(node);
 }
 
 void RouteGraph::addEdge(const Edge& edge) {
+    invalidateCache();
+    merge_index_valid = false;
+    if (finalized) thaw();
     edges.push_back(edge);
-    adjacency_list[edge.source].push_back(edge);
-}
-
-vector<int> RouteGraph::findShortestPath(int start, int end) {
-    priority_queue<pair<double, int>, vector<pair<double, int>>, greater<pair<double, int>>> pq;
-    map<int, double> distances;
-    map<int, int> previous;
-    
-    for (const auto& node : nodes) {
-        distances[node.id] = numeric_limits<double>::infinity();
-    }
-    distances[start] = 0;
-    pq.push({0, start});
-    
-    while (!pq.empty()) {
-        auto current = pq.top();
+}
+
+void RouteGraph::addNodes(const int* ids, const double* lats, const double* lons, size_t n) {
+    if (n == 0) return;
+    // Same as addNode per element, but the cache is cleared once for the
+    // whole batch and the arrays thawed at most once.
+    invalidateCache();
+    merge_index_valid = false;
+    spatial_index_valid = false;
+    nodes.reserve(nodes.size() + n);
+    id_to_index.reserve(id_to_index.size() + n);
+    for (size_t i = 0; i < n; i++) {
+        auto inserted = id_to_index.emplace(ids[i], (int)nodes.size());
+        if (!inserted.second) {
+            nodes[inserted.first->second] = Node(ids[i], lats[i], lons[i]);
+            continue;
+        }
+        if (finalized) thaw();
+        nodes.push_back(Node(ids[i], lats[i], lons[i]));
+    }
+}
+
+void RouteGraph::addEdges(const int* sources, const int* targets_, const double* times,
+                          const double* costs, const double* distances, const double* weights, size_t n) {
+    invalidateCache();
+    merge_index_valid = false;
+    if (finalized) thaw();
+    edges.reserve(edges.size() + n);
+    for (size_t i = 0; i < n; i++) {
+        edges.push_back(Edge(sources[i], targets_[i],
+                             weights ? weights[i] : 0.0,
+                             times[i],
+                             costs ? costs[i] : 0.0,
+                             distances ? distances[i] : 0.0));
+    }
+}
+
+void RouteGraph::copyNodes(int* ids, double* lats, double* lons) const {
+    for (size_t i = 0; i < nodes.size(); i++) {
+        ids[i] = nodes[i].id;
+        lats[i] = nodes[i].latitude;
+        lons[i] = nodes[i].longitude;
+    }
+}
+
+void RouteGraph::copyEdges(int* sources, int* targets_, double* weights, double* times,
+                           double* costs, double* distances) const {
+    if (!finalized) {
+        for (size_t e = 0; e < edges.size(); e++) {
+            sources[e] = edges[e].source;
+            targets_[e] = edges[e].target;
+            weights[e] = edges[e].weight;
+            times[e] = edges[e].time;
+            costs[e] = edges[e].cost;
+            distances[e] = edges[e].distance;
+        }
+        return;
+    }
+    for (size_t u = 0; u + 1 < offsets.size(); u++) {
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            sources[e] = nodes[u].id;
+            targets_[e] = nodes[targets[e]].id;
+            const double* metrics = &edge_metrics[(size_t)e * METRIC_COUNT];
+            weights[e] = metrics[METRIC_WEIGHT];
+            times[e] = metrics[METRIC_TIME];
+            costs[e] = metrics[METRIC_COST];
+            distances[e] = metrics[METRIC_DISTANCE];
+        }
+    }
+}
+
+int RouteGraph::indexOf(int id) const {
+    auto it = id_to_index.find(id);
+    return it == id_to_index.end() ? -1 : it->second;
+}
+
+void RouteGraph::invalidateCache() {
+    lock_guard<mutex> guard(cache_mutex);
+    query_cache.clear();
+}
+
+bool RouteGraph::cachedRoute(const QueryKey& key, CachedRoute& route) {
+    // The capacity can change under batch workers, so even the enabled
+    // check is made under the lock.
+    lock_guard<mutex> guard(cache_mutex);
+    if (!query_cache.enabled()) return false;
+    const CachedRoute* hit = query_cache.get(key);
+    if (hit) route = *hit;
+    return hit != nullptr;
+}
+
+void RouteGraph::storeRoute(const QueryKey& key, double cost, const vector<int>& path) {
+    lock_guard<mutex> guard(cache_mutex);
+    if (!query_cache.enabled()) return;
+    query_cache.put(key, CachedRoute{cost, path});
+}
+
+void RouteGraph::setCacheCapacity(size_t capacity) {
+    lock_guard<mutex> guard(cache_mutex);
+    query_cache.setCapacity(capacity);
+}
+
+void RouteGraph::clearCache() {
+    invalidateCache();
+}
+
+vector<long long> RouteGraph::cacheStats() {
+    lock_guard<mutex> guard(cache_mutex);
+    return {(long long)query_cache.capacity(), (long long)query_cache.size(), query_cache.hits,
+            query_cache.misses, query_cache.evictions, query_cache.invalidations};
+}
+
+void RouteGraph::recordQuery(int start, int end, const SearchStats& stats) {
+    {
+        lock_guard<mutex> guard(totals_mutex);
+        totals.queries++;
+        if (stats.cache_hit) totals.cache_hits++;
+        totals.sum.add(stats);
+        totals.max_elapsed_seconds = max(totals.max_elapsed_seconds, stats.elapsed_seconds);
+    }
+    if (observer) observer(start, end, stats);
+}
+
+SearchTotals RouteGraph::searchTotals() {
+    lock_guard<mutex> guard(totals_mutex);
+    return totals;
+}
+
+void RouteGraph::resetSearchTotals() {
+    lock_guard<mutex> guard(totals_mutex);
+    totals = SearchTotals();
+}
+
+void RouteGraph::setQueryObserver(QueryObserver fn) {
+    observer = move(fn);
+}
+
+void RouteGraph::finalize() {
+    if (finalized) return;
+    size_t n = nodes.size();
+    size_t m = edges.size();
+
+    // Counting sort of the edges by source index.
+    vector<int> src(m), tgt(m);
+    offsets.assign(n + 1, 0);
+    for (size_t e = 0; e < m; e++) {
+        src[e] = indexOf(edges[e].source);
+        tgt[e] = indexOf(edges[e].target);
+        if (src[e] < 0 || tgt[e] < 0) {
+            int missing = src[e] < 0 ? edges[e].source : edges[e].target;
+            throw invalid_argument("Edge references unknown node " + to_string(missing));
+        }
+        offsets[src[e] + 1]++;
+    }
+    for (size_t i = 0; i < n; i++) offsets[i + 1] += offsets[i];
+
+    targets.assign(m, 0);
+    edge_metrics.assign(m * METRIC_COUNT, 0.0);
+    vector<int> cursor(offsets.begin(), offsets.end() - 1);
+    for (size_t e = 0; e < m; e++) {
+        int pos = cursor[src[e]]++;
+        targets[pos] = tgt[e];
+        double* metrics = &edge_metrics[(size_t)pos * METRIC_COUNT];
+        metrics[METRIC_TIME] = edges[e].time;
+        metrics[METRIC_COST] = edges[e].cost;
+        metrics[METRIC_DISTANCE] = edges[e].distance;
+        metrics[METRIC_WEIGHT] = edges[e].weight;
+    }
+
+    rev_offsets.assign(n + 1, 0);
+    for (size_t e = 0; e < m; e++) rev_offsets[targets[e] + 1]++;
+    for (size_t i = 0; i < n; i++) rev_offsets[i + 1] += rev_offsets[i];
+    rev_sources.assign(m, 0);
+    rev_edges.assign(m, 0);
+    cursor.assign(rev_offsets.begin(), rev_offsets.end() - 1);
+    for (size_t u = 0; u < n; u++) {
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int pos = cursor[targets[e]]++;
+            rev_sources[pos] = (int)u;
+            rev_edges[pos] = e;
+        }
+    }
+
+    // The CSR arrays are now the only copy of the edges.
+    edges.clear();
+    edges.shrink_to_fit();
+    workspace.prepare(n);
+    finalized = true;
+}
+
+void RouteGraph::thaw() {
+    // Turn the frozen arrays back into an edge list so building can resume.
+    edges.clear();
+    edges.reserve(targets.size());
+    for (size_t u = 0; u + 1 < offsets.size(); u++) {
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            const double* metrics = &edge_metrics[(size_t)e * METRIC_COUNT];
+            edges.push_back(Edge(nodes[u].id, nodes[targets[e]].id, metrics[METRIC_WEIGHT],
+                                 metrics[METRIC_TIME], metrics[METRIC_COST], metrics[METRIC_DISTANCE]));
+        }
+    }
+    offsets.clear();
+    targets.clear();
+    edge_metrics.clear();
+    rev_offsets.clear();
+    rev_sources.clear();
+    rev_edges.clear();
+    astar_scale = -1.0;
+    landmarks.clear();
+    landmark_from.clear();
+    landmark_to.clear();
+    ch_rank.clear();
+    ch_from.clear();
+    ch_to.clear();
+    ch_cost.clear();
+    ch_child1.clear();
+    ch_child2.clear();
+    ch_up_offsets.clear();
+    ch_up_edges.clear();
+    ch_down_offsets.clear();
+    ch_down_edges.clear();
+    finalized = false;
+}
+
+void RouteGraph::ensureFinalized() {
+    if (!finalized) finalize();
+}
+
+double RouteGraph::prepareQueries(SearchAlgorithm algorithm, const MetricWeights& metric) {
+    auto started = chrono::steady_clock::now();
+    ensureFinalized();
+    prepareSearch(algorithm, metric);
+    return secondsSince(started);
+}
+
+void RouteGraph::dijkstra(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                          SearchStats& stats) const {
+    auto cmp = greater<pair<double, int>>();
+    ws.prepare(nodes.size());
+    ws.relax(source, 0.0, -1);
+    ws.heap.push_back({0.0, source});
+    stats.heap_pushes++;
+
+    while (!ws.heap.empty()) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        stats.heap_pops++;
         double current_dist = current.first;
         int u = current.second;
-        pq.pop();
-        
-        if (u == end) break;
-        if (current_dist > distances[u]) continue;
-        
-        for (const Edge& edge : adjacency_list[u]) {
-            double new_dist = current_dist + edge.time;
-            
-            if (new_dist < distances[edge.target]) {
-                distances[edge.target] = new_dist;
-                previous[edge.target] = u;
-                pq.push({new_dist, edge.target});
+
+        if (current_dist > ws.distance[u]) {
+            stats.stale_pops++;
+            continue;
+        }
+        stats.nodes_settled++;
+        if (u == target) break;
+
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int v = targets[e];
+            double new_dist = current_dist + edgeCost(e, metric);
+            stats.edges_relaxed++;
+
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                stats.heap_pushes++;
+            }
+        }
+    }
+}
+
+void RouteGraph::oneToAll(SearchWorkspace& ws, int source, bool backward, const MetricWeights& metric) const {
+    // Full search without a target; backward follows in-edges, giving the
+    // distance from every node to source.
+    const FlatArray<int>& off = backward ? rev_offsets : offsets;
+    auto cmp = greater<pair<double, int>>();
+    ws.prepare(nodes.size());
+    ws.relax(source, 0.0, -1);
+    ws.heap.push_back({0.0, source});
+
+    while (!ws.heap.empty()) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        int u = current.second;
+        if (current.first > ws.distance[u]) continue;
+
+        for (int i = off[u]; i < off[u + 1]; i++) {
+            int v = backward ? rev_sources[i] : targets[i];
+            double new_dist = current.first + edgeCost(backward ? rev_edges[i] : i, metric);
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
             }
         }
     }
-    
+}
+
+vector<int> RouteGraph::extractPath(const SearchWorkspace& ws, int source, int target) const {
+    if (ws.distance[target] == INF) return {};
     vector<int> path;
-    for (int at = end; at != start; at = previous[at]) {
-        path.push_back(at);
-        if (previous.find(at) == previous.end()) return {};
+    for (int at = target; at != -1; at = ws.predecessor[at]) {
+        path.push_back(nodes[at].id);
+        if (at == source) break;
     }
-    path.push_back(start);
     reverse(path.begin(), path.end());
     return path;
 }
 
-vector<int> RouteGraph::findPathWithWaypoints(int start, const vector<int>& waypoints, int end) {
+vector<int> RouteGraph::runQuery(SearchWorkspace& fwd, SearchWorkspace& bwd, int source, int target,
+                                 SearchAlgorithm algorithm, const MetricWeights& metric,
+                                 SearchStats& stats, double* cost) const {
+    // Search kernel shared by every point-to-point entry point. It only reads
+    // the frozen graph, so callers may run it concurrently with separate
+    // workspaces once prepareSearch() has been called for the algorithm.
+    long long reserved = fwd.bytesReserved() + bwd.bytesReserved();
+    auto started = chrono::steady_clock::now();
+    vector<int> path;
+    if (algorithm == SearchAlgorithm::CH) {
+        path = chSearch(fwd, bwd, source, target, stats, cost);
+    } else {
+        switch (algorithm) {
+            case SearchAlgorithm::ASTAR: astarSearch(fwd, source, target, metric, stats); break;
+            case SearchAlgorithm::ALT: altSearch(fwd, source, target, metric, stats); break;
+            default: dijkstra(fwd, source, target, metric, stats); break;
+        }
+        auto searched = chrono::steady_clock::now();
+        if (cost) *cost = fwd.distance[target];
+        path = extractPath(fwd, source, target);
+        stats.path_seconds = secondsSince(searched);
+    }
+    stats.elapsed_seconds = secondsSince(started);
+    stats.search_seconds = stats.elapsed_seconds - stats.path_seconds;
+    stats.bytes_allocated = fwd.bytesReserved() + bwd.bytesReserved() - reserved +
+                            (long long)(path.capacity() * sizeof(int));
+    return path;
+}
+
+vector<int> RouteGraph::findShortestPath(int start, int end, const MetricWeights& metric,
+                                         SearchAlgorithm algorithm) {
+    auto started = chrono::steady_clock::now();
+    ensureFinalized();
+    last_stats = SearchStats();
+    vector<int> path;
+    int s = indexOf(start);
+    int t = indexOf(end);
+    if (s >= 0 && t >= 0) {
+        QueryKey key{start, end, metric};
+        CachedRoute cached;
+        if (cachedRoute(key, cached)) {
+            last_stats.cache_hit = true;
+            path.swap(cached.path);
+        } else {
+            prepareSearch(algorithm, metric);
+            double prepare_seconds = secondsSince(started);
+            double cost = INF;
+            path = runQuery(workspace, backward_workspace, s, t, algorithm, metric, last_stats, &cost);
+            last_stats.prepare_seconds = prepare_seconds;
+            storeRoute(key, cost, path);
+        }
+    }
+    last_stats.elapsed_seconds = secondsSince(started);
+    recordQuery(start, end, last_stats);
+    return path;
+}
+
+vector<int> RouteGraph::findPathWithWaypoints(int start, const vector<int>& waypoints, int end,
+                                              const MetricWeights& metric, SearchAlgorithm algorithm) {
     vector<int> full_path;
     int current = start;
-    
+    SearchStats legs;
+
     for (int wp : waypoints) {
-        vector<int> segment = findShortestPath(current, wp);
-        if (segment.empty()) return {};
-        
+        vector<int> segment = findShortestPath(current, wp, metric, algorithm);
+        legs.add(last_stats);
+        if (segment.empty()) {
+            last_stats = legs;
+            return {};
+        }
+
         full_path.insert(full_path.end(), segment.begin(), segment.end() - 1);
         current = wp;
     }
-    
-    vector<int> last_segment = findShortestPath(current, end);
+
+    vector<int> last_segment = findShortestPath(current, end, metric, algorithm);
+    legs.add(last_stats);
+    last_stats = legs;
     if (last_segment.empty()) return {};
-    
+
     full_path.insert(full_path.end(), last_segment.begin(), last_segment.end());
     return full_path;
-}
\ No newline at end of file
+}
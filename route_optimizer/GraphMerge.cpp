@@ -0,0 +1,135 @@
+#include "graph.h"
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+using namespace std;
+
+static const double METERS_PER_DEGREE = 111320.0;
+static const double DEG_TO_RAD = 3.14159265358979323846 / 180.0;
+
+long long RouteGraph::snapCell(int lat_cell, int lon_cell) const {
+    return ((long long)lat_cell << 32) ^ (long long)(unsigned int)lon_cell;
+}
+
+void RouteGraph::rebuildMergeIndex(double cell_degrees) {
+    snap_cell_degrees = cell_degrees;
+    snap_cells.clear();
+    edge_pairs.clear();
+    next_node_id = 0;
+    for (size_t i = 0; i < nodes.size(); i++) {
+        const Node& node = nodes[i];
+        int lat_cell = (int)floor(node.latitude / cell_degrees);
+        int lon_cell = (int)floor(node.longitude / cell_degrees);
+        snap_cells[snapCell(lat_cell, lon_cell)].push_back((int)i);
+        next_node_id = max(next_node_id, node.id + 1);
+    }
+    if (finalized) {
+        for (size_t u = 0; u + 1 < offsets.size(); u++) {
+            for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+                edge_pairs.insert(((long long)u << 32) | (unsigned int)targets[e]);
+            }
+        }
+    } else {
+        for (const Edge& edge : edges) {
+            int u = indexOf(edge.source);
+            int v = indexOf(edge.target);
+            if (u >= 0 && v >= 0) edge_pairs.insert(((long long)u << 32) | (unsigned int)v);
+        }
+    }
+    merge_index_valid = true;
+}
+
+MergeResult RouteGraph::mergePolyline(const double* lats, const double* lons, size_t n, const double* times,
+                                      const double* costs, const double* distances, const double* weights,
+                                      double tolerance_m, bool bidirectional) {
+    if (!(tolerance_m > 0)) throw invalid_argument("tolerance must be positive");
+    // A cell is one tolerance tall, so a match can only be in the 3 rows
+    // around a point; cells narrow in metres towards the poles, so more
+    // columns are searched there.
+    double cell_degrees = tolerance_m / METERS_PER_DEGREE;
+    if (!merge_index_valid || cell_degrees != snap_cell_degrees) rebuildMergeIndex(cell_degrees);
+    invalidateCache();
+
+    MergeResult result;
+    vector<int> point_index(n);
+    for (size_t i = 0; i < n; i++) {
+        int lat_cell = (int)floor(lats[i] / cell_degrees);
+        int lon_cell = (int)floor(lons[i] / cell_degrees);
+        int lon_reach = (int)ceil(1.0 / max(cos(lats[i] * DEG_TO_RAD), 0.01));
+        int best = -1;
+        double best_meters = tolerance_m;
+        for (int dy = -1; dy <= 1; dy++) {
+            for (int dx = -lon_reach; dx <= lon_reach; dx++) {
+                auto cell = snap_cells.find(snapCell(lat_cell + dy, lon_cell + dx));
+                if (cell == snap_cells.end()) continue;
+                for (int candidate : cell->second) {
+                    const Node& node = nodes[candidate];
+                    double meters = haversineMeters(lats[i], lons[i], node.latitude, node.longitude);
+                    if (meters <= best_meters) {
+                        best_meters = meters;
+                        best = candidate;
+                    }
+                }
+            }
+        }
+
+        if (best >= 0) {
+            result.snapped++;
+        } else {
+            // New nodes change the dense index space, as in addNode().
+            if (finalized) thaw();
+            best = (int)nodes.size();
+            id_to_index[next_node_id] = best;
+            nodes.push_back(Node(next_node_id++, lats[i], lons[i]));
+            spatial_index_valid = false;
+            snap_cells[snapCell(lat_cell, lon_cell)].push_back(best);
+            result.new_nodes++;
+        }
+        point_index[i] = best;
+        if (result.ids.empty() || result.ids.back() != nodes[best].id) result.ids.push_back(nodes[best].id);
+    }
+
+    // Segments whose ends snap to the same node have no edge of their own;
+    // their metrics are carried onto the next edge (or, at the end of the
+    // polyline, the last one), so the merged path keeps the input totals.
+    double pending[METRIC_COUNT] = {0.0, 0.0, 0.0, 0.0};
+    auto segmentMetric = [&](size_t segment, int metric) {
+        switch (metric) {
+            case METRIC_TIME: return times[segment];
+            case METRIC_COST: return costs ? costs[segment] : 0.0;
+            case METRIC_DISTANCE: return distances ? distances[segment] : 0.0;
+            default: return weights ? weights[segment] : 0.0;
+        }
+    };
+    // Returns the position of the new edge in edges, or -1 for a duplicate.
+    auto link = [&](int u, int v, const double* m) {
+        if (!edge_pairs.insert(((long long)u << 32) | (unsigned int)v).second) {
+            result.duplicate_edges++;
+            return -1;
+        }
+        if (finalized) thaw();
+        edges.push_back(Edge(nodes[u].id, nodes[v].id, m[METRIC_WEIGHT], m[METRIC_TIME],
+                             m[METRIC_COST], m[METRIC_DISTANCE]));
+        result.new_edges++;
+        return (int)edges.size() - 1;
+    };
+    vector<int> last_edges;
+    for (size_t i = 0; i + 1 < n; i++) {
+        int u = point_index[i];
+        int v = point_index[i + 1];
+        for (int k = 0; k < METRIC_COUNT; k++) pending[k] += segmentMetric(i, k);
+        if (u == v) continue;  // both ends snapped to the same node
+        last_edges.assign({link(u, v, pending)});
+        if (bidirectional) last_edges.push_back(link(v, u, pending));
+        fill(pending, pending + METRIC_COUNT, 0.0);
+    }
+    for (int e : last_edges) {
+        if (e < 0) continue;
+        edges[e].weight += pending[METRIC_WEIGHT];
+        edges[e].time += pending[METRIC_TIME];
+        edges[e].cost += pending[METRIC_COST];
+        edges[e].distance += pending[METRIC_DISTANCE];
+    }
+    return result;
+}
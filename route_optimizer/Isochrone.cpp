@@ -0,0 +1,100 @@
+#include "graph.h"
+#include <algorithm>
+#include <functional>
+#include <chrono>
+#include <numeric>
+#include <stdexcept>
+using namespace std;
+
+ReachResult RouteGraph::reachableWithin(const vector<int>& sources, const vector<double>& budgets,
+                                        const MetricWeights& metric, bool backward) {
+    if (budgets.empty()) throw invalid_argument("at least one budget is required");
+    for (double b : budgets) {
+        if (!(b >= 0.0)) throw invalid_argument("budgets must not be negative");
+    }
+    auto started = chrono::steady_clock::now();
+    ensureFinalized();
+    last_stats = SearchStats();
+    long long reserved = workspace.bytesReserved();
+    last_stats.prepare_seconds = chrono::duration<double>(chrono::steady_clock::now() - started).count();
+
+    // Budget positions by increasing value, for the band lookup below.
+    vector<int> order(budgets.size());
+    iota(order.begin(), order.end(), 0);
+    stable_sort(order.begin(), order.end(), [&](int a, int b) { return budgets[a] < budgets[b]; });
+    vector<double> sorted_budgets;
+    for (int i : order) sorted_budgets.push_back(budgets[i]);
+    double limit = sorted_budgets.back();
+
+    const FlatArray<int>& off = backward ? rev_offsets : offsets;
+    auto cmp = greater<pair<double, int>>();
+    SearchWorkspace& ws = workspace;
+    ws.prepare(nodes.size());
+    for (int id : sources) {
+        int s = indexOf(id);
+        if (s < 0 || ws.distance[s] == 0.0) continue;
+        ws.relax(s, 0.0, -1);
+        ws.heap.push_back({0.0, s});
+        last_stats.heap_pushes++;
+    }
+    make_heap(ws.heap.begin(), ws.heap.end(), cmp);
+
+    // Dense indices in the order they are settled.
+    vector<int> settled;
+    while (!ws.heap.empty()) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        last_stats.heap_pops++;
+        int u = current.second;
+        if (current.first > ws.distance[u]) {
+            last_stats.stale_pops++;
+            continue;
+        }
+        last_stats.nodes_settled++;
+        settled.push_back(u);
+
+        for (int i = off[u]; i < off[u + 1]; i++) {
+            int v = backward ? rev_sources[i] : targets[i];
+            double new_dist = current.first + edgeCost(backward ? rev_edges[i] : i, metric);
+            last_stats.edges_relaxed++;
+            // Nodes past the largest budget are never queued, so the heap
+            // empties exactly when the isochrone is complete.
+            if (new_dist <= limit && new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                last_stats.heap_pushes++;
+            }
+        }
+    }
+    auto searched = chrono::steady_clock::now();
+
+    // A node's predecessor is settled before it, so walking in settle order
+    // can overwrite each predecessor entry with the source it descends from.
+    ReachResult result;
+    size_t count = settled.size();
+    result.ids.resize(count);
+    result.costs.resize(count);
+    result.bands.resize(count);
+    result.origins.resize(count);
+    for (size_t i = 0; i < count; i++) {
+        int u = settled[i];
+        int pred = ws.predecessor[u];
+        ws.predecessor[u] = pred == -1 ? u : ws.predecessor[pred];
+        double cost = ws.distance[u];
+        result.ids[i] = nodes[u].id;
+        result.costs[i] = cost;
+        result.bands[i] = order[lower_bound(sorted_budgets.begin(), sorted_budgets.end(), cost) - sorted_budgets.begin()];
+        result.origins[i] = nodes[ws.predecessor[u]].id;
+    }
+
+    auto now = chrono::steady_clock::now();
+    last_stats.path_seconds = chrono::duration<double>(now - searched).count();
+    last_stats.elapsed_seconds = chrono::duration<double>(now - started).count();
+    last_stats.search_seconds = last_stats.elapsed_seconds - last_stats.prepare_seconds - last_stats.path_seconds;
+    last_stats.bytes_allocated = workspace.bytesReserved() - reserved +
+                                 (long long)(settled.capacity() * sizeof(int) +
+                                             count * (3 * sizeof(int) + sizeof(double)));
+    return result;
+}
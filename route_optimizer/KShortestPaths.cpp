@@ -0,0 +1,272 @@
+#include "graph.h"
+#include <limits>
+#include <algorithm>
+#include <functional>
+#include <chrono>
+#include <set>
+#include <stdexcept>
+#include <unordered_set>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+
+// Paths examined per requested path before giving up; only reached when
+// max_overlap rejects most of them.
+static const int EXAMINED_PER_PATH = 32;
+// Cost multiplier applied to the edges of every path the penalty method
+// finds.
+static const double PENALTY_FACTOR = 1.5;
+
+namespace {
+
+// A path over dense indices. prefix[i] is the cost from the start to
+// nodes[i]; spurs are only taken from index deviation onwards, since
+// earlier ones repeat spurs already taken from the parent path.
+struct Candidate {
+    vector<int> nodes;
+    vector<double> prefix;
+    int deviation;
+
+    double cost() const { return prefix.back(); }
+};
+
+long long pairKey(int u, int v) {
+    return ((long long)u << 32) | (unsigned int)v;
+}
+
+}  // namespace
+
+bool RouteGraph::spurSearch(SearchWorkspace& ws, int spur, int target, const vector<double>* to_target,
+                            const vector<char>& blocked, const vector<char>& next_blocked,
+                            const vector<double>* edge_scale, const MetricWeights& metric,
+                            SearchStats& stats) const {
+    // A* from spur that never enters a blocked node and never leaves spur
+    // towards a node marked in next_blocked. Edge costs are multiplied by
+    // edge_scale (all >= 1) when given. to_target holds exact distances in
+    // the unblocked, unscaled graph: blocking and scaling only lengthen
+    // paths, so they remain a consistent heuristic. Without it this is
+    // plain Dijkstra.
+    auto h = [&](int v) { return to_target ? (*to_target)[v] : 0.0; };
+    auto cmp = greater<pair<double, int>>();
+    ws.prepare(nodes.size());
+    ws.relax(spur, 0.0, -1);
+    ws.heap.push_back({h(spur), spur});
+    stats.heap_pushes++;
+
+    while (!ws.heap.empty()) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        stats.heap_pops++;
+        int u = current.second;
+        double g = ws.distance[u];
+
+        if (current.first > g + h(u)) {
+            stats.stale_pops++;
+            continue;
+        }
+        stats.nodes_settled++;
+        if (u == target) return true;
+
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int v = targets[e];
+            if (blocked[v] || (u == spur && next_blocked[v])) continue;
+            double hv = h(v);
+            if (hv == INF) continue;
+            double new_dist = g + edgeCost(e, metric) * (edge_scale ? (*edge_scale)[e] : 1.0);
+            stats.edges_relaxed++;
+
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist + hv, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                stats.heap_pushes++;
+            }
+        }
+    }
+    return false;
+}
+
+KShortestResult RouteGraph::findKShortestPaths(int start, int end, int k, const MetricWeights& metric,
+                                               double max_overlap, bool reuse_tree) {
+    if (k < 1) throw invalid_argument("k must be at least 1");
+    if (!(max_overlap >= 0.0 && max_overlap <= 1.0)) throw invalid_argument("max_overlap must be between 0 and 1");
+    auto started = chrono::steady_clock::now();
+    ensureFinalized();
+    last_stats = SearchStats();
+    KShortestResult result;
+    auto finish = [&]() {
+        last_stats.elapsed_seconds = chrono::duration<double>(chrono::steady_clock::now() - started).count();
+        last_stats.search_seconds = last_stats.elapsed_seconds - last_stats.prepare_seconds;
+        recordQuery(start, end, last_stats);
+        return result;
+    };
+    int s = indexOf(start);
+    int t = indexOf(end);
+    if (s < 0 || t < 0) return finish();
+
+    size_t n = nodes.size();
+    // Reverse shortest-path tree: distance from every node to t, and the
+    // next hop towards t in predecessor (-1 at t itself).
+    const vector<double>* to_target = nullptr;
+    if (reuse_tree) {
+        oneToAll(backward_workspace, t, true, metric);
+        to_target = &backward_workspace.distance;
+    }
+    const vector<int>& next_hop = backward_workspace.predecessor;
+    last_stats.prepare_seconds = chrono::duration<double>(chrono::steady_clock::now() - started).count();
+
+    vector<char> blocked(n, 0), next_blocked(n, 0);
+    // Appends the cheapest unblocked path from spur to t to path/prefix;
+    // false if there is none.
+    auto extend = [&](int spur, vector<int>& path, vector<double>& prefix) {
+        double base = prefix.back();
+        if (to_target) {
+            if ((*to_target)[spur] == INF) return false;
+            // The tree path is optimal whenever none of it is blocked.
+            bool free = !next_blocked[next_hop[spur]];
+            for (int v = next_hop[spur]; free && v != -1; v = next_hop[v]) free = !blocked[v];
+            if (free) {
+                for (int v = next_hop[spur]; v != -1; v = next_hop[v]) {
+                    path.push_back(v);
+                    prefix.push_back(base + (*to_target)[spur] - (*to_target)[v]);
+                }
+                result.tree_spurs++;
+                return true;
+            }
+        }
+        result.spur_searches++;
+        if (!spurSearch(workspace, spur, t, to_target, blocked, next_blocked, nullptr, metric, last_stats)) {
+            return false;
+        }
+        size_t first = path.size();
+        for (int v = t; v != spur; v = workspace.predecessor[v]) {
+            path.push_back(v);
+            prefix.push_back(base + workspace.distance[v]);
+        }
+        reverse(path.begin() + first, path.end());
+        reverse(prefix.begin() + first, prefix.end());
+        return true;
+    };
+
+    vector<unordered_set<long long>> accepted_edges;
+    // Accepts a path unless more than max_overlap of its cost runs over the
+    // edges of any single path accepted before it.
+    auto accept = [&](const vector<int>& path, const vector<double>& prefix) {
+        size_t len = path.size();
+        for (const auto& edges_used : accepted_edges) {
+            double shared = 0.0;
+            for (size_t i = 0; i + 1 < len; i++) {
+                if (edges_used.count(pairKey(path[i], path[i + 1]))) shared += prefix[i + 1] - prefix[i];
+            }
+            if (shared > max_overlap * prefix.back()) return false;
+        }
+        RankedPath ranked;
+        ranked.cost = prefix.back();
+        for (int v : path) ranked.path.push_back(nodes[v].id);
+        result.paths.push_back(ranked);
+        accepted_edges.emplace_back();
+        for (size_t i = 0; i + 1 < len; i++) accepted_edges.back().insert(pairKey(path[i], path[i + 1]));
+        return true;
+    };
+    size_t limit = (size_t)k * EXAMINED_PER_PATH;
+
+    if (max_overlap < 1.0 && s != t) {
+        // On road networks the first thousands of paths in cost order differ
+        // by a block or two, so with an overlap limit the alternatives come
+        // from the penalty method instead: every path found makes its edges
+        // PENALTY_FACTOR times dearer for the next search, pushing it onto
+        // other roads. Reported costs are the true ones, cheapest first.
+        vector<double> scale(targets.size(), 1.0);
+        set<vector<int>> seen;
+        while (result.paths.size() < (size_t)k && (size_t)result.examined < limit) {
+            result.spur_searches++;
+            if (!spurSearch(workspace, s, t, to_target, blocked, next_blocked, &scale, metric, last_stats)) break;
+            result.examined++;
+            vector<int> path;
+            for (int v = t; v != -1; v = workspace.predecessor[v]) path.push_back(v);
+            reverse(path.begin(), path.end());
+            // The search took the cheapest scaled edge between each pair,
+            // which is penalized; the path is reported at the cost of the
+            // cheapest unscaled one, as a path of nodes is everywhere else.
+            vector<double> prefix = {0.0};
+            for (size_t i = 0; i + 1 < path.size(); i++) {
+                int best = -1;
+                double cheapest = INF;
+                for (int e = offsets[path[i]]; e < offsets[path[i] + 1]; e++) {
+                    if (targets[e] != path[i + 1]) continue;
+                    cheapest = min(cheapest, edgeCost(e, metric));
+                    if (best < 0 || edgeCost(e, metric) * scale[e] < edgeCost(best, metric) * scale[best]) best = e;
+                }
+                prefix.push_back(prefix.back() + cheapest);
+                scale[best] *= PENALTY_FACTOR;
+            }
+            if (seen.insert(path).second) accept(path, prefix);
+        }
+        sort(result.paths.begin(), result.paths.end(),
+             [](const RankedPath& a, const RankedPath& b) { return a.cost < b.cost; });
+        return finish();
+    }
+
+    vector<Candidate> pool(1);
+    pool[0].nodes = {s};
+    pool[0].prefix = {0.0};
+    pool[0].deviation = 0;
+    if (s != t && !extend(s, pool[0].nodes, pool[0].prefix)) return finish();
+
+    // Candidates by (cost, creation order), so ties resolve deterministically.
+    typedef pair<double, size_t> Entry;
+    vector<Entry> heap = {{pool[0].cost(), 0}};
+    auto cmp = greater<Entry>();
+    set<vector<int>> seen = {pool[0].nodes};
+    vector<size_t> examined;
+
+    while (!heap.empty() && result.paths.size() < (size_t)k && examined.size() < limit) {
+        pop_heap(heap.begin(), heap.end(), cmp);
+        size_t index = heap.back().second;
+        heap.pop_back();
+        examined.push_back(index);
+        Candidate path = pool[index];
+        size_t len = path.nodes.size();
+
+        if (accept(path.nodes, path.prefix) && result.paths.size() == (size_t)k) break;
+
+        // Every examined path that shares the first i + 1 nodes forbids its
+        // own next step from spur node i, so spurs give new paths only.
+        vector<size_t> common;
+        for (size_t other : examined) {
+            const vector<int>& q = pool[other].nodes;
+            size_t c = 0;
+            while (c < len && c < q.size() && q[c] == path.nodes[c]) c++;
+            common.push_back(c);
+        }
+        for (int j = 0; j < path.deviation; j++) blocked[path.nodes[j]] = 1;
+        for (size_t i = path.deviation; i + 1 < len; i++) {
+            int spur = path.nodes[i];
+            vector<int> forbidden;
+            for (size_t j = 0; j < examined.size(); j++) {
+                const vector<int>& q = pool[examined[j]].nodes;
+                if (common[j] > i && q.size() > i + 1) {
+                    next_blocked[q[i + 1]] = 1;
+                    forbidden.push_back(q[i + 1]);
+                }
+            }
+
+            Candidate next;
+            next.nodes.assign(path.nodes.begin(), path.nodes.begin() + i + 1);
+            next.prefix.assign(path.prefix.begin(), path.prefix.begin() + i + 1);
+            next.deviation = (int)i;
+            if (extend(spur, next.nodes, next.prefix) && seen.insert(next.nodes).second) {
+                pool.push_back(move(next));
+                heap.push_back({pool.back().cost(), pool.size() - 1});
+                push_heap(heap.begin(), heap.end(), cmp);
+            }
+
+            for (int v : forbidden) next_blocked[v] = 0;
+            blocked[spur] = 1;
+        }
+        for (int v : path.nodes) blocked[v] = 0;
+    }
+    result.examined = (long long)examined.size();
+    return finish();
+}
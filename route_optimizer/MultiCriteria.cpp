@@ -0,0 +1,76 @@
+#include "graph.h"
+#include <limits>
+#include <algorithm>
+#include <functional>
+#include <tuple>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+
+namespace {
+
+struct Label {
+    double time;
+    double cost;
+    int node;
+    int parent;
+};
+
+}  // namespace
+
+vector<ParetoPath> RouteGraph::findParetoPaths(int start, int end, size_t max_labels, bool& complete) {
+    ensureFinalized();
+    complete = true;
+    int s = indexOf(start);
+    int t = indexOf(end);
+    if (s < 0 || t < 0) return {};
+
+    // Labels are settled in lexicographic (time, cost) order, so every label
+    // already settled at a node has time <= the current one. The current
+    // label is therefore dominated exactly when its cost is not below the
+    // smallest settled cost there, and one number per node is enough for
+    // the dominance test. The target's value also prunes labels elsewhere.
+    vector<Label> labels;
+    vector<double> best_cost(nodes.size(), INF);
+    typedef tuple<double, double, int> Entry;
+    vector<Entry> heap;
+    auto cmp = greater<Entry>();
+
+    labels.push_back({0.0, 0.0, s, -1});
+    heap.push_back(Entry(0.0, 0.0, 0));
+    vector<ParetoPath> front;
+
+    while (!heap.empty()) {
+        pop_heap(heap.begin(), heap.end(), cmp);
+        int id = get<2>(heap.back());
+        heap.pop_back();
+        Label label = labels[id];
+        if (label.cost >= best_cost[label.node] || label.cost >= best_cost[t]) continue;
+        best_cost[label.node] = label.cost;
+
+        if (label.node == t) {
+            ParetoPath result;
+            result.time = label.time;
+            result.cost = label.cost;
+            for (int at = id; at != -1; at = labels[at].parent) result.path.push_back(nodes[labels[at].node].id);
+            reverse(result.path.begin(), result.path.end());
+            front.push_back(result);
+            continue;
+        }
+
+        for (int e = offsets[label.node]; e < offsets[label.node + 1]; e++) {
+            int v = targets[e];
+            const double* metrics = &edge_metrics[(size_t)e * METRIC_COUNT];
+            double new_cost = label.cost + metrics[METRIC_COST];
+            if (new_cost >= best_cost[v] || new_cost >= best_cost[t]) continue;
+            if (labels.size() >= max_labels) {
+                complete = false;
+                return front;
+            }
+            labels.push_back({label.time + metrics[METRIC_TIME], new_cost, v, id});
+            heap.push_back(Entry(labels.back().time, new_cost, (int)labels.size() - 1));
+            push_heap(heap.begin(), heap.end(), cmp);
+        }
+    }
+    return front;
+}
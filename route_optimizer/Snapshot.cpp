@@ -0,0 +1,489 @@
+// Platform headers come before graph.h: <windows.h> must not see
+// `using namespace std` (std::byte clashes with its byte typedef).
+#ifdef _WIN32
+#define NOMINMAX
+#define WIN32_LEAN_AND_MEAN
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+#include "graph.h"
+#include <climits>
+#include <cstdint>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <stdexcept>
+using namespace std;
+
+// Snapshot layout, all little-endian on the platforms we build for:
+//   Header (fixed size), then section_count SectionEntry records, then the
+//   sections themselves, each starting on a 64-byte boundary so the arrays
+//   can be used in place from a mapping. header_crc covers the header (with
+//   header_crc zeroed) and the section table; every section has its own CRC.
+// Bump SNAPSHOT_VERSION whenever the layout or a section's meaning changes.
+
+namespace {
+
+const char SNAPSHOT_MAGIC[8] = {'R', 'O', 'G', 'R', 'A', 'P', 'H', '\0'};
+const uint32_t SNAPSHOT_VERSION = 1;
+const uint32_t BYTE_ORDER_MARK = 0x01020304;
+const uint64_t SECTION_ALIGNMENT = 64;
+
+enum SectionId : uint32_t {
+    SECTION_NODE_IDS = 1,
+    SECTION_NODE_LATS,
+    SECTION_NODE_LONS,
+    SECTION_NODE_NAMES,  // names back to back, each followed by '\0'
+    SECTION_OFFSETS,
+    SECTION_TARGETS,
+    SECTION_EDGE_METRICS,
+    SECTION_REV_OFFSETS,
+    SECTION_REV_SOURCES,
+    SECTION_REV_EDGES,
+    SECTION_LANDMARKS,
+    SECTION_LANDMARK_FROM,
+    SECTION_LANDMARK_TO,
+    SECTION_CH_RANK,
+    SECTION_CH_FROM,
+    SECTION_CH_TO,
+    SECTION_CH_COST,
+    SECTION_CH_CHILD1,
+    SECTION_CH_CHILD2,
+    SECTION_CH_UP_OFFSETS,
+    SECTION_CH_UP_EDGES,
+    SECTION_CH_DOWN_OFFSETS,
+    SECTION_CH_DOWN_EDGES,
+    SECTION_LIMIT
+};
+
+struct Header {
+    char magic[8];
+    uint32_t version;
+    uint32_t byte_order;
+    uint64_t node_count;
+    uint64_t edge_count;
+    double astar_scale;
+    double astar_metric[METRIC_COUNT];
+    double landmark_metric[METRIC_COUNT];
+    double ch_metric[METRIC_COUNT];
+    uint32_t section_count;
+    uint32_t header_crc;
+};
+
+struct SectionEntry {
+    uint32_t id;
+    uint32_t element_size;
+    uint64_t offset;
+    uint64_t count;
+    uint32_t crc;
+    uint32_t reserved;
+};
+
+struct Section {
+    SectionId id;
+    uint32_t element_size;
+    const void* data;
+    uint64_t count;
+};
+
+uint32_t crc32(const void* data, size_t size, uint32_t crc = 0) {
+    static uint32_t table[256];
+    static bool ready = false;
+    if (!ready) {
+        for (uint32_t i = 0; i < 256; i++) {
+            uint32_t c = i;
+            for (int k = 0; k < 8; k++) c = (c & 1) ? 0xEDB88320u ^ (c >> 1) : c >> 1;
+            table[i] = c;
+        }
+        ready = true;
+    }
+    const unsigned char* p = (const unsigned char*)data;
+    crc = ~crc;
+    for (size_t i = 0; i < size; i++) crc = table[(crc ^ p[i]) & 0xFF] ^ (crc >> 8);
+    return ~crc;
+}
+
+uint64_t alignUp(uint64_t value) {
+    return (value + SECTION_ALIGNMENT - 1) / SECTION_ALIGNMENT * SECTION_ALIGNMENT;
+}
+
+// Read-only file contents that views can point into: a copy-on-write
+// mapping or a heap buffer holding the whole file.
+struct FileImage {
+    char* data = nullptr;
+    size_t size = 0;
+    vector<uint64_t> buffer;  // uint64_t keeps the heap copy 8-byte aligned
+#ifdef _WIN32
+    HANDLE file = INVALID_HANDLE_VALUE;
+    HANDLE mapping = NULL;
+#endif
+    bool mapped = false;
+
+    ~FileImage() {
+        if (!mapped) return;
+#ifdef _WIN32
+        UnmapViewOfFile(data);
+        CloseHandle(mapping);
+        CloseHandle(file);
+#else
+        munmap(data, size);
+#endif
+    }
+};
+
+shared_ptr<FileImage> mapFile(const string& path) {
+    auto image = make_shared<FileImage>();
+#ifdef _WIN32
+    image->file = CreateFileA(path.c_str(), GENERIC_READ, FILE_SHARE_READ, NULL, OPEN_EXISTING,
+                              FILE_ATTRIBUTE_NORMAL, NULL);
+    if (image->file == INVALID_HANDLE_VALUE) throw runtime_error("Cannot open snapshot " + path);
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(image->file, &size)) {
+        CloseHandle(image->file);
+        throw runtime_error("Cannot read size of snapshot " + path);
+    }
+    image->size = (size_t)size.QuadPart;
+    if (image->size == 0) {
+        CloseHandle(image->file);
+        throw invalid_argument(path + " is not a route graph snapshot");
+    }
+    image->mapping = CreateFileMappingA(image->file, NULL, PAGE_WRITECOPY, 0, 0, NULL);
+    void* view = image->mapping ? MapViewOfFile(image->mapping, FILE_MAP_COPY, 0, 0, 0) : NULL;
+    if (!view) {
+        if (image->mapping) CloseHandle(image->mapping);
+        CloseHandle(image->file);
+        throw runtime_error("Cannot map snapshot " + path);
+    }
+    image->data = (char*)view;
+#else
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0) throw runtime_error("Cannot open snapshot " + path);
+    struct stat info;
+    if (fstat(fd, &info) != 0) {
+        close(fd);
+        throw runtime_error("Cannot read size of snapshot " + path);
+    }
+    image->size = (size_t)info.st_size;
+    if (image->size == 0) {
+        close(fd);
+        throw invalid_argument(path + " is not a route graph snapshot");
+    }
+    // Private writable mapping: pages are shared with every other process
+    // mapping the file until someone writes to them.
+    void* view = mmap(nullptr, image->size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (view == MAP_FAILED) throw runtime_error("Cannot map snapshot " + path);
+    image->data = (char*)view;
+#endif
+    image->mapped = true;
+    return image;
+}
+
+shared_ptr<FileImage> readFile(const string& path) {
+    ifstream in(path, ios::binary | ios::ate);
+    if (!in) throw runtime_error("Cannot open snapshot " + path);
+    auto image = make_shared<FileImage>();
+    image->size = (size_t)in.tellg();
+    image->buffer.resize((image->size + sizeof(uint64_t) - 1) / sizeof(uint64_t));
+    image->data = (char*)image->buffer.data();
+    in.seekg(0);
+    if (!in.read(image->data, image->size)) throw runtime_error("Cannot read snapshot " + path);
+    return image;
+}
+
+// Whether offsets (count + 1 entries) start at 0, never decrease and end
+// at total, so every CSR row stays inside its edge array.
+bool validOffsets(const int* offsets, size_t count, size_t total) {
+    if (offsets[0] != 0 || (size_t)offsets[count] != total) return false;
+    for (size_t i = 0; i < count; i++) {
+        if (offsets[i + 1] < offsets[i]) return false;
+    }
+    return true;
+}
+
+// Whether every value lies in [0, limit).
+bool inRange(const int* values, size_t count, size_t limit) {
+    for (size_t i = 0; i < count; i++) {
+        if (values[i] < 0 || (size_t)values[i] >= limit) return false;
+    }
+    return true;
+}
+
+}  // namespace
+
+void RouteGraph::saveSnapshot(const string& path) {
+    ensureFinalized();
+    size_t n = nodes.size();
+
+    vector<int> ids(n);
+    vector<double> lats(n), lons(n);
+    string names;
+    for (size_t i = 0; i < n; i++) {
+        ids[i] = nodes[i].id;
+        lats[i] = nodes[i].latitude;
+        lons[i] = nodes[i].longitude;
+        names += nodes[i].name;
+        names += '\0';
+    }
+
+    vector<Section> sections = {
+        {SECTION_NODE_IDS, sizeof(int), ids.data(), ids.size()},
+        {SECTION_NODE_LATS, sizeof(double), lats.data(), lats.size()},
+        {SECTION_NODE_LONS, sizeof(double), lons.data(), lons.size()},
+        {SECTION_NODE_NAMES, 1, names.data(), names.size()},
+        {SECTION_OFFSETS, sizeof(int), offsets.data(), offsets.size()},
+        {SECTION_TARGETS, sizeof(int), targets.data(), targets.size()},
+        {SECTION_EDGE_METRICS, sizeof(double), edge_metrics.data(), edge_metrics.size()},
+        {SECTION_REV_OFFSETS, sizeof(int), rev_offsets.data(), rev_offsets.size()},
+        {SECTION_REV_SOURCES, sizeof(int), rev_sources.data(), rev_sources.size()},
+        {SECTION_REV_EDGES, sizeof(int), rev_edges.data(), rev_edges.size()},
+        {SECTION_LANDMARKS, sizeof(int), landmarks.data(), landmarks.size()},
+        {SECTION_LANDMARK_FROM, sizeof(double), landmark_from.data(), landmark_from.size()},
+        {SECTION_LANDMARK_TO, sizeof(double), landmark_to.data(), landmark_to.size()},
+        {SECTION_CH_RANK, sizeof(int), ch_rank.data(), ch_rank.size()},
+        {SECTION_CH_FROM, sizeof(int), ch_from.data(), ch_from.size()},
+        {SECTION_CH_TO, sizeof(int), ch_to.data(), ch_to.size()},
+        {SECTION_CH_COST, sizeof(double), ch_cost.data(), ch_cost.size()},
+        {SECTION_CH_CHILD1, sizeof(int), ch_child1.data(), ch_child1.size()},
+        {SECTION_CH_CHILD2, sizeof(int), ch_child2.data(), ch_child2.size()},
+        {SECTION_CH_UP_OFFSETS, sizeof(int), ch_up_offsets.data(), ch_up_offsets.size()},
+        {SECTION_CH_UP_EDGES, sizeof(int), ch_up_edges.data(), ch_up_edges.size()},
+        {SECTION_CH_DOWN_OFFSETS, sizeof(int), ch_down_offsets.data(), ch_down_offsets.size()},
+        {SECTION_CH_DOWN_EDGES, sizeof(int), ch_down_edges.data(), ch_down_edges.size()},
+    };
+
+    Header header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, SNAPSHOT_MAGIC, sizeof(SNAPSHOT_MAGIC));
+    header.version = SNAPSHOT_VERSION;
+    header.byte_order = BYTE_ORDER_MARK;
+    header.node_count = n;
+    header.edge_count = targets.size();
+    header.astar_scale = astar_scale;
+    memcpy(header.astar_metric, astar_metric.w, sizeof(header.astar_metric));
+    memcpy(header.landmark_metric, landmark_metric.w, sizeof(header.landmark_metric));
+    memcpy(header.ch_metric, ch_metric.w, sizeof(header.ch_metric));
+    header.section_count = (uint32_t)sections.size();
+
+    vector<SectionEntry> table(sections.size());
+    uint64_t position = alignUp(sizeof(Header) + table.size() * sizeof(SectionEntry));
+    for (size_t i = 0; i < sections.size(); i++) {
+        const Section& s = sections[i];
+        SectionEntry& entry = table[i];
+        memset(&entry, 0, sizeof(entry));
+        entry.id = s.id;
+        entry.element_size = s.element_size;
+        entry.offset = position;
+        entry.count = s.count;
+        entry.crc = crc32(s.data, s.count * s.element_size);
+        position = alignUp(position + s.count * s.element_size);
+    }
+    header.header_crc = crc32(table.data(), table.size() * sizeof(SectionEntry),
+                              crc32(&header, sizeof(header)));
+
+    // Write beside the target and rename over it, so processes that have
+    // the old file mapped keep a consistent copy.
+    string temp = path + ".tmp";
+    {
+        ofstream out(temp, ios::binary | ios::trunc);
+        if (!out) throw runtime_error("Cannot write snapshot " + temp);
+        out.write((const char*)&header, sizeof(header));
+        out.write((const char*)table.data(), table.size() * sizeof(SectionEntry));
+        uint64_t written = sizeof(header) + table.size() * sizeof(SectionEntry);
+        static const char padding[SECTION_ALIGNMENT] = {};
+        for (size_t i = 0; i < sections.size(); i++) {
+            out.write(padding, table[i].offset - written);
+            uint64_t bytes = sections[i].count * sections[i].element_size;
+            out.write((const char*)sections[i].data, bytes);
+            written = table[i].offset + bytes;
+        }
+        out.write(padding, alignUp(written) - written);
+        if (!out) throw runtime_error("Cannot write snapshot " + temp);
+    }
+    error_code ec;
+    filesystem::rename(temp, path, ec);
+    if (ec) {
+        filesystem::remove(temp, ec);
+        throw runtime_error("Cannot replace snapshot " + path);
+    }
+}
+
+void RouteGraph::loadSnapshot(const string& path, bool use_mmap, bool verify) {
+    shared_ptr<FileImage> image = use_mmap ? mapFile(path) : readFile(path);
+    const char* base = image->data;
+
+    if (image->size < sizeof(Header) || memcmp(base, SNAPSHOT_MAGIC, sizeof(SNAPSHOT_MAGIC)) != 0) {
+        throw invalid_argument(path + " is not a route graph snapshot");
+    }
+    Header header;
+    memcpy(&header, base, sizeof(header));
+    if (header.byte_order != BYTE_ORDER_MARK) {
+        throw invalid_argument(path + " was written on a machine with a different byte order");
+    }
+    if (header.version != SNAPSHOT_VERSION) {
+        throw invalid_argument(path + " has snapshot version " + to_string(header.version) +
+                               ", expected " + to_string(SNAPSHOT_VERSION));
+    }
+    size_t table_bytes = (size_t)header.section_count * sizeof(SectionEntry);
+    if (header.section_count >= SECTION_LIMIT || image->size - sizeof(Header) < table_bytes) {
+        throw invalid_argument(path + " is truncated or corrupt");
+    }
+    uint32_t stored_crc = header.header_crc;
+    header.header_crc = 0;
+    if (crc32(base + sizeof(Header), table_bytes, crc32(&header, sizeof(header))) != stored_crc) {
+        throw invalid_argument(path + " has a corrupt header (checksum mismatch)");
+    }
+
+    vector<SectionEntry> table(header.section_count);
+    memcpy(table.data(), base + sizeof(Header), table_bytes);
+    vector<const SectionEntry*> by_id(SECTION_LIMIT, nullptr);
+    for (const SectionEntry& entry : table) {
+        uint64_t bytes = entry.count * entry.element_size;
+        if (entry.id == 0 || entry.id >= SECTION_LIMIT || entry.element_size == 0 ||
+            entry.offset % entry.element_size != 0 || entry.offset > image->size ||
+            entry.count > (image->size - entry.offset) / entry.element_size) {
+            throw invalid_argument(path + " is truncated or corrupt");
+        }
+        if (verify && crc32(base + entry.offset, bytes) != entry.crc) {
+            throw invalid_argument(path + " is corrupt (checksum mismatch in section " + to_string(entry.id) + ")");
+        }
+        by_id[entry.id] = &entry;
+    }
+
+    size_t n = (size_t)header.node_count;
+    size_t m = (size_t)header.edge_count;
+    auto section = [&](SectionId id, uint32_t element_size, uint64_t expected) -> const SectionEntry& {
+        const SectionEntry* entry = by_id[id];
+        if (!entry || entry->element_size != element_size || entry->count != expected) {
+            throw invalid_argument(path + " is truncated or corrupt (section " + to_string(id) + ")");
+        }
+        return *entry;
+    };
+    auto count = [&](SectionId id) -> uint64_t { return by_id[id] ? by_id[id]->count : 0; };
+    auto at = [&](const SectionEntry& entry) { return image->data + entry.offset; };
+
+    size_t k = (size_t)count(SECTION_LANDMARKS);
+    size_t ch_edges = (size_t)count(SECTION_CH_FROM);
+    bool has_ch = count(SECTION_CH_RANK) > 0;
+    const SectionEntry& ids = section(SECTION_NODE_IDS, sizeof(int), n);
+    const SectionEntry& lats = section(SECTION_NODE_LATS, sizeof(double), n);
+    const SectionEntry& lons = section(SECTION_NODE_LONS, sizeof(double), n);
+    const SectionEntry& names = section(SECTION_NODE_NAMES, 1, count(SECTION_NODE_NAMES));
+    const SectionEntry& off = section(SECTION_OFFSETS, sizeof(int), n + 1);
+    const SectionEntry& tgt = section(SECTION_TARGETS, sizeof(int), m);
+    const SectionEntry& metrics = section(SECTION_EDGE_METRICS, sizeof(double), m * METRIC_COUNT);
+    const SectionEntry& roff = section(SECTION_REV_OFFSETS, sizeof(int), n + 1);
+    const SectionEntry& rsrc = section(SECTION_REV_SOURCES, sizeof(int), m);
+    const SectionEntry& redge = section(SECTION_REV_EDGES, sizeof(int), m);
+    const SectionEntry& lm = section(SECTION_LANDMARKS, sizeof(int), k);
+    const SectionEntry& lm_from = section(SECTION_LANDMARK_FROM, sizeof(double), n * k);
+    const SectionEntry& lm_to = section(SECTION_LANDMARK_TO, sizeof(double), n * k);
+    const SectionEntry& rank = section(SECTION_CH_RANK, sizeof(int), has_ch ? n : 0);
+    const SectionEntry& cfrom = section(SECTION_CH_FROM, sizeof(int), ch_edges);
+    const SectionEntry& cto = section(SECTION_CH_TO, sizeof(int), ch_edges);
+    const SectionEntry& ccost = section(SECTION_CH_COST, sizeof(double), ch_edges);
+    const SectionEntry& c1 = section(SECTION_CH_CHILD1, sizeof(int), ch_edges);
+    const SectionEntry& c2 = section(SECTION_CH_CHILD2, sizeof(int), ch_edges);
+    const SectionEntry& up_off = section(SECTION_CH_UP_OFFSETS, sizeof(int), has_ch ? n + 1 : 0);
+    const SectionEntry& up = section(SECTION_CH_UP_EDGES, sizeof(int), count(SECTION_CH_UP_EDGES));
+    const SectionEntry& down_off = section(SECTION_CH_DOWN_OFFSETS, sizeof(int), has_ch ? n + 1 : 0);
+    const SectionEntry& down = section(SECTION_CH_DOWN_EDGES, sizeof(int), count(SECTION_CH_DOWN_EDGES));
+
+    // Checksums are optional, but every index is checked so that a damaged
+    // file is rejected instead of sending a search out of bounds. One pass
+    // over the index sections; the float sections are left to verify.
+    if (n >= (size_t)INT_MAX || m >= (size_t)INT_MAX || ch_edges >= (size_t)INT_MAX) {
+        throw invalid_argument(path + " is corrupt (too many nodes or edges)");
+    }
+    auto check = [&](bool valid, SectionId id) {
+        if (!valid) throw invalid_argument(path + " is corrupt (index out of range in section " + to_string(id) + ")");
+    };
+    check(validOffsets((const int*)at(off), n, m), SECTION_OFFSETS);
+    check(inRange((const int*)at(tgt), m, n), SECTION_TARGETS);
+    check(validOffsets((const int*)at(roff), n, m), SECTION_REV_OFFSETS);
+    check(inRange((const int*)at(rsrc), m, n), SECTION_REV_SOURCES);
+    check(inRange((const int*)at(redge), m, m), SECTION_REV_EDGES);
+    check(inRange((const int*)at(lm), k, n), SECTION_LANDMARKS);
+    if (has_ch) {
+        check(inRange((const int*)at(rank), n, n), SECTION_CH_RANK);
+        check(inRange((const int*)at(cfrom), ch_edges, n), SECTION_CH_FROM);
+        check(inRange((const int*)at(cto), ch_edges, n), SECTION_CH_TO);
+        // Children come before their shortcut, so unpacking always ends.
+        const int* child1 = (const int*)at(c1);
+        const int* child2 = (const int*)at(c2);
+        for (size_t e = 0; e < ch_edges; e++) {
+            bool original = child1[e] < 0 && child2[e] < 0;
+            bool shortcut = child1[e] >= 0 && child2[e] >= 0 && (size_t)child1[e] < e && (size_t)child2[e] < e;
+            check(original || shortcut, SECTION_CH_CHILD1);
+        }
+        check(validOffsets((const int*)at(up_off), n, up.count), SECTION_CH_UP_OFFSETS);
+        check(inRange((const int*)at(up), up.count, ch_edges), SECTION_CH_UP_EDGES);
+        check(validOffsets((const int*)at(down_off), n, down.count), SECTION_CH_DOWN_OFFSETS);
+        check(inRange((const int*)at(down), down.count, ch_edges), SECTION_CH_DOWN_EDGES);
+    } else {
+        check(ch_edges == 0 && up.count == 0 && down.count == 0, SECTION_CH_RANK);
+    }
+
+    // Nodes and the id lookup are rebuilt; everything else is viewed in place.
+    vector<Node> loaded(n);
+    unordered_map<int, int> index;
+    index.reserve(n);
+    const int* id_data = (const int*)at(ids);
+    const double* lat_data = (const double*)at(lats);
+    const double* lon_data = (const double*)at(lons);
+    const char* name = at(names);
+    const char* names_end = name + names.count;
+    for (size_t i = 0; i < n; i++) {
+        const char* stop = name < names_end ? (const char*)memchr(name, '\0', names_end - name) : nullptr;
+        if (!stop) stop = names_end;
+        loaded[i] = Node(id_data[i], lat_data[i], lon_data[i], string(name, stop));
+        name = stop < names_end ? stop + 1 : names_end;
+        if (!index.emplace(id_data[i], (int)i).second) {
+            throw invalid_argument(path + " is corrupt (duplicate node id " + to_string(id_data[i]) + ")");
+        }
+    }
+
+    invalidateCache();
+    merge_index_valid = false;
+    spatial_index_valid = false;
+    nodes.swap(loaded);
+    id_to_index.swap(index);
+    edges.clear();
+    edges.shrink_to_fit();
+    offsets.view((int*)at(off), off.count, image);
+    targets.view((int*)at(tgt), tgt.count, image);
+    edge_metrics.view((double*)at(metrics), metrics.count, image);
+    rev_offsets.view((int*)at(roff), roff.count, image);
+    rev_sources.view((int*)at(rsrc), rsrc.count, image);
+    rev_edges.view((int*)at(redge), redge.count, image);
+
+    astar_scale = header.astar_scale;
+    memcpy(astar_metric.w, header.astar_metric, sizeof(header.astar_metric));
+    memcpy(landmark_metric.w, header.landmark_metric, sizeof(header.landmark_metric));
+    memcpy(ch_metric.w, header.ch_metric, sizeof(header.ch_metric));
+    landmarks.assign((const int*)at(lm), (const int*)at(lm) + k);
+    if (k > 0) landmark_count = (int)k;
+    landmark_from.view((double*)at(lm_from), lm_from.count, image);
+    landmark_to.view((double*)at(lm_to), lm_to.count, image);
+
+    ch_rank.view((int*)at(rank), rank.count, image);
+    ch_from.view((int*)at(cfrom), cfrom.count, image);
+    ch_to.view((int*)at(cto), cto.count, image);
+    ch_cost.view((double*)at(ccost), ccost.count, image);
+    ch_child1.view((int*)at(c1), c1.count, image);
+    ch_child2.view((int*)at(c2), c2.count, image);
+    ch_up_offsets.view((int*)at(up_off), up_off.count, image);
+    ch_up_edges.view((int*)at(up), up.count, image);
+    ch_down_offsets.view((int*)at(down_off), down_off.count, image);
+    ch_down_edges.view((int*)at(down), down.count, image);
+
+    finalized = true;
+    workspace = SearchWorkspace();
+    backward_workspace = SearchWorkspace();
+    workspace.prepare(n);
+}
@@ -0,0 +1,151 @@
+#include "graph.h"
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+static const double EARTH_RADIUS_M = 6371008.8;
+static const double DEG_TO_RAD = 3.14159265358979323846 / 180.0;
+
+// Points are compared as unit vectors: the straight-line (chord) distance
+// between two of them grows with their great-circle distance, so nearest
+// neighbours are the same and no special cases are needed at the poles or
+// the antimeridian.
+
+namespace {
+
+void toUnitVector(double lat, double lon, double* out) {
+    double phi = lat * DEG_TO_RAD;
+    double lambda = lon * DEG_TO_RAD;
+    out[0] = cos(phi) * cos(lambda);
+    out[1] = cos(phi) * sin(lambda);
+    out[2] = sin(phi);
+}
+
+double chordSquared(const double* a, const double* b) {
+    double dx = a[0] - b[0], dy = a[1] - b[1], dz = a[2] - b[2];
+    return dx * dx + dy * dy + dz * dz;
+}
+
+// Walks the implicit tree over slots [lo, hi). visit(slot, chord2) is
+// called for every slot that may qualify; bound() is the current squared
+// chord beyond which subtrees are skipped.
+template <class Visit, class Bound>
+void kdSearch(const vector<double>& points, size_t lo, size_t hi, int depth, const double* q,
+              Visit& visit, Bound& bound) {
+    if (lo >= hi) return;
+    size_t mid = lo + (hi - lo) / 2;
+    const double* p = &points[mid * 3];
+    visit(mid, chordSquared(q, p));
+    int axis = depth % 3;
+    double diff = q[axis] - p[axis];
+    if (diff < 0) {
+        kdSearch(points, lo, mid, depth + 1, q, visit, bound);
+        if (diff * diff <= bound()) kdSearch(points, mid + 1, hi, depth + 1, q, visit, bound);
+    } else {
+        kdSearch(points, mid + 1, hi, depth + 1, q, visit, bound);
+        if (diff * diff <= bound()) kdSearch(points, lo, mid, depth + 1, q, visit, bound);
+    }
+}
+
+}  // namespace
+
+void RouteGraph::kdBuild(size_t lo, size_t hi, int depth) {
+    if (hi - lo < 2) return;
+    size_t mid = lo + (hi - lo) / 2;
+    int axis = depth % 3;
+    nth_element(kd_order.begin() + lo, kd_order.begin() + mid, kd_order.begin() + hi,
+                [&](int a, int b) { return kd_points[a * 3 + axis] < kd_points[b * 3 + axis]; });
+    kdBuild(lo, mid, depth + 1);
+    kdBuild(mid + 1, hi, depth + 1);
+}
+
+void RouteGraph::ensureSpatialIndex() {
+    if (spatial_index_valid) return;
+    size_t n = nodes.size();
+    // Build over per-node vectors, then lay them out in tree-slot order so
+    // queries read kd_points sequentially.
+    kd_points.assign(n * 3, 0.0);
+    kd_order.resize(n);
+    for (size_t i = 0; i < n; i++) {
+        toUnitVector(nodes[i].latitude, nodes[i].longitude, &kd_points[i * 3]);
+        kd_order[i] = (int)i;
+    }
+    kdBuild(0, n, 0);
+    vector<double> slots(n * 3);
+    for (size_t s = 0; s < n; s++) {
+        copy(&kd_points[kd_order[s] * 3], &kd_points[kd_order[s] * 3] + 3, &slots[s * 3]);
+    }
+    kd_points.swap(slots);
+    spatial_index_valid = true;
+}
+
+void RouteGraph::nearestNodes(const double* lats, const double* lons, size_t n, int k, int* ids, double* meters) {
+    if (k < 1) throw invalid_argument("k must be at least 1");
+    ensureSpatialIndex();
+    vector<pair<double, size_t>> best;  // max-heap of (chord2, slot), at most k entries
+    for (size_t i = 0; i < n; i++) {
+        double q[3];
+        toUnitVector(lats[i], lons[i], q);
+        best.clear();
+        auto visit = [&](size_t slot, double chord2) {
+            if ((int)best.size() < k) {
+                best.push_back({chord2, slot});
+                push_heap(best.begin(), best.end());
+            } else if (chord2 < best.front().first) {
+                pop_heap(best.begin(), best.end());
+                best.back() = {chord2, slot};
+                push_heap(best.begin(), best.end());
+            }
+        };
+        auto bound = [&]() { return (int)best.size() < k ? INF : best.front().first; };
+        kdSearch(kd_points, 0, kd_order.size(), 0, q, visit, bound);
+
+        sort_heap(best.begin(), best.end());
+        for (int j = 0; j < k; j++) {
+            size_t out = i * k + j;
+            if (j < (int)best.size()) {
+                const Node& node = nodes[kd_order[best[j].second]];
+                ids[out] = node.id;
+                meters[out] = haversineMeters(lats[i], lons[i], node.latitude, node.longitude);
+            } else {
+                ids[out] = -1;
+                meters[out] = INF;
+            }
+        }
+    }
+}
+
+void RouteGraph::nodesWithinRadius(const double* lats, const double* lons, size_t n, double radius_m,
+                                   vector<long long>& offsets_out, vector<int>& ids, vector<double>& meters) {
+    if (!(radius_m >= 0)) throw invalid_argument("radius must be non-negative");
+    ensureSpatialIndex();
+    // Chord length of an arc of radius_m; past half the globe everything matches.
+    double half_angle = min(radius_m / (2 * EARTH_RADIUS_M), 3.14159265358979323846 / 2);
+    double limit = 4 * sin(half_angle) * sin(half_angle) * (1 + 1e-12);
+    offsets_out.assign(n + 1, 0);
+    ids.clear();
+    meters.clear();
+    vector<pair<double, int>> found;
+    for (size_t i = 0; i < n; i++) {
+        double q[3];
+        toUnitVector(lats[i], lons[i], q);
+        found.clear();
+        auto visit = [&](size_t slot, double chord2) {
+            if (chord2 > limit) return;
+            const Node& node = nodes[kd_order[slot]];
+            double d = haversineMeters(lats[i], lons[i], node.latitude, node.longitude);
+            if (d <= radius_m) found.push_back({d, node.id});
+        };
+        auto bound = [&]() { return limit; };
+        kdSearch(kd_points, 0, kd_order.size(), 0, q, visit, bound);
+        sort(found.begin(), found.end());
+        for (const auto& match : found) {
+            meters.push_back(match.first);
+            ids.push_back(match.second);
+        }
+        offsets_out[i + 1] = (long long)ids.size();
+    }
+}
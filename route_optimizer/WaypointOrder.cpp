@@ -0,0 +1,227 @@
+#include "graph.h"
+#include <limits>
+#include <algorithm>
+#include <functional>
+using namespace std;
+
+static const double INF = numeric_limits<double>::infinity();
+
+// Held-Karp needs 2^k * k table entries of 12 bytes (about 12.6 MB at 16
+// waypoints, 240 MB at 20); beyond this the heuristic is used whatever
+// exact_limit asks for.
+static const int MAX_EXACT_WAYPOINTS = 16;
+
+void RouteGraph::oneToMany(SearchWorkspace& ws, int source, const vector<int>& target_list,
+                           const MetricWeights& metric, double* costs, SearchStats& stats) const {
+    // Plain Dijkstra that stops once every distinct target is settled.
+    // costs[i] receives the distance to target_list[i] (inf if unreachable).
+    auto cmp = greater<pair<double, int>>();
+    ws.prepare(nodes.size());
+    if (ws.is_target.size() != nodes.size()) ws.is_target.assign(nodes.size(), 0);
+    int remaining = 0;
+    for (int t : target_list) {
+        if (!ws.is_target[t]) remaining++;
+        ws.is_target[t] = 1;
+    }
+    ws.relax(source, 0.0, -1);
+    ws.heap.push_back({0.0, source});
+    stats.heap_pushes++;
+
+    while (!ws.heap.empty() && remaining > 0) {
+        pop_heap(ws.heap.begin(), ws.heap.end(), cmp);
+        auto current = ws.heap.back();
+        ws.heap.pop_back();
+        stats.heap_pops++;
+        int u = current.second;
+        if (current.first > ws.distance[u]) {
+            stats.stale_pops++;
+            continue;
+        }
+        stats.nodes_settled++;
+        if (ws.is_target[u]) remaining--;
+
+        for (int e = offsets[u]; e < offsets[u + 1]; e++) {
+            int v = targets[e];
+            double new_dist = current.first + edgeCost(e, metric);
+            stats.edges_relaxed++;
+            if (new_dist < ws.distance[v]) {
+                ws.relax(v, new_dist, u);
+                ws.heap.push_back({new_dist, v});
+                push_heap(ws.heap.begin(), ws.heap.end(), cmp);
+                stats.heap_pushes++;
+            }
+        }
+    }
+
+    for (size_t i = 0; i < target_list.size(); i++) {
+        costs[i] = ws.distance[target_list[i]];
+        ws.is_target[target_list[i]] = 0;
+    }
+}
+
+namespace {
+
+// Cost of visiting the waypoints in `order` between the fixed ends. Row and
+// column k of the matrix are the start and the end; 0..k-1 are waypoints.
+double tourCost(const vector<vector<double>>& d, const vector<int>& order, int k) {
+    double total = 0.0;
+    int prev = k;
+    for (int w : order) {
+        total += d[prev][w];
+        prev = w;
+    }
+    return total + d[prev][k + 1];
+}
+
+vector<int> heldKarp(const vector<vector<double>>& d, int k) {
+    size_t full = (size_t)1 << k;
+    vector<double> best(full * k, INF);
+    vector<int> parent(full * k, -1);
+    for (int j = 0; j < k; j++) best[((size_t)1 << j) * k + j] = d[k][j];
+
+    for (size_t mask = 1; mask < full; mask++) {
+        for (int j = 0; j < k; j++) {
+            double here = best[mask * k + j];
+            if (!(mask & ((size_t)1 << j)) || here == INF) continue;
+            for (int next = 0; next < k; next++) {
+                if (mask & ((size_t)1 << next)) continue;
+                size_t grown = mask | ((size_t)1 << next);
+                double c = here + d[j][next];
+                if (c < best[grown * k + next]) {
+                    best[grown * k + next] = c;
+                    parent[grown * k + next] = j;
+                }
+            }
+        }
+    }
+
+    int last = 0;
+    double total = INF;
+    for (int j = 0; j < k; j++) {
+        double c = best[(full - 1) * k + j] + d[j][k + 1];
+        if (c < total) {
+            total = c;
+            last = j;
+        }
+    }
+    vector<int> order;
+    size_t mask = full - 1;
+    for (int j = last; j != -1;) {
+        order.push_back(j);
+        int prev = parent[mask * k + j];
+        mask &= ~((size_t)1 << j);
+        j = prev;
+    }
+    reverse(order.begin(), order.end());
+    return order;
+}
+
+vector<int> localSearch(const vector<vector<double>>& d, int k) {
+    // Nearest-neighbour start, then 2-opt segment reversals and Or-opt moves
+    // of 1-3 consecutive waypoints until neither improves the tour. Costs
+    // may be asymmetric, so candidates are scored by recomputing the tour.
+    vector<int> order;
+    vector<char> used(k, 0);
+    int prev = k;
+    for (int step = 0; step < k; step++) {
+        int pick = -1;
+        for (int j = 0; j < k; j++) {
+            if (!used[j] && (pick < 0 || d[prev][j] < d[prev][pick])) pick = j;
+        }
+        used[pick] = 1;
+        order.push_back(pick);
+        prev = pick;
+    }
+
+    double current = tourCost(d, order, k);
+    bool improved = true;
+    while (improved) {
+        improved = false;
+        for (int i = 0; i < k - 1; i++) {
+            for (int j = i + 1; j < k; j++) {
+                reverse(order.begin() + i, order.begin() + j + 1);
+                double c = tourCost(d, order, k);
+                if (c < current) {
+                    current = c;
+                    improved = true;
+                } else {
+                    reverse(order.begin() + i, order.begin() + j + 1);
+                }
+            }
+        }
+        for (int len = 1; len <= 3 && len < k; len++) {
+            for (int i = 0; i + len <= k; i++) {
+                vector<int> segment(order.begin() + i, order.begin() + i + len);
+                vector<int> rest(order.begin(), order.begin() + i);
+                rest.insert(rest.end(), order.begin() + i + len, order.end());
+                for (int pos = 0; pos <= (int)rest.size(); pos++) {
+                    if (pos == i) continue;
+                    vector<int> candidate(rest.begin(), rest.begin() + pos);
+                    candidate.insert(candidate.end(), segment.begin(), segment.end());
+                    candidate.insert(candidate.end(), rest.begin() + pos, rest.end());
+                    double c = tourCost(d, candidate, k);
+                    if (c < current) {
+                        current = c;
+                        order.swap(candidate);
+                        improved = true;
+                        break;
+                    }
+                }
+            }
+        }
+    }
+    return order;
+}
+
+}  // namespace
+
+WaypointOrderResult RouteGraph::findOptimalWaypointOrder(int start, const vector<int>& waypoints, int end,
+                                                         const MetricWeights& metric, int exact_limit,
+                                                         SearchAlgorithm algorithm) {
+    ensureFinalized();
+    last_stats = SearchStats();
+    WaypointOrderResult result;
+    int k = (int)waypoints.size();
+
+    // Dense indices: waypoints 0..k-1, then start (k) and end (k+1).
+    vector<int> points;
+    for (int id : waypoints) points.push_back(indexOf(id));
+    points.push_back(indexOf(start));
+    points.push_back(indexOf(end));
+    for (int p : points) {
+        if (p < 0) return result;
+    }
+
+    // One search per origin (start and each waypoint) against every
+    // possible successor (each waypoint and end).
+    vector<int> successors(points.begin(), points.begin() + k);
+    successors.push_back(points[k + 1]);
+    vector<vector<double>> d(k + 2, vector<double>(k + 2, INF));
+    vector<double> row(k + 1);
+    for (int i = 0; i <= k; i++) {
+        oneToMany(workspace, points[i], successors, metric, row.data(), last_stats);
+        for (int j = 0; j < k; j++) d[i][j] = row[j];
+        d[i][k + 1] = row[k];
+    }
+
+    vector<int> order;
+    if (k > 0 && k <= min(exact_limit, MAX_EXACT_WAYPOINTS)) {
+        order = heldKarp(d, k);
+    } else if (k > 0) {
+        order = localSearch(d, k);
+        result.exact = false;
+    }
+    result.cost = tourCost(d, order, k);
+    if (result.cost == INF) return result;
+
+    vector<int> stops;
+    for (int j : order) {
+        stops.push_back(waypoints[j]);
+        result.order.push_back(waypoints[j]);
+    }
+    // The legs overwrite last_stats; report the matrix searches as well.
+    SearchStats matrix = last_stats;
+    result.path = findPathWithWaypoints(start, stops, end, metric, algorithm);
+    last_stats.add(matrix);
+    return result;
+}
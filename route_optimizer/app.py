@@ -1,16 +1,38 @@
 import tkinter as tk
 from tkinter import ttk
 import json
-from data_fetcher import RouteDataFetcher
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from data_fetcher import RouteDataFetcher, looks_like_coordinates
 import route_optimizer
 
+STAGES = ("geocode", "fetch", "build", "search")
+POLL_MS = 50
+
+class RouteCancelled(Exception):
+    """Raised in the worker when its request has been cancelled"""
+
 class RoutePlannerApp:
     def __init__(self, root):
         self.root = root
         self.fetcher = RouteDataFetcher()
+        # One graph for the whole session: each fetched route is merged into
+        # it, so overlapping routes share nodes and edges
         self.graph = route_optimizer.RouteGraph()
+        # Requests run off the Tk thread. A single worker also means only one
+        # request touches self.graph and the fetcher's session at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.messages = queue.Queue()
+        self.request_id = 0
+        self.cancel_event = None
+        self.stage_times = {}
         
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(POLL_MS, self.poll_messages)
     
     def setup_ui(self):
         ttk.Label(self.root, text="Origin (City):").grid(row=0, column=0)
@@ -29,111 +51,216 @@ class RoutePlannerApp:
         ttk.Label(self.root, text="Waypoints (comma separated cities):").grid(row=3, column=0)
         self.waypoints_entry = ttk.Entry(self.root)
         self.waypoints_entry.grid(row=3, column=1)
+        self.reorder_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.root, text="Best order", variable=self.reorder_var).grid(row=3, column=2)
         
-        ttk.Button(self.root, text="Calculate Route", command=self.calculate_route).grid(row=4, column=0, columnspan=2)
+        ttk.Button(self.root, text="Calculate Route", command=self.calculate_route).grid(row=4, column=0)
+        ttk.Button(self.root, text="Cancel", command=self.cancel_route).grid(row=4, column=1)
         
         self.results_text = tk.Text(self.root, height=10, width=50)
         self.results_text.grid(row=5, column=0, columnspan=2)
+        
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(self.root, textvariable=self.status_var).grid(row=6, column=0, columnspan=3, sticky="w")
+        self.times_var = tk.StringVar(value="")
+        ttk.Label(self.root, textvariable=self.times_var).grid(row=7, column=0, columnspan=3, sticky="w")
     
     def calculate_route(self):
-    #    def calculate_route(self):
         origin = self.origin_entry.get().strip()
         destination = self.dest_entry.get().strip()
         waypoints = [wp.strip() for wp in self.waypoints_entry.get().split(",") if wp.strip()]
         
+        # A new request supersedes the one in flight; messages still queued
+        # from the old one are dropped by poll_messages
+        self.cancel_current()
+        self.request_id += 1
+        self.cancel_event = threading.Event()
+        self.stage_times = {}
+        self.results_text.delete(1.0, tk.END)
+        self.results_text.insert(tk.END, "Calculating route...\n")
+        self.status_var.set("Starting...")
+        self.times_var.set("")
+        self.executor.submit(self.run_pipeline, self.request_id, self.cancel_event,
+                             [origin] + waypoints + [destination],
+                             self.optimize_var.get(), self.reorder_var.get())
+    
+    def cancel_current(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+    
+    def cancel_route(self):
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_current()
+            self.status_var.set("Cancelling...")
+    
+    def run_pipeline(self, request_id, cancel, stops, metric, reorder):
+        """Worker thread: geocode, fetch, build and search, reporting each stage through self.messages"""
+        def report(kind, *payload):
+            self.messages.put((request_id, kind) + payload)
+        
+        def check_cancelled():
+            # Checked between steps: a network call in progress is not
+            # interrupted, but its result is thrown away
+            if cancel.is_set():
+                raise RouteCancelled()
+        
         try:
-            self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, "Calculating route...\n")
-            self.root.update()  # Force UI update
+            started = time.perf_counter()
+            coords = []
+            for i, stop in enumerate(stops, 1):
+                check_cancelled()
+                report("progress", f"Geocoding {stop} ({i}/{len(stops)})")
+                coords.append(stop if looks_like_coordinates(stop) else self.fetcher.geocode_location(stop))
+            report("stage", "geocode", time.perf_counter() - started)
             
-            data = self.fetcher.get_route_data(origin, destination)
-            graph_data = self.fetcher.parse_to_graph(data)
+            # One request for the whole trip, merged into the long-lived graph
+            check_cancelled()
+            report("progress", f"Fetching route through {len(coords)} stops")
+            started = time.perf_counter()
+            data = self.fetcher.get_route_data(coords[0], coords[-1], coords[1:-1])
+            report("stage", "fetch", time.perf_counter() - started)
             
+            check_cancelled()
+            report("progress", "Adding route to the graph")
+            started = time.perf_counter()
+            graph_data = self.fetcher.parse_to_arrays(data)
             if graph_data['status'].startswith('error'):
                 raise Exception(graph_data['status'])
+            try:
+                self.merge_route(graph_data)
+            except Exception as e:
+                raise Exception(f"Failed to build graph: {str(e)}")
+            stop_ids = self.snap_stops(graph_data, coords)
+            report("stage", "build", time.perf_counter() - started)
             
-            self.graph = route_optimizer.RouteGraph()
-            
-            # Build graph in C++
-            for node in graph_data["nodes"]:
-                try:
-                    self.graph.add_node(route_optimizer.Node(
-                        id=node['id'],
-                        latitude=node['latitude'],
-                        longitude=node['longitude'],
-                        name=node.get('name', '')
-                    ))
-                except Exception as e:
-                    raise Exception(f"Failed to add node {node['id']}: {str(e)}")
-            
-            for edge in graph_data["edges"]:
-                try:
-                    self.graph.add_edge(route_optimizer.Edge(
-                        source=edge['source'],
-                        target=edge['target'],
-                        weight=edge['weight'],
-                        time=edge['time'],
-                        cost=edge['cost']
-                    ))
-                except Exception as e:
-                    raise Exception(f"Failed to add edge {edge['source']}->{edge['target']}: {str(e)}")
-            
-            # Find path
-            start_node_id = 0  # First waypoint is start
-            end_node_id = 1    # Second waypoint is end
-            waypoints_node_ids = [i+2 for i in range(len(waypoints))]  # Subsequent waypoints
-            
-            if waypoints:
+            check_cancelled()
+            report("progress", "Searching")
+            started = time.perf_counter()
+            if len(stop_ids) > 2:
                 path = self.graph.find_path_with_waypoints(
-                    start_node_id,
-                    waypoints_node_ids,
-                    end_node_id,
-                    self.optimize_var.get()
+                    stop_ids[0],
+                    stop_ids[1:-1],
+                    stop_ids[-1],
+                    metric,
+                    optimize_order=reorder
                 )
             else:
                 path = self.graph.find_shortest_path(
-                    start_node_id,
-                    end_node_id,
-                    self.optimize_var.get()
+                    stop_ids[0],
+                    stop_ids[-1],
+                    metric
                 )
+            report("stage", "search", time.perf_counter() - started)
             
-            # Display results
-            self.display_results(path, graph_data)
-            
-            # Show success message
-            self.results_text.insert(tk.END, f"\n\nTotal distance: {graph_data['total_distance']/1000:.2f} km")
-            self.results_text.insert(tk.END, f"\nEstimated time: {graph_data['total_time']/60:.1f} minutes")
-        
+            # Stops snapped to the same node share one label
+            stop_names = {}
+            for node_id, name in zip(stop_ids, stops):
+                stop_names[node_id] = f"{stop_names[node_id]} / {name}" if node_id in stop_names else name
+            report("done", {
+                "path": path,
+                "stop_names": stop_names,
+                "total_distance": graph_data['total_distance'],
+                "total_time": graph_data['total_time'],
+                "node_count": self.graph.node_count,
+                "edge_count": self.graph.edge_count,
+            })
+        except RouteCancelled:
+            report("cancelled")
         except Exception as e:
-            self.results_text.delete(1.0, tk.END)
-            error_msg = str(e).replace('error: ', '')  # Remove prefix if present
-            self.results_text.insert(tk.END, f"Error: {error_msg}")
-            # Suggest common solutions for geocoding errors
-            if "geocoding" in error_msg.lower():
-                self.results_text.insert(tk.END, "\n\nPossible solutions:")
-                self.results_text.insert(tk.END, "\n- Check your internet connection")
-                self.results_text.insert(tk.END, "\n- Verify the location names are correct")
-                self.results_text.insert(tk.END, "\n- Try more specific location names")
+            report("error", str(e))
+    
+    def poll_messages(self):
+        """Apply worker messages on the Tk thread"""
+        try:
+            while True:
+                request_id, kind, *payload = self.messages.get_nowait()
+                if request_id != self.request_id:
+                    continue  # from a superseded request
+                if kind == "progress":
+                    self.status_var.set(payload[0])
+                elif kind == "stage":
+                    self.stage_times[payload[0]] = payload[1]
+                    self.times_var.set(" | ".join(f"{stage} {self.stage_times[stage]:.3f} s"
+                                                  for stage in STAGES if stage in self.stage_times))
+                elif kind == "done":
+                    self.show_route(payload[0])
+                    self.status_var.set("Done")
+                elif kind == "cancelled":
+                    self.results_text.delete(1.0, tk.END)
+                    self.status_var.set("Cancelled")
+                elif kind == "error":
+                    self.show_error(payload[0])
+                    self.status_var.set("Failed")
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll_messages)
+    
+    def show_route(self, result):
+        # Display results
+        self.display_results(result["path"], result["stop_names"])
+        
+        # Show success message
+        self.results_text.insert(tk.END, f"\n\nTotal distance: {result['total_distance']/1000:.2f} km")
+        self.results_text.insert(tk.END, f"\nEstimated time: {result['total_time']/60:.1f} minutes")
+        self.results_text.insert(tk.END, f"\nGraph: {result['node_count']} nodes, {result['edge_count']} edges")
+    
+    def show_error(self, message):
+        self.results_text.delete(1.0, tk.END)
+        error_msg = message.replace('error: ', '')  # Remove prefix if present
+        self.results_text.insert(tk.END, f"Error: {error_msg}")
+        # Suggest common solutions for geocoding errors
+        if "geocoding" in error_msg.lower():
+            self.results_text.insert(tk.END, "\n\nPossible solutions:")
+            self.results_text.insert(tk.END, "\n- Check your internet connection")
+            self.results_text.insert(tk.END, "\n- Verify the location names are correct")
+            self.results_text.insert(tk.END, "\n- Try more specific location names")
+    
+    def close(self):
+        self.cancel_current()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+    
+    def merge_route(self, graph_data):
+        """Merge one route's geometry into self.graph (stops are snapped separately by snap_stops)"""
+        first = graph_data["waypoint_count"]
+        lats = graph_data["latitude"][first:]
+        lons = graph_data["longitude"][first:]
+        if len(lats) < 2:
+            raise Exception("Route has no geometry")
+        # The geometry segments come first among the edges, weighted per
+        # segment from OSRM's annotations (or evenly without them)
+        segments = graph_data["segment_count"]
+        self.graph.merge_polyline(lats, lons, graph_data["edge_time"][:segments],
+                                  cost=graph_data["edge_cost"][:segments],
+                                  distance=graph_data["edge_distance"][:segments],
+                                  weight=graph_data["edge_weight"][:segments])
+    
+    def snap_stops(self, graph_data, coords):
+        """Graph node ids nearest to each stop: OSRM's snapped waypoints, or the requested "lon,lat" points"""
+        first = graph_data["waypoint_count"]
+        if first == len(coords):
+            lats = graph_data["latitude"][:first]
+            lons = graph_data["longitude"][:first]
+        else:
+            lonlat = np.array([[float(v) for v in c.split(",")] for c in coords])
+            lats, lons = lonlat[:, 1], lonlat[:, 0]
+        ids = self.graph.nearest(lats, lons)["ids"][:, 0]
+        return [int(i) for i in ids]
     
-    def display_results(self, path, graph_data):
-        # Format and display the path
+    def display_results(self, path, stop_names):
+        # Name the stops in the order the path reaches them; the geometry
+        # nodes between them are only counted
         self.results_text.delete(1.0, tk.END)
         if not path:
             self.results_text.insert(tk.END, "No path found!")
             return
         
-        path_locations = []
-        for node_id in path:
-            for node in graph_data["nodes"]:
-                if node['id'] == node_id:
-                    if 'name' in node:
-                        path_locations.append(node['name'])
-                    else:
-                        path_locations.append(f"({node['longitude']}, {node['latitude']})")
-                    break
+        stops = [stop_names[node_id] for node_id in path if node_id in stop_names]
+        stops = [name for i, name in enumerate(stops) if i == 0 or name != stops[i - 1]]
         
         self.results_text.insert(tk.END, f"Optimal route:\n")
-        self.results_text.insert(tk.END, " → ".join(path_locations))
+        self.results_text.insert(tk.END, " → ".join(stops))
+        self.results_text.insert(tk.END, f"\n({len(path)} path nodes)")
 
 if __name__ == "__main__":
     root = tk.Tk()
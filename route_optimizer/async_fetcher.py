@@ -0,0 +1,113 @@
+import asyncio
+
+import aiohttp
+
+from data_fetcher import ANNOTATIONS, looks_like_coordinates
+from rate_limit import limiter_for
+from response_cache import shared_cache
+
+
+class AsyncRouteFetcher:
+    """asyncio counterpart of RouteDataFetcher.
+
+    One pooled keep-alive session serves every request. Calls to the same
+    host share the process-wide token bucket from rate_limit. Identical
+    requests already in flight are awaited instead of sent twice. Base URLs
+    are constructor arguments so the fetcher can be pointed at a local stub
+    server.
+
+        async with AsyncRouteFetcher() as fetcher:
+            coords = await fetcher.geocode_many(["Delhi", "Kota", "Mumbai"])
+    """
+
+    def __init__(self, geocode_url="https://nominatim.openstreetmap.org/search",
+                 route_url="http://router.project-osrm.org/route/v1/driving/",
+                 user_agent="RouteOptimizer/1.0 (contact@yourdomain.com)",
+                 cache=None, max_connections=8, timeout=30):
+        self.geocode_url = geocode_url
+        self.route_url = route_url
+        self.user_agent = user_agent
+        self.cache = cache if cache is not None else shared_cache()
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._session = None
+        self._inflight = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': self.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_json(self, url, params=None):
+        """GET url under its host's rate limit, sharing the result with identical in-flight calls"""
+        key = (url, tuple(sorted((params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url, params):
+        if self._session is None:
+            raise RuntimeError("AsyncRouteFetcher must be used inside 'async with'")
+        await limiter_for(url).acquire_async()
+        try:
+            async with self._session.get(url, params=params) as response:
+                if response.status == 429:
+                    raise Exception("Rate limit exceeded. Please wait and try again.")
+                if response.status != 200:
+                    raise Exception(f"Request to {url} failed with status {response.status}: {await response.text()}")
+                return await response.json(content_type=None)
+        except aiohttp.ClientError as e:
+            raise Exception(f"Network error: {str(e)}")
+
+    async def geocode(self, location_name):
+        """Return "lon,lat" for a place name, like RouteDataFetcher.geocode_location"""
+        cached = self.cache.get('geocode', location_name)
+        if cached is not None:
+            return cached
+        params = {'q': location_name, 'format': 'json', 'limit': 1, 'addressdetails': 1}
+        data = await self._get_json(self.geocode_url, params)
+        if not data or not isinstance(data, list):
+            raise Exception(f"Location not found: {location_name}")
+        coords = f"{data[0]['lon']},{data[0]['lat']}"
+        self.cache.put('geocode', location_name, coords)
+        return coords
+
+    async def geocode_many(self, location_names, return_exceptions=False):
+        """Geocode several names concurrently; results keep the input order"""
+        return await asyncio.gather(*(self.geocode(name) for name in location_names),
+                                    return_exceptions=return_exceptions)
+
+    async def get_route(self, *coords):
+        """OSRM route through "lon,lat" points, in order, with per-segment annotations"""
+        url = f"{self.route_url}{';'.join(coords)}?overview=full&geometries=geojson&annotations={ANNOTATIONS}"
+        cached = self.cache.get('route', url)
+        if cached is not None:
+            return cached
+        data = await self._get_json(url)
+        self.cache.put('route', url, data)
+        return data
+
+    async def get_route_data(self, origin, destination, waypoints=()):
+        """Geocode every stop concurrently, then fetch the route through them in one request"""
+        stops = []
+        for place in [origin, *waypoints, destination]:
+            if looks_like_coordinates(place):
+                stops.append(asyncio.sleep(0, result=place))
+            else:
+                stops.append(self.geocode(place))
+        return await self.get_route(*await asyncio.gather(*stops))
@@ -0,0 +1,58 @@
+"""Compare two benchmark reports written by run.py.
+
+    python benchmarks/compare.py before.json after.json --threshold 0.10
+
+Prints the ratio after/before of each entry's p50 and p90 (below 1.0 is
+faster). Exits with status 1 if any p50 got slower by more than the
+threshold, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], {entry["name"]: entry for entry in report["results"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative p50 slowdown before failing (default 0.10)")
+    args = parser.parse_args(argv)
+
+    meta_before, before = load(args.before)
+    meta_after, after = load(args.after)
+    for key in ("platform", "python", "cpu_count"):
+        if meta_before.get(key) != meta_after.get(key):
+            print(f"warning: {key} differs ({meta_before.get(key)} vs {meta_after.get(key)})", file=sys.stderr)
+
+    regressions = []
+    print(f"{'benchmark':<48} {'p50 before':>12} {'p50 after':>12} {'p50':>7} {'p90':>7}")
+    for name, old in before.items():
+        new = after.get(name)
+        if new is None or not old["p50"] or not old["p90"]:
+            continue
+        p50 = new["p50"] / old["p50"]
+        p90 = new["p90"] / old["p90"]
+        flag = ""
+        if p50 > 1 + args.threshold:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print(f"{name:<48} {old['p50']:>12.3e} {new['p50']:>12.3e} {p50:>7.2f} {p90:>7.2f}{flag}")
+
+    unmatched = len(set(before) ^ set(after))
+    if unmatched:
+        print(f"\n{unmatched} benchmark(s) appear in only one report")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Deterministic synthetic road graphs for the benchmarks.
+
+Both generators return plain NumPy columns (ids, lats, lons, src, dst,
+time, cost, distance) so building the RouteGraph can be timed separately
+from generating the data. The same seed always gives the same graph.
+"""
+import numpy as np
+
+import route_optimizer
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+BASE_LAT = 28.6
+BASE_LON = 77.2
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _columns(lats, lons, src, dst, rng):
+    distance = _haversine(lats[src], lons[src], lats[dst], lons[dst])
+    # 30-90 km/h per edge so shortest paths are unique and not just hop counts
+    speed = rng.uniform(30, 90, len(src)) / 3.6
+    time = distance / speed
+    return {
+        "ids": np.arange(len(lats), dtype=np.int32),
+        "lats": lats,
+        "lons": lons,
+        "src": src.astype(np.int32),
+        "dst": dst.astype(np.int32),
+        "time": time,
+        "cost": distance * 0.01,
+        "distance": distance,
+    }
+
+
+def grid(edges, spacing_m=100.0, seed=0):
+    """Square street grid with roughly `edges` directed edges (4 per node)"""
+    side = max(2, int(round(np.sqrt(edges / 4.0))))
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(side * side), side)
+    step = spacing_m / METERS_PER_DEGREE
+    lats = BASE_LAT + rows * step
+    lons = BASE_LON + cols * step / np.cos(np.radians(BASE_LAT))
+    node = np.arange(side * side).reshape(side, side)
+    right = np.stack([node[:, :-1].ravel(), node[:, 1:].ravel()])
+    down = np.stack([node[:-1, :].ravel(), node[1:, :].ravel()])
+    pairs = np.hstack([right, down])
+    src = np.concatenate([pairs[0], pairs[1]])
+    dst = np.concatenate([pairs[1], pairs[0]])
+    return _columns(lats, lons, src, dst, rng)
+
+
+def random_geometric(edges, degree=4, seed=0):
+    """Uniform random points, each joined both ways to its `degree` nearest neighbours"""
+    nodes = max(degree + 1, edges // (2 * degree))
+    rng = np.random.default_rng(seed)
+    # Keep the density of a city: about one node per hectare
+    span_deg = np.sqrt(nodes) * 100.0 / METERS_PER_DEGREE
+    lats = BASE_LAT + rng.uniform(0, span_deg, nodes)
+    lons = BASE_LON + rng.uniform(0, span_deg, nodes)
+    index = route_optimizer.RouteGraph()
+    index.add_nodes(np.arange(nodes, dtype=np.int32), lats, lons)
+    near = index.nearest(lats, lons, k=degree + 1)["ids"][:, 1:]
+    src = np.repeat(np.arange(nodes), degree)
+    dst = near.ravel()
+    return _columns(lats, lons, np.concatenate([src, dst]), np.concatenate([dst, src]), rng)
+
+
+def build(columns):
+    """RouteGraph from generated columns, finalized"""
+    graph = route_optimizer.RouteGraph()
+    graph.add_nodes(columns["ids"], columns["lats"], columns["lons"])
+    graph.add_edges(columns["src"], columns["dst"], columns["time"],
+                    cost=columns["cost"], distance=columns["distance"])
+    graph.finalize()
+    return graph
+
+
+GENERATORS = {
+    "grid": grid,
+    "geometric": random_geometric,
+}
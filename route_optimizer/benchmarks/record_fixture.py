@@ -0,0 +1,39 @@
+"""Record a live OSRM response as a benchmark fixture.
+
+    python benchmarks/record_fixture.py "Delhi" "Jaipur" -o benchmarks/fixtures/delhi_jaipur.json
+    python benchmarks/record_fixture.py "Delhi" "Mumbai" --via "Jaipur" "Ahmedabad" -o benchmarks/fixtures/delhi_mumbai.json
+
+The response is stored exactly as returned so run.py can replay it
+through the parsers without network access.
+"""
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from data_fetcher import RouteDataFetcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("origin", help="place name or 'lon,lat'")
+    parser.add_argument("destination", help="place name or 'lon,lat'")
+    parser.add_argument("--via", nargs="*", default=[], help="waypoints, in order")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    data = RouteDataFetcher().get_route_data(args.origin, args.destination, args.via)
+    if data.get("code") != "Ok":
+        raise Exception(f"OSRM returned {data.get('code')}: {data.get('message', '')}")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    points = len(data["routes"][0]["geometry"]["coordinates"])
+    print(f"saved {points} points to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Offline routing benchmarks.
+
+    python benchmarks/run.py                         # grid + geometric, 1e3..1e6 edges
+    python benchmarks/run.py --sizes 1e3 1e4 --queries 200 -o before.json
+    python benchmarks/run.py --sizes 1e7 --families grid
+    python benchmarks/compare.py before.json after.json
+
+Each (family, size) case runs in its own process so its peak RSS is its
+own. Every case reports graph generation and build time, single-query
+latency per algorithm, waypoint-query latency, k-shortest-path latency
+with and without reuse of the reverse shortest-path tree, the per-call
+cost of crossing the Python boundary (a loop of find_shortest_path
+against one batched find_shortest_paths) and multi-band isochrone
+latency. OSRM responses in fixtures/ are replayed through parse_to_graph
+and parse_to_arrays as fixture/<name> entries. They are saved there by
+record_fixture.py; the bundled handmade_*.json was written by hand in
+OSRM's response format (its "note" says so) so this path always runs.
+synthetic/ holds a generated 2000-point route in the same format, not
+real route data, reported as synthetic/<name>. Results are written
+as JSON; every timing entry has count, mean, p50, p90, p99, max and
+throughput_per_s.
+"""
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import numpy as np
+
+import route_optimizer
+from graphs import GENERATORS, build
+
+DEFAULT_SIZES = [1e3, 1e4, 1e5, 1e6]
+# Preprocessing-heavy algorithms are skipped above these edge counts
+ALT_MAX_EDGES = 2_000_000
+CH_MAX_EDGES = 300_000
+# k-shortest paths with plain Dijkstra spur searches is the slow baseline
+KSP_BASELINE_MAX_EDGES = 300_000
+KSP_K = 5
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None if unavailable"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / 1024.0 if sys.platform != "darwin" else peak / (1024.0 * 1024.0)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+    except (ImportError, AttributeError):
+        return None
+
+
+def summarize(name, samples, **extra):
+    """Timing entry from per-operation durations in seconds"""
+    samples = np.asarray(samples, dtype=np.float64)
+    total = samples.sum()
+    entry = {
+        "name": name,
+        "unit": "s",
+        "count": int(len(samples)),
+        "mean": float(samples.mean()),
+        "p50": float(np.percentile(samples, 50)),
+        "p90": float(np.percentile(samples, 90)),
+        "p99": float(np.percentile(samples, 99)),
+        "max": float(samples.max()),
+        "throughput_per_s": float(len(samples) / total) if total > 0 else None,
+    }
+    entry.update(extra)
+    return entry
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def run_case(family, edges, queries, waypoints, seed):
+    """One graph family at one size; returns its result entries"""
+    prefix = f"{family}/{int(edges):.0e}".replace("+0", "")
+    results = []
+
+    gen_seconds, columns = timed(GENERATORS[family], int(edges), seed=seed)
+    build_seconds, graph = timed(build, columns)
+    n, m = graph.node_count, graph.edge_count
+    results.append(summarize(f"{prefix}/generate", [gen_seconds]))
+    results.append(summarize(f"{prefix}/build", [build_seconds], nodes=n, edges=m,
+                             edges_per_s=m / build_seconds if build_seconds > 0 else None))
+
+    rng = np.random.default_rng(seed + 1)
+    pairs = rng.integers(0, n, size=(queries, 2)).astype(np.int32)
+
+    algorithms = ["dijkstra", "astar"]
+    if m <= ALT_MAX_EDGES:
+        algorithms.append("alt")
+    if m <= CH_MAX_EDGES:
+        algorithms.append("ch")
+    for algorithm in algorithms:
+        # ALT and CH preprocess on their first query; time that separately
+        prep_seconds, _ = timed(graph.find_shortest_path, int(pairs[0, 0]), int(pairs[0, 1]),
+                                algorithm=algorithm)
+        if algorithm in ("alt", "ch"):
+            results.append(summarize(f"{prefix}/prepare/{algorithm}", [prep_seconds]))
+        samples, settled = [], []
+        for s, t in pairs:
+            seconds, _ = timed(graph.find_shortest_path, int(s), int(t), algorithm=algorithm)
+            samples.append(seconds)
+            settled.append(graph.last_query_stats["nodes_settled"])
+        results.append(summarize(f"{prefix}/query/{algorithm}", samples,
+                                 mean_nodes_settled=float(np.mean(settled))))
+
+    stops = rng.integers(0, n, size=(max(1, queries // 10), waypoints + 2))
+    samples = [timed(graph.find_path_with_waypoints, int(row[0]), [int(w) for w in row[1:-1]], int(row[-1]))[0]
+               for row in stops]
+    results.append(summarize(f"{prefix}/waypoints/{waypoints}", samples))
+
+    # k shortest paths: spur searches guided by the reverse shortest-path
+    # tree against the same algorithm with a plain Dijkstra per spur
+    ksp_pairs = pairs[:max(1, queries // 50)]
+    variants = [("tree", True)] + ([("dijkstra", False)] if m <= KSP_BASELINE_MAX_EDGES else [])
+    for label, reuse_tree in variants:
+        samples, spurs = [], []
+        for s, t in ksp_pairs:
+            seconds, found = timed(graph.find_k_shortest_paths, int(s), int(t), KSP_K, reuse_tree=reuse_tree)
+            samples.append(seconds)
+            spurs.append(found["spur_searches"])
+        results.append(summarize(f"{prefix}/ksp{KSP_K}/{label}", samples, mean_spur_searches=float(np.mean(spurs))))
+
+    # Python-boundary overhead: the same queries one call each versus batched
+    loop_seconds, _ = timed(lambda: [graph.find_shortest_path(int(s), int(t)) for s, t in pairs])
+    batch_seconds, batch = timed(graph.find_shortest_paths, pairs, threads=1)
+    results.append(summarize(f"{prefix}/boundary/loop", [loop_seconds / queries] * queries))
+    results.append(summarize(f"{prefix}/boundary/batch", [batch_seconds / queries] * queries,
+                             overhead_per_call_s=(loop_seconds - batch_seconds) / queries))
+
+    # Three-band isochrones, the widest reaching the median query cost
+    costs = batch["costs"][np.isfinite(batch["costs"])]
+    if len(costs):
+        budgets = np.median(costs) * np.array([0.25, 0.5, 1.0])
+        samples, reached = [], []
+        for s in pairs[:max(1, queries // 10), 0]:
+            seconds, found = timed(graph.reachable_within, int(s), budgets)
+            samples.append(seconds)
+            reached.append(len(found["ids"]))
+        results.append(summarize(f"{prefix}/isochrone/3", samples, mean_nodes_reached=float(np.mean(reached))))
+
+    for entry in results:
+        entry["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def run_fixtures(repeat):
+    """Replay recorded and synthetic OSRM responses through both parsers"""
+    from data_fetcher import RouteDataFetcher
+    results = []
+    fetcher = RouteDataFetcher.__new__(RouteDataFetcher)  # parsing needs no session or cache
+    paths = [("fixture", path) for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "*.json")))]
+    paths += [("synthetic", path) for path in sorted(glob.glob(os.path.join(HERE, "synthetic", "*.json")))]
+    for kind, path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        points = len(data["routes"][0]["geometry"]["coordinates"])
+        for parser in ("parse_to_graph", "parse_to_arrays"):
+            parse = getattr(fetcher, parser)
+            samples = [timed(parse, data)[0] for _ in range(repeat)]
+            results.append(summarize(f"{kind}/{name}/{parser}", samples, points=points))
+    for entry in results:
+        entry["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def _worker(queue, args):
+    try:
+        queue.put(("ok", args[0](*args[1:])))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def isolated(fn, *args):
+    """Run fn in a fresh process so memory peaks do not leak between cases"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_worker, args=(queue, (fn,) + args))
+    process.start()
+    status, payload = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(payload)
+    return payload
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--families", nargs="+", default=sorted(GENERATORS), choices=sorted(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=float, default=DEFAULT_SIZES,
+                        help="approximate directed edge counts (1e3 .. 1e7)")
+    parser.add_argument("--queries", type=int, default=500, help="random queries per case")
+    parser.add_argument("--waypoints", type=int, default=3, help="intermediate stops per waypoint query")
+    parser.add_argument("--fixture-repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="-", help="JSON output file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for family in args.families:
+        for edges in args.sizes:
+            print(f"running {family} with ~{int(edges)} edges", file=sys.stderr)
+            results.extend(isolated(run_case, family, edges, args.queries, args.waypoints, args.seed))
+    results.extend(isolated(run_fixtures, args.fixture_repeat))
+
+    report = {"meta": metadata(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,79 @@
 import requests
+import numpy as np
 import json
-import time
 from urllib.parse import quote
+from response_cache import shared_cache
+from rate_limit import limiter_for
+
+# Per-segment values OSRM is asked to return for every leg
+ANNOTATIONS = "duration,distance"
+
+def looks_like_coordinates(text):
+    """True for 'lon,lat' strings, which need no geocoding"""
+    return all(c.isdigit() or c in ',-.' for c in text.replace(' ', ''))
+
+def segment_weights(route, segments):
+    """Per-segment (duration, distance) arrays for a route's full geometry, and whether they are exact.
+
+    OSRM annotations give one value per geometry segment of each leg, and
+    the legs' segments run on from each other in the overview geometry.
+    Without annotations, or when their lengths do not add up to `segments`,
+    the route totals are spread evenly instead.
+    """
+    durations = []
+    distances = []
+    for leg in route.get('legs', []):
+        annotation = leg.get('annotation') or {}
+        duration = annotation.get('duration')
+        distance = annotation.get('distance')
+        if duration is None or distance is None or len(duration) != len(distance):
+            break
+        durations.extend(duration)
+        distances.extend(distance)
+    else:
+        if durations and len(durations) == segments:
+            return np.asarray(durations, dtype=np.float64), np.asarray(distances, dtype=np.float64), True
+    share = 1.0 / max(1, segments)
+    return (np.full(segments, route.get('duration', 0) * share),
+            np.full(segments, route.get('distance', 0) * share), False)
+
+def waypoint_points(route, waypoint_lonlat, path_lonlat, exact):
+    """Index into the geometry of each waypoint.
+
+    With exact annotations waypoint i sits where leg i starts (the last one
+    where the final leg ends); otherwise it is the nearest geometry point.
+    """
+    if exact:
+        starts = np.cumsum([0] + [len(leg['annotation']['duration']) for leg in route.get('legs', [])])
+        if len(starts) == len(waypoint_lonlat):
+            return starts
+    if len(path_lonlat) == 0:
+        return np.zeros(len(waypoint_lonlat), dtype=np.int64)
+    gaps = waypoint_lonlat[:, None, :] - path_lonlat[None, :, :]
+    return np.argmin((gaps ** 2).sum(axis=2), axis=1)
 
 class RouteDataFetcher:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.base_url = "http://router.project-osrm.org/route/v1/driving/"
         self.geocode_url = "https://nominatim.openstreetmap.org/search"
-        self.last_request_time = 0
         self.user_agent = "RouteOptimizer/1.0 (contact@yourdomain.com)"
+        # One session keeps connections alive between requests
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = self.user_agent
         self.geocode_cache = {}
+        self.cache = cache if cache is not None else shared_cache()
     
     def geocode_location(self, location_name):
         """Convert location name to coordinates using Nominatim with proper rate limiting"""
         if location_name in self.geocode_cache:
             return self.geocode_cache[location_name]
+        cached = self.cache.get('geocode', location_name)
+        if cached is not None:
+            self.geocode_cache[location_name] = cached
+            return cached
         
-        time_since_last = time.time() - self.last_request_time
-        if time_since_last < 1.0:
-            time.sleep(1.0 - time_since_last)
-        
+        limiter_for(self.geocode_url).acquire()
         try:
-            headers = {'User-Agent': self.user_agent}
             params = {
                 'q': location_name,
                 'format': 'json',
@@ -29,7 +81,7 @@ class RouteDataFetcher:
                 'addressdetails': 1
             }
             
-            response = requests.get(self.geocode_url, params=params, headers=headers)
+            response = self.session.get(self.geocode_url, params=params)
             
             if response.status_code == 429:
                 raise Exception("Rate limit exceeded. Please wait and try again.")
@@ -42,29 +94,36 @@ class RouteDataFetcher:
             
             coords = f"{data[0]['lon']},{data[0]['lat']}"
             self.geocode_cache[location_name] = coords
-            self.last_request_time = time.time()
+            self.cache.put('geocode', location_name, coords)
             return coords
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Network error during geocoding: {str(e)}")
     
-    def get_route_data(self, origin, destination):
-        """Get route data from OSRM API with proper error handling"""
+    def get_route_data(self, origin, destination, waypoints=()):
+        """Get route data from OSRM API with proper error handling.
+
+        The whole trip, through any waypoints in order, is one request with
+        per-segment duration and distance annotations.
+        """
         try:
             # Convert city names to coordinates if needed
-            if not all(c.isdigit() or c in ',-.' for c in origin.replace(' ', '')):
-                origin = self.geocode_location(origin)
-            if not all(c.isdigit() or c in ',-.' for c in destination.replace(' ', '')):
-                destination = self.geocode_location(destination)
+            stops = []
+            for place in [origin, *waypoints, destination]:
+                stops.append(place if looks_like_coordinates(place) else self.geocode_location(place))
                 
-            url = f"{self.base_url}{origin};{destination}?overview=full&geometries=geojson"
-            headers = {'User-Agent': self.user_agent}
-            
-            response = requests.get(url, headers=headers)
+            url = f"{self.base_url}{';'.join(stops)}?overview=full&geometries=geojson&annotations={ANNOTATIONS}"
+            cached = self.cache.get('route', url)
+            if cached is not None:
+                return cached
+            limiter_for(url).acquire()
+            response = self.session.get(url)
             if response.status_code != 200:
                 raise Exception(f"OSRM API request failed: {response.text}")
                 
-            return response.json()
+            data = response.json()
+            self.cache.put('route', url, data)
+            return data
             
         except Exception as e:
             raise Exception(f"Failed to get route data: {str(e)}")
@@ -113,27 +172,38 @@ class RouteDataFetcher:
                         'type': 'path_point'
                     })
             
-            if len(nodes) >= 2:
-                legs = route.get('legs', [])
-                if legs:
-                    leg = legs[0]
-                    total_duration = leg.get('duration', 0)
-                    total_distance = leg.get('distance', 0)
-                    segment_count = max(1, len(nodes) - 1)
-                    
-                    for i in range(len(nodes) - 1):
-                        edges.append({
-                            'source': nodes[i]['id'],
-                            'target': nodes[i+1]['id'],
-                            'weight': 1,
-                            'time': total_duration / segment_count,
-                            'cost': total_distance * 0.01 / segment_count,
-                            'distance': total_distance / segment_count
-                        })
+            # Geometry segments weighted from the annotations; each waypoint
+            # is joined both ways to its point on the geometry at no cost
+            path_nodes = [node for node in nodes if node['type'] == 'path_point']
+            waypoint_nodes = [node for node in nodes if node['type'] == 'waypoint']
+            annotated = False
+            if path_nodes:
+                durations, distances, annotated = segment_weights(route, len(path_nodes) - 1)
+                for i, (duration, distance) in enumerate(zip(durations.tolist(), distances.tolist())):
+                    edges.append({
+                        'source': path_nodes[i]['id'],
+                        'target': path_nodes[i+1]['id'],
+                        'weight': 1,
+                        'time': duration,
+                        'cost': distance * 0.01,
+                        'distance': distance
+                    })
+                
+                points = waypoint_points(
+                    route,
+                    np.array([[n['longitude'], n['latitude']] for n in waypoint_nodes]).reshape(-1, 2),
+                    np.array([[n['longitude'], n['latitude']] for n in path_nodes]).reshape(-1, 2),
+                    annotated)
+                for waypoint, point in zip(waypoint_nodes, points.tolist()):
+                    on_path = path_nodes[point]['id']
+                    for source, target in ((waypoint['id'], on_path), (on_path, waypoint['id'])):
+                        edges.append({'source': source, 'target': target, 'weight': 0,
+                                      'time': 0, 'cost': 0, 'distance': 0})
             
             return {
                 "nodes": nodes,
                 "edges": edges,
+                "annotated": annotated,
                 "total_distance": route.get('distance', 0),
                 "total_time": route.get('duration', 0),
                 "status": "success"
@@ -143,7 +213,104 @@ class RouteDataFetcher:
             return {
                 "nodes": [],
                 "edges": [],
+                "annotated": False,
+                "total_distance": 0,
+                "total_time": 0,
+                "status": f"error: {str(e)}"
+            }
+
+    def parse_to_arrays(self, json_data):
+        """Columnar variant of parse_to_graph: NumPy arrays instead of per-point dicts.
+
+        Rows 0..waypoint_count-1 are the OSRM waypoints, the rest are
+        geometry points; a node's id is its row. The first segment_count
+        edges chain the geometry rows, weighted from the annotations when
+        annotated is true; the rest join each waypoint to its geometry row
+        both ways at no cost, like parse_to_graph.
+        """
+        try:
+            if not isinstance(json_data, dict):
+                raise ValueError("Invalid API response format")
+
+            waypoint_coords = []
+            for waypoint in json_data.get('waypoints', []):
+                if not isinstance(waypoint, dict):
+                    continue
+                location = waypoint.get('location', [0, 0])
+                if not isinstance(location, list) or len(location) < 2:
+                    continue
+                waypoint_coords.append(location[:2])
+
+            routes = json_data.get('routes', [])
+            if not routes:
+                raise ValueError("No route information found")
+            route = routes[0]
+            geometry = route.get('geometry', {})
+
+            path_coords = np.empty((0, 2))
+            if geometry.get('type') == 'LineString':
+                coordinates = geometry.get('coordinates', [])
+                try:
+                    path_coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+                except ValueError:
+                    # Ragged or malformed points: keep the valid ones
+                    path_coords = np.asarray(
+                        [c[:2] for c in coordinates if isinstance(c, list) and len(c) >= 2],
+                        dtype=np.float64).reshape(-1, 2)
+
+            waypoint_lonlat = np.asarray(waypoint_coords, dtype=np.float64).reshape(-1, 2)
+            lonlat = np.vstack([waypoint_lonlat, path_coords])
+            n = len(lonlat)
+            ids = np.arange(n, dtype=np.int32)
+            first = len(waypoint_lonlat)
+
+            segments = max(0, len(path_coords) - 1)
+            edge_time, edge_distance, annotated = segment_weights(route, segments)
+            edge_source = ids[first:first + segments]
+            edge_target = ids[first + 1:first + 1 + segments]
+            if len(path_coords):
+                points = (waypoint_points(route, waypoint_lonlat, path_coords, annotated) + first).astype(np.int32)
+                links = np.zeros(2 * first)
+                edge_source = np.concatenate([edge_source, ids[:first], points])
+                edge_target = np.concatenate([edge_target, points, ids[:first]])
+                edge_time = np.concatenate([edge_time, links])
+                edge_distance = np.concatenate([edge_distance, links])
+            edge_weight = np.concatenate([np.ones(segments), np.zeros(len(edge_source) - segments)])
+
+            return {
+                "node_ids": ids,
+                "latitude": lonlat[:, 1].copy(),
+                "longitude": lonlat[:, 0].copy(),
+                "waypoint_count": first,
+                "edge_source": edge_source,
+                "edge_target": edge_target,
+                "edge_time": edge_time,
+                "edge_cost": edge_distance * 0.01,
+                "edge_distance": edge_distance,
+                "edge_weight": edge_weight,
+                "segment_count": segments,
+                "annotated": annotated,
+                "total_distance": route.get('distance', 0),
+                "total_time": route.get('duration', 0),
+                "status": "success"
+            }
+
+        except Exception as e:
+            empty_ids = np.empty(0, dtype=np.int32)
+            return {
+                "node_ids": empty_ids,
+                "latitude": np.empty(0),
+                "longitude": np.empty(0),
+                "waypoint_count": 0,
+                "edge_source": empty_ids,
+                "edge_target": empty_ids,
+                "edge_time": np.empty(0),
+                "edge_cost": np.empty(0),
+                "edge_distance": np.empty(0),
+                "edge_weight": np.empty(0),
+                "segment_count": 0,
+                "annotated": False,
                 "total_distance": 0,
                 "total_time": 0,
                 "status": f"error: {str(e)}"
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,88 @@
+#pragma once
+#include <memory>
+#include <vector>
+using namespace std;
+
+// Contiguous array that either owns its elements or views memory owned by
+// someone else, typically a memory-mapped graph snapshot. The backing
+// pointer keeps such memory alive for as long as any view exists.
+// Mapped snapshots are copy-on-write, so writes through a view stay private
+// to this process. Anything that resizes the array first copies the
+// elements into an owned vector.
+template <class T>
+class FlatArray {
+private:
+    vector<T> owned;
+    T* ptr = nullptr;
+    size_t count = 0;
+    shared_ptr<void> backing;
+
+    void adopt() {
+        ptr = owned.data();
+        count = owned.size();
+        backing.reset();
+    }
+    void materialize() {
+        if (backing) {
+            owned.assign(ptr, ptr + count);
+            adopt();
+        }
+    }
+
+public:
+    FlatArray() = default;
+    FlatArray(const FlatArray& other) { *this = other; }
+    FlatArray& operator=(const FlatArray& other) {
+        if (this == &other) return *this;
+        if (other.backing) {
+            owned.clear();
+            ptr = other.ptr;
+            count = other.count;
+            backing = other.backing;
+        } else {
+            owned = other.owned;
+            adopt();
+        }
+        return *this;
+    }
+
+    // Points the array at count elements of external memory.
+    void view(T* data, size_t n, shared_ptr<void> keep) {
+        vector<T>().swap(owned);
+        ptr = data;
+        count = n;
+        backing = move(keep);
+    }
+    bool isView() const { return backing != nullptr; }
+
+    void assign(size_t n, const T& value) {
+        owned.assign(n, value);
+        adopt();
+    }
+    template <class It>
+    void assign(It first, It last) {
+        owned.assign(first, last);
+        adopt();
+    }
+    // Takes over the contents of v; v receives the previous elements.
+    void swap(vector<T>& v) {
+        materialize();
+        owned.swap(v);
+        adopt();
+    }
+    void clear() {
+        vector<T>().swap(owned);
+        adopt();
+    }
+
+    size_t size() const { return count; }
+    bool empty() const { return count == 0; }
+    T* data() { return ptr; }
+    const T* data() const { return ptr; }
+    T* begin() { return ptr; }
+    T* end() { return ptr + count; }
+    const T* begin() const { return ptr; }
+    const T* end() const { return ptr + count; }
+    T& operator[](size_t i) { return ptr[i]; }
+    const T& operator[](size_t i) const { return ptr[i]; }
+};
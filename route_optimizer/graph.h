@@ -1,7 +1,13 @@
 #pragma once
 #include <vector>
-#include <map>
 #include <string>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
+#include <mutex>
+#include <functional>
+#include "lru_cache.h"
+#include "flat_array.h"
 using namespace std;
 
 struct Node {
@@ -9,7 +15,7 @@ struct Node {
     double latitude;
     double longitude;
     string name;
-    
+
     Node(int id = 0, double lat = 0.0, double lon = 0.0, string name = "")
         : id(id), latitude(lat), longitude(lon), name(name) {}
 };
@@ -19,20 +25,446 @@ struct Edge {
     int target;
     double weight;
     double time;
-    
-    Edge(int src = 0, int tgt = 0, double w = 0.0, double t = 0.0)
-        : source(src), target(tgt), weight(w), time(t) {}
+    double cost;
+    double distance;
+
+    Edge(int src = 0, int tgt = 0, double w = 0.0, double t = 0.0, double c = 0.0, double d = 0.0)
+        : source(src), target(tgt), weight(w), time(t), cost(c), distance(d) {}
+};
+
+// Per-edge metrics, stored packed per edge in this order.
+enum Metric { METRIC_TIME = 0, METRIC_COST, METRIC_DISTANCE, METRIC_WEIGHT, METRIC_COUNT };
+
+// The quantity a query minimizes: a weighted sum of the edge metrics. The
+// default is travel time alone.
+struct MetricWeights {
+    double w[METRIC_COUNT] = {1.0, 0.0, 0.0, 0.0};
+
+    static MetricWeights single(Metric metric) {
+        MetricWeights mw;
+        for (int k = 0; k < METRIC_COUNT; k++) mw.w[k] = k == metric ? 1.0 : 0.0;
+        return mw;
+    }
+    bool operator==(const MetricWeights& other) const {
+        for (int k = 0; k < METRIC_COUNT; k++) {
+            if (w[k] != other.w[k]) return false;
+        }
+        return true;
+    }
+    bool operator!=(const MetricWeights& other) const { return !(*this == other); }
+};
+
+// One point of a (time, cost) Pareto front.
+struct ParetoPath {
+    double time;
+    double cost;
+    vector<int> path;
+};
+
+// Result of findKShortestPaths(): loopless paths in increasing cost.
+// examined counts the paths considered, including those rejected for
+// overlapping too much; spur_searches counts the searches run, tree_spurs
+// the paths read straight off the reverse shortest-path tree instead.
+struct RankedPath {
+    double cost;
+    vector<int> path;
+};
+
+struct KShortestResult {
+    vector<RankedPath> paths;
+    long long examined = 0;
+    long long spur_searches = 0;
+    long long tree_spurs = 0;
+};
+
+// Result of reachableWithin(): every node within the largest budget of its
+// nearest source, in increasing cost. bands[i] is the position in the
+// budget list of the smallest budget covering costs[i]; origins[i] is the
+// id of the source it is reached from (or reaches, searching backward).
+struct ReachResult {
+    vector<int> ids;
+    vector<double> costs;
+    vector<int> bands;
+    vector<int> origins;
+};
+
+// Result of findOptimalWaypointOrder(). order lists the waypoint ids in
+// visiting order; exact is false when the heuristic solver was used.
+struct WaypointOrderResult {
+    vector<int> path;
+    vector<int> order;
+    double cost = 0.0;
+    bool exact = true;
+};
+
+// Query cache key and value: routes are cached per (start, end, metric).
+struct QueryKey {
+    int start;
+    int end;
+    MetricWeights metric;
+
+    bool operator==(const QueryKey& other) const {
+        return start == other.start && end == other.end && metric == other.metric;
+    }
+};
+
+struct QueryKeyHash {
+    size_t operator()(const QueryKey& key) const {
+        size_t h = hash<int>()(key.start) * 31 + hash<int>()(key.end);
+        for (int k = 0; k < METRIC_COUNT; k++) h = h * 31 + hash<double>()(key.metric.w[k]);
+        return h;
+    }
+};
+
+struct CachedRoute {
+    double cost;
+    vector<int> path;
+};
+
+// Outcome of mergePolyline(). ids are the graph node ids along the merged
+// polyline, with consecutive repeats removed.
+struct MergeResult {
+    vector<int> ids;
+    long long new_nodes = 0;
+    long long snapped = 0;
+    long long new_edges = 0;
+    long long duplicate_edges = 0;
+};
+
+enum class SearchAlgorithm { DIJKSTRA, ASTAR, ALT, CH };
+
+// Work done by one query. elapsed_seconds splits into prepare_seconds
+// (finalizing and any lazy preprocessing: the A* bound, landmarks, the
+// hierarchy), search_seconds and path_seconds (walking predecessors or
+// unpacking shortcuts). stale_pops counts heap entries skipped because the
+// node had since been reached more cheaply. bytes_allocated is how much the
+// search buffers grew plus the size of the returned path, so it drops to
+// the path alone once the workspace is warm.
+struct SearchStats {
+    long long nodes_settled = 0;
+    long long edges_relaxed = 0;
+    long long heap_pushes = 0;
+    long long heap_pops = 0;
+    long long stale_pops = 0;
+    long long bytes_allocated = 0;
+    bool cache_hit = false;
+    double prepare_seconds = 0.0;
+    double search_seconds = 0.0;
+    double path_seconds = 0.0;
+    double elapsed_seconds = 0.0;
+
+    void add(const SearchStats& other);
+};
+
+// Sums over every point-to-point query since the last reset.
+struct SearchTotals {
+    long long queries = 0;
+    long long cache_hits = 0;
+    SearchStats sum;
+    double max_elapsed_seconds = 0.0;
+};
+
+// Called after every point-to-point query with its endpoints (node ids)
+// and stats.
+using QueryObserver = function<void(int start, int end, const SearchStats& stats)>;
+
+// Outcome of prepareContractionHierarchy(). The query timings are means over
+// sample_queries random pairs answered by both plain Dijkstra and the
+// hierarchy; mismatches counts pairs whose costs differed.
+struct ContractionReport {
+    double preprocessing_seconds = 0.0;
+    long long original_edges = 0;
+    long long shortcuts = 0;
+    int sample_queries = 0;
+    double dijkstra_query_seconds = 0.0;
+    double ch_query_seconds = 0.0;
+    long long mismatches = 0;
+};
+
+double haversineMeters(double lat1, double lon1, double lat2, double lon2);
+
+// Scratch buffers for one search over a finalized graph. They are sized once
+// per graph and reset by walking only the entries the previous search
+// touched, so a query does not allocate after the first one.
+struct SearchWorkspace {
+    vector<double> distance;
+    vector<int> predecessor;
+    vector<int> touched;
+    vector<pair<double, int>> heap;
+    vector<char> is_target;  // scratch flags for multi-target searches
+
+    void prepare(size_t node_count);
+    void reset();
+    void relax(int index, double dist, int pred);
+    long long bytesReserved() const;
 };
 
 class RouteGraph {
 private:
+    // Build phase: nodes in insertion order (a node's dense index is its
+    // position here) and the edges added since the last finalize().
     vector<Node> nodes;
     vector<Edge> edges;
-    map<int, vector<Edge>> adjacency_list;
-    
+    unordered_map<int, int> id_to_index;
+
+    // Frozen phase: compressed sparse row adjacency over dense indices.
+    // The FlatArrays below may view a memory-mapped snapshot (see
+    // loadSnapshot()) instead of owning their elements.
+    // The out-edges of node i are positions offsets[i] .. offsets[i+1]-1.
+    bool finalized = false;
+    FlatArray<int> offsets;
+    FlatArray<int> targets;
+    // METRIC_COUNT values per edge: edge_metrics[e * METRIC_COUNT + metric].
+    FlatArray<double> edge_metrics;
+    // Reverse adjacency: the in-edges of node i are rev_offsets[i] ..
+    // rev_offsets[i+1]-1, each holding the source index and the position of
+    // the edge in the forward arrays.
+    FlatArray<int> rev_offsets;
+    FlatArray<int> rev_sources;
+    FlatArray<int> rev_edges;
+
+    // Goal-directed search data, rebuilt after the graph changes.
+    // astar_scale is a lower bound on seconds per metre of great-circle
+    // distance over all edges, which makes scale * haversine admissible.
+    double astar_scale = -1.0;
+    MetricWeights astar_metric;
+    MetricWeights landmark_metric;
+    // Count last asked of prepareLandmarks(), reused when an ALT query with
+    // another metric rebuilds them.
+    int landmark_count = 8;
+    vector<int> landmarks;
+    FlatArray<double> landmark_from;  // d(landmark, v), laid out [v * k + l]
+    FlatArray<double> landmark_to;    // d(v, landmark), laid out [v * k + l]
+
+    // Contraction hierarchy. ch_rank[v] is the order in which v was
+    // contracted. The ch_* edge arrays hold the original edges plus the
+    // shortcuts; a shortcut stands for its two child edges, originals have
+    // child -1. The up graph lists, per node, edges to higher-ranked nodes;
+    // the down graph lists, per node, edges arriving from higher-ranked nodes.
+    MetricWeights ch_metric;
+    FlatArray<int> ch_rank;
+    FlatArray<int> ch_from;
+    FlatArray<int> ch_to;
+    FlatArray<double> ch_cost;
+    FlatArray<int> ch_child1;
+    FlatArray<int> ch_child2;
+    FlatArray<int> ch_up_offsets;
+    FlatArray<int> ch_up_edges;
+    FlatArray<int> ch_down_offsets;
+    FlatArray<int> ch_down_edges;
+
+    // Incremental merging: a spatial hash of node indices by grid cell of
+    // snap_cell_degrees, the (source, target) index pairs already present and
+    // the next unused node id. Rebuilt lazily after any other mutation.
+    double snap_cell_degrees = 0.0;
+    unordered_map<long long, vector<int>> snap_cells;
+    unordered_set<long long> edge_pairs;
+    bool merge_index_valid = false;
+    int next_node_id = 0;
+
+    // Spatial index over node positions: a k-d tree on unit-sphere vectors,
+    // stored implicitly (the median of kd_order[lo, hi) splits on axis
+    // depth % 3). kd_points holds x, y, z per tree slot. Rebuilt on demand
+    // after nodes are added or moved.
+    vector<int> kd_order;
+    vector<double> kd_points;
+    bool spatial_index_valid = false;
+
+    // Opt-in route cache, cleared whenever nodes or edges are added. The
+    // mutex lets batch workers share it.
+    LruCache<QueryKey, CachedRoute, QueryKeyHash> query_cache;
+    mutex cache_mutex;
+
+    SearchWorkspace workspace;
+    SearchWorkspace backward_workspace;
+    SearchStats last_stats;
+    SearchTotals totals;
+    mutex totals_mutex;
+    QueryObserver observer;
+
+    int indexOf(int id) const;
+    void invalidateCache();
+    void rebuildMergeIndex(double cell_degrees);
+    void ensureSpatialIndex();
+    void kdBuild(size_t lo, size_t hi, int depth);
+    long long snapCell(int lat_cell, int lon_cell) const;
+    bool cachedRoute(const QueryKey& key, CachedRoute& route);
+    void storeRoute(const QueryKey& key, double cost, const vector<int>& path);
+    void recordQuery(int start, int end, const SearchStats& stats);
+    void ensureFinalized();
+    void thaw();
+    double edgeCost(int e, const MetricWeights& metric) const {
+        const double* m = &edge_metrics[(size_t)e * METRIC_COUNT];
+        return metric.w[0] * m[0] + metric.w[1] * m[1] + metric.w[2] * m[2] + metric.w[3] * m[3];
+    }
+    void dijkstra(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                  SearchStats& stats) const;
+    void oneToAll(SearchWorkspace& ws, int source, bool backward, const MetricWeights& metric) const;
+    void prepareSearch(SearchAlgorithm algorithm, const MetricWeights& metric);
+    void astarSearch(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                     SearchStats& stats) const;
+    void altSearch(SearchWorkspace& ws, int source, int target, const MetricWeights& metric,
+                   SearchStats& stats) const;
+    vector<int> chSearch(SearchWorkspace& fwd, SearchWorkspace& bwd, int source, int target,
+                         SearchStats& stats, double* cost) const;
+    void unpackEdge(int edge, vector<int>& path) const;
+    void oneToMany(SearchWorkspace& ws, int source, const vector<int>& target_list,
+                   const MetricWeights& metric, double* costs, SearchStats& stats) const;
+    vector<int> runQuery(SearchWorkspace& fwd, SearchWorkspace& bwd, int source, int target,
+                         SearchAlgorithm algorithm, const MetricWeights& metric,
+                         SearchStats& stats, double* cost) const;
+    template <class Heuristic>
+    void goalDirectedSearch(SearchWorkspace& ws, int source, int target, Heuristic h,
+                            const MetricWeights& metric, SearchStats& stats) const;
+    vector<int> extractPath(const SearchWorkspace& ws, int source, int target) const;
+    bool spurSearch(SearchWorkspace& ws, int spur, int target, const vector<double>* to_target,
+                    const vector<char>& blocked, const vector<char>& next_blocked,
+                    const vector<double>* edge_scale, const MetricWeights& metric,
+                    SearchStats& stats) const;
+
 public:
     void addNode(const Node& node);
     void addEdge(const Edge& edge);
-    vector<int> findShortestPath(int start, int end);
-    vector<int> findPathWithWaypoints(int start, const vector<int>& waypoints, int end);
-};
\ No newline at end of file
+    // Bulk loading straight from caller-owned contiguous arrays of length n.
+    // cost, distance and weight may be null, in which case they are zero.
+    void addNodes(const int* ids, const double* lats, const double* lons, size_t n);
+    void addEdges(const int* sources, const int* targets_, const double* times,
+                  const double* costs, const double* distances, const double* weights, size_t n);
+    // Bulk export into caller-allocated arrays of nodeCount()/edgeCount() entries.
+    void copyNodes(int* ids, double* lats, double* lons) const;
+    void copyEdges(int* sources, int* targets_, double* weights, double* times,
+                   double* costs, double* distances) const;
+    // Adds a polyline of n points to the graph, reusing any existing node
+    // within tolerance_m metres of a point (nearest wins) and creating new
+    // nodes with fresh ids otherwise. Segment i (n - 1 of them) joins points
+    // i and i + 1 with the given metrics (cost, distance, weight may be
+    // null); an edge already present between the same two nodes is kept
+    // and the new one dropped. A segment whose ends snap to the same node
+    // adds its metrics to the next new edge (the last one at the end of the
+    // polyline) instead of being lost. bidirectional also adds the reverse
+    // edges.
+    MergeResult mergePolyline(const double* lats, const double* lons, size_t n, const double* times,
+                              const double* costs, const double* distances, const double* weights,
+                              double tolerance_m, bool bidirectional);
+    // Builds the spatial index if nodes were added or moved since the last
+    // build. nearestNodes() and nodesWithinRadius() call it themselves;
+    // calling it first leaves them only reading the graph, so concurrent
+    // lookups do not race on the rebuild.
+    void prepareSpatialIndex() { ensureSpatialIndex(); }
+    // Batched nearest-node lookup. For each of the n points, ids[i * k + j]
+    // and meters[i * k + j] receive the j-th closest node (great-circle
+    // distance), or -1 and inf when the graph has fewer than k nodes.
+    void nearestNodes(const double* lats, const double* lons, size_t n, int k, int* ids, double* meters);
+    // Nodes within radius_m metres of each point, closest first: point i's
+    // matches are ids[offsets[i] .. offsets[i+1]-1].
+    void nodesWithinRadius(const double* lats, const double* lons, size_t n, double radius_m,
+                           vector<long long>& offsets, vector<int>& ids, vector<double>& meters);
+    void finalize();
+    // Finalizes the graph and builds whatever algorithm needs under metric
+    // (the A* bound, landmarks or the hierarchy). Batch queries do this
+    // themselves, but calling it first means they only read shared graph
+    // state, so they can run while other threads use the graph.
+    // Returns the seconds it took.
+    double prepareQueries(SearchAlgorithm algorithm = SearchAlgorithm::DIJKSTRA,
+                          const MetricWeights& metric = MetricWeights());
+    bool isFinalized() const { return finalized; }
+    size_t nodeCount() const { return nodes.size(); }
+    size_t edgeCount() const { return finalized ? targets.size() : edges.size(); }
+    vector<int> findShortestPath(int start, int end, const MetricWeights& metric = MetricWeights(),
+                                 SearchAlgorithm algorithm = SearchAlgorithm::DIJKSTRA);
+    vector<int> findPathWithWaypoints(int start, const vector<int>& waypoints, int end,
+                                      const MetricWeights& metric = MetricWeights(),
+                                      SearchAlgorithm algorithm = SearchAlgorithm::DIJKSTRA);
+    // Visits every waypoint between fixed start and end in the cheapest
+    // order. Costs between the points come from one multi-target search per
+    // point; the order is exact (Held-Karp) for up to exact_limit waypoints
+    // (at most 16) and found by nearest neighbour plus 2-opt/Or-opt above
+    // that. The legs of the chosen order are then searched with algorithm;
+    // the multi-target searches are always Dijkstra. lastStats() sums both.
+    WaypointOrderResult findOptimalWaypointOrder(int start, const vector<int>& waypoints, int end,
+                                                 const MetricWeights& metric = MetricWeights(),
+                                                 int exact_limit = 12,
+                                                 SearchAlgorithm algorithm = SearchAlgorithm::DIJKSTRA);
+    // Fills out (row-major, sources.size() x target_ids.size()) with the
+    // cost from every source to every target, inf where unreachable or the
+    // id is unknown. Each source is one multi-target search; sources are
+    // spread over `threads` workers (0 = all cores), each with its own
+    // workspace, so no Python objects are touched and the GIL can be released
+    // once prepareQueries() has run.
+    void distanceMatrix(const vector<int>& sources, const vector<int>& target_ids,
+                        const MetricWeights& metric, int threads, double* out);
+    // Answers independent (start, end) queries concurrently on `threads`
+    // workers with per-worker workspaces. costs[i] is the cost of pair i
+    // (inf if unreachable); its path is ids[offsets[i] .. offsets[i+1]-1],
+    // empty when there is none. prepared_seconds is the time a preceding
+    // prepareQueries() took, charged to the first query's stats along with
+    // any preparation done here.
+    void findShortestPaths(const vector<pair<int, int>>& pairs, const MetricWeights& metric,
+                           SearchAlgorithm algorithm, int threads, vector<double>& costs,
+                           vector<long long>& offsets, vector<int>& ids, double prepared_seconds = 0.0);
+    // Bicriteria label-setting search for every path from start to end not
+    // dominated in (time, cost), ordered by increasing time. Stops early,
+    // leaving complete false, once max_labels labels have been created; the
+    // paths returned so far are still Pareto-optimal.
+    vector<ParetoPath> findParetoPaths(int start, int end, size_t max_labels, bool& complete);
+    // Up to k loopless paths from start to end in increasing cost. With
+    // max_overlap at 1 these are the exact k shortest (Yen's algorithm,
+    // spurring only past each path's deviation point). Below 1 a path is
+    // kept only if at most that fraction of its cost runs over the edges of
+    // any one path kept before it, and the paths come from the penalty
+    // method, which repeatedly searches after making used edges dearer. At
+    // most 32 * k paths are examined. With reuse_tree, one backward search
+    // gives every node's exact distance to end; every later search uses it
+    // as an A* heuristic (still admissible with nodes blocked or edges
+    // penalized), and a Yen spur whose tree path is not blocked needs no
+    // search at all. Without it every search is a plain Dijkstra.
+    KShortestResult findKShortestPaths(int start, int end, int k, const MetricWeights& metric = MetricWeights(),
+                                       double max_overlap = 1.0, bool reuse_tree = true);
+    // Everything reachable from any of sources within the largest of
+    // budgets, found by one Dijkstra seeded with every source at cost 0
+    // that stops once the next node would exceed the budget. backward
+    // follows in-edges instead, giving the nodes that reach a source within
+    // the budget. Unknown source ids are ignored; budgets must not be
+    // negative. Sets lastStats() but is not counted in the query totals.
+    ReachResult reachableWithin(const vector<int>& sources, const vector<double>& budgets,
+                                const MetricWeights& metric = MetricWeights(), bool backward = false);
+    // Picks up to count landmarks by farthest selection and stores exact
+    // distances to and from each of them under metric. Returns the landmark
+    // node ids.
+    vector<int> prepareLandmarks(int count = 8, const MetricWeights& metric = MetricWeights());
+    // Node ids of the current landmarks.
+    vector<int> landmarkIds() const;
+    // Contracts every node, adding the shortcuts that keep shortest paths
+    // intact. sample_queries random pairs are then answered both ways to
+    // report the speedup and confirm the costs agree.
+    // The hierarchy is built for one metric; queries with another metric
+    // rebuild it.
+    ContractionReport prepareContractionHierarchy(int sample_queries = 0,
+                                                  const MetricWeights& metric = MetricWeights());
+    bool hasContractionHierarchy() const { return !ch_rank.empty(); }
+    // Stats of the latest findShortestPath, or summed over the legs of the
+    // latest findPathWithWaypoints.
+    const SearchStats& lastStats() const { return last_stats; }
+    SearchTotals searchTotals();
+    void resetSearchTotals();
+    // Replaces the per-query observer; an empty function removes it. Batch
+    // queries call it from the calling thread once all workers are done.
+    void setQueryObserver(QueryObserver fn);
+    // Keeps up to capacity routes keyed by (start, end, metric); 0 turns the
+    // cache off. findPathWithWaypoints reuses cached legs.
+    void setCacheCapacity(size_t capacity);
+    void clearCache();
+    // capacity, size, hits, misses, evictions, invalidations
+    vector<long long> cacheStats();
+    // Writes the finalized graph, its landmarks and contraction hierarchy to
+    // a versioned binary file with a CRC32 per section.
+    void saveSnapshot(const string& path);
+    // Replaces this graph with a snapshot. With use_mmap the CSR and
+    // preprocessing arrays view a copy-on-write mapping of the file, so
+    // processes loading the same file share its pages; otherwise the file
+    // is read into memory. Index sections are always range-checked in one
+    // pass, so a damaged file is rejected rather than crashing a later
+    // search. verify also checks every section's CRC32, which touches the
+    // whole file and catches corrupted metrics and coordinates too.
+    void loadSnapshot(const string& path, bool use_mmap = true, bool verify = false);
+};
@@ -1,9 +1,113 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
+#include <stdexcept>
 #include "graph.h"
 
 namespace py = pybind11;
 
+// Contiguous input arrays. forcecast converts other dtypes in one C-level
+// pass, so no per-element Python objects are created either way.
+using IntArray = py::array_t<int, py::array::c_style | py::array::forcecast>;
+using DoubleArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+
+static size_t checkLength(const py::array& arr, size_t n, const char* name) {
+    if (arr.ndim() != 1 || (size_t)arr.shape(0) != n) {
+        throw std::invalid_argument(std::string(name) + " must be a 1-D array of length " + std::to_string(n));
+    }
+    return n;
+}
+
+static const double* optionalColumn(const py::object& obj, DoubleArray& holder, size_t n, const char* name) {
+    if (obj.is_none()) return nullptr;
+    holder = DoubleArray::ensure(obj);
+    if (!holder) throw std::invalid_argument(std::string(name) + " must be convertible to a float array");
+    checkLength(holder, n, name);
+    return holder.data();
+}
+
+// str or os.PathLike to a filesystem path string.
+static std::string fsPath(const py::object& path) {
+    return py::str(py::module_::import("os").attr("fspath")(path)).cast<std::string>();
+}
+
+static SearchAlgorithm parseAlgorithm(const std::string& name) {
+    if (name == "dijkstra") return SearchAlgorithm::DIJKSTRA;
+    if (name == "astar") return SearchAlgorithm::ASTAR;
+    if (name == "alt") return SearchAlgorithm::ALT;
+    if (name == "ch") return SearchAlgorithm::CH;
+    throw std::invalid_argument("Unknown algorithm '" + name + "' (expected dijkstra, astar, alt or ch)");
+}
+
+// A metric is either a name ("time", "cost", "distance", "weight") or a
+// dict mapping names to weights for a linear combination.
+static Metric parseMetricName(const std::string& name) {
+    if (name == "time") return METRIC_TIME;
+    if (name == "cost") return METRIC_COST;
+    if (name == "distance") return METRIC_DISTANCE;
+    if (name == "weight") return METRIC_WEIGHT;
+    throw std::invalid_argument("Unknown metric '" + name + "' (expected time, cost, distance or weight)");
+}
+
+static MetricWeights parseMetric(const py::object& metric) {
+    if (py::isinstance<py::str>(metric)) return MetricWeights::single(parseMetricName(metric.cast<std::string>()));
+    if (!py::isinstance<py::dict>(metric)) {
+        throw std::invalid_argument("metric must be a metric name or a dict of metric weights");
+    }
+    MetricWeights mw;
+    for (int k = 0; k < METRIC_COUNT; k++) mw.w[k] = 0.0;
+    for (auto item : metric.cast<py::dict>()) {
+        double weight = item.second.cast<double>();
+        if (weight < 0) throw std::invalid_argument("metric weights must be non-negative");
+        mw.w[parseMetricName(item.first.cast<std::string>())] = weight;
+    }
+    return mw;
+}
+
+static py::dict statsToDict(const SearchStats& stats) {
+    py::dict out;
+    out["nodes_settled"] = stats.nodes_settled;
+    out["edges_relaxed"] = stats.edges_relaxed;
+    out["heap_pushes"] = stats.heap_pushes;
+    out["heap_pops"] = stats.heap_pops;
+    out["stale_pops"] = stats.stale_pops;
+    out["bytes_allocated"] = stats.bytes_allocated;
+    out["cache_hit"] = stats.cache_hit;
+    out["prepare_seconds"] = stats.prepare_seconds;
+    out["search_seconds"] = stats.search_seconds;
+    out["path_seconds"] = stats.path_seconds;
+    out["elapsed_seconds"] = stats.elapsed_seconds;
+    return out;
+}
+
+static py::dict totalsToDict(const SearchTotals& totals) {
+    py::dict out = statsToDict(totals.sum);
+    out.attr("pop")("cache_hit");
+    out["queries"] = totals.queries;
+    out["cache_hits"] = totals.cache_hits;
+    out["max_elapsed_seconds"] = totals.max_elapsed_seconds;
+    return out;
+}
+
+// A path, or (path, stats) when the caller asked for stats.
+static py::object withStats(const std::vector<int>& path, const RouteGraph& g, bool with_stats) {
+    if (!with_stats) return py::cast(path);
+    return py::make_tuple(path, statsToDict(g.lastStats()));
+}
+
+static py::dict reportToDict(const ContractionReport& report) {
+    py::dict out;
+    out["preprocessing_seconds"] = report.preprocessing_seconds;
+    out["original_edges"] = report.original_edges;
+    out["shortcuts"] = report.shortcuts;
+    out["sample_queries"] = report.sample_queries;
+    out["dijkstra_query_seconds"] = report.dijkstra_query_seconds;
+    out["ch_query_seconds"] = report.ch_query_seconds;
+    out["speedup"] = report.ch_query_seconds > 0 ? report.dijkstra_query_seconds / report.ch_query_seconds : 0.0;
+    out["mismatches"] = report.mismatches;
+    return out;
+}
+
 PYBIND11_MODULE(route_optimizer, m) {
     py::class_<Node>(m, "Node")
         .def(py::init<int, double, double, std::string>(),
@@ -17,20 +121,330 @@ PYBIND11_MODULE(route_optimizer, m) {
         .def_readwrite("name", &Node::name);
 
     py::class_<Edge>(m, "Edge")
-        .def(py::init<int, int, double, double>(),
+        .def(py::init<int, int, double, double, double, double>(),
              py::arg("source") = 0,
              py::arg("target") = 0,
              py::arg("weight") = 0.0,
-             py::arg("time") = 0.0)
+             py::arg("time") = 0.0,
+             py::arg("cost") = 0.0,
+             py::arg("distance") = 0.0)
         .def_readwrite("source", &Edge::source)
         .def_readwrite("target", &Edge::target)
         .def_readwrite("weight", &Edge::weight)
-        .def_readwrite("time", &Edge::time);
+        .def_readwrite("time", &Edge::time)
+        .def_readwrite("cost", &Edge::cost)
+        .def_readwrite("distance", &Edge::distance);
 
     py::class_<RouteGraph>(m, "RouteGraph")
         .def(py::init<>())
         .def("add_node", &RouteGraph::addNode)
         .def("add_edge", &RouteGraph::addEdge)
-        .def("find_shortest_path", &RouteGraph::findShortestPath)
-        .def("find_path_with_waypoints", &RouteGraph::findPathWithWaypoints);
-}
\ No newline at end of file
+        .def("add_nodes", [](RouteGraph& g, IntArray ids, DoubleArray lats, DoubleArray lons) {
+                 size_t n = ids.ndim() == 1 ? (size_t)ids.shape(0) : 0;
+                 checkLength(ids, n, "ids");
+                 checkLength(lats, n, "lats");
+                 checkLength(lons, n, "lons");
+                 g.addNodes(ids.data(), lats.data(), lons.data(), n);
+             },
+             py::arg("ids"), py::arg("lats"), py::arg("lons"))
+        .def("add_edges", [](RouteGraph& g, IntArray src, IntArray dst, DoubleArray time,
+                             py::object cost, py::object distance, py::object weight) {
+                 size_t n = src.ndim() == 1 ? (size_t)src.shape(0) : 0;
+                 checkLength(src, n, "src");
+                 checkLength(dst, n, "dst");
+                 checkLength(time, n, "time");
+                 DoubleArray cost_arr, distance_arr, weight_arr;
+                 const double* c = optionalColumn(cost, cost_arr, n, "cost");
+                 const double* d = optionalColumn(distance, distance_arr, n, "distance");
+                 const double* w = optionalColumn(weight, weight_arr, n, "weight");
+                 g.addEdges(src.data(), dst.data(), time.data(), c, d, w, n);
+             },
+             py::arg("src"), py::arg("dst"), py::arg("time"),
+             py::arg("cost") = py::none(), py::arg("distance") = py::none(),
+             py::arg("weight") = py::none())
+        .def("merge_polyline", [](RouteGraph& g, DoubleArray lats, DoubleArray lons, DoubleArray time,
+                                  py::object cost, py::object distance, py::object weight,
+                                  double tolerance, bool bidirectional) {
+                 size_t n = lats.ndim() == 1 ? (size_t)lats.shape(0) : 0;
+                 checkLength(lats, n, "lats");
+                 checkLength(lons, n, "lons");
+                 size_t segments = n > 0 ? n - 1 : 0;
+                 checkLength(time, segments, "time");
+                 DoubleArray cost_arr, distance_arr, weight_arr;
+                 const double* c = optionalColumn(cost, cost_arr, segments, "cost");
+                 const double* d = optionalColumn(distance, distance_arr, segments, "distance");
+                 const double* w = optionalColumn(weight, weight_arr, segments, "weight");
+                 MergeResult merged = g.mergePolyline(lats.data(), lons.data(), n, time.data(), c, d, w,
+                                                      tolerance, bidirectional);
+                 py::dict out;
+                 out["ids"] = py::array_t<int>(merged.ids.size(), merged.ids.data());
+                 out["new_nodes"] = merged.new_nodes;
+                 out["snapped"] = merged.snapped;
+                 out["new_edges"] = merged.new_edges;
+                 out["duplicate_edges"] = merged.duplicate_edges;
+                 return out;
+             },
+             py::arg("lats"), py::arg("lons"), py::arg("time"),
+             py::arg("cost") = py::none(), py::arg("distance") = py::none(),
+             py::arg("weight") = py::none(), py::arg("tolerance") = 5.0, py::arg("bidirectional") = false)
+        .def("nearest", [](RouteGraph& g, DoubleArray lats, DoubleArray lons, int k) {
+                 size_t n = lats.ndim() == 1 ? (size_t)lats.shape(0) : 0;
+                 checkLength(lats, n, "lats");
+                 checkLength(lons, n, "lons");
+                 if (k < 1) throw std::invalid_argument("k must be at least 1");
+                 py::array_t<int> ids({n, (size_t)k});
+                 py::array_t<double> meters({n, (size_t)k});
+                 int* id_out = ids.mutable_data();
+                 double* meter_out = meters.mutable_data();
+                 // The index is (re)built while the GIL still serializes callers.
+                 g.prepareSpatialIndex();
+                 {
+                     py::gil_scoped_release release;
+                     g.nearestNodes(lats.data(), lons.data(), n, k, id_out, meter_out);
+                 }
+                 py::dict out;
+                 out["ids"] = ids;
+                 out["meters"] = meters;
+                 return out;
+             },
+             py::arg("lats"), py::arg("lons"), py::arg("k") = 1)
+        .def("within_radius", [](RouteGraph& g, DoubleArray lats, DoubleArray lons, double radius) {
+                 size_t n = lats.ndim() == 1 ? (size_t)lats.shape(0) : 0;
+                 checkLength(lats, n, "lats");
+                 checkLength(lons, n, "lons");
+                 std::vector<long long> offsets;
+                 std::vector<int> ids;
+                 std::vector<double> meters;
+                 // The index is (re)built while the GIL still serializes callers.
+                 g.prepareSpatialIndex();
+                 {
+                     py::gil_scoped_release release;
+                     g.nodesWithinRadius(lats.data(), lons.data(), n, radius, offsets, ids, meters);
+                 }
+                 py::dict out;
+                 out["offsets"] = py::array_t<long long>(offsets.size(), offsets.data());
+                 out["ids"] = py::array_t<int>(ids.size(), ids.data());
+                 out["meters"] = py::array_t<double>(meters.size(), meters.data());
+                 return out;
+             },
+             py::arg("lats"), py::arg("lons"), py::arg("radius"))
+        .def("nodes_as_arrays", [](const RouteGraph& g) {
+                 size_t n = g.nodeCount();
+                 py::array_t<int> ids(n);
+                 py::array_t<double> lats(n), lons(n);
+                 g.copyNodes(ids.mutable_data(), lats.mutable_data(), lons.mutable_data());
+                 py::dict out;
+                 out["id"] = ids;
+                 out["latitude"] = lats;
+                 out["longitude"] = lons;
+                 return out;
+             })
+        .def("edges_as_arrays", [](const RouteGraph& g) {
+                 size_t n = g.edgeCount();
+                 py::array_t<int> src(n), dst(n);
+                 py::array_t<double> weight(n), time(n), cost(n), distance(n);
+                 g.copyEdges(src.mutable_data(), dst.mutable_data(), weight.mutable_data(),
+                             time.mutable_data(), cost.mutable_data(), distance.mutable_data());
+                 py::dict out;
+                 out["source"] = src;
+                 out["target"] = dst;
+                 out["weight"] = weight;
+                 out["time"] = time;
+                 out["cost"] = cost;
+                 out["distance"] = distance;
+                 return out;
+             })
+        .def("finalize", &RouteGraph::finalize)
+        .def_property_readonly("is_finalized", &RouteGraph::isFinalized)
+        .def_property_readonly("node_count", &RouteGraph::nodeCount)
+        .def_property_readonly("edge_count", &RouteGraph::edgeCount)
+        .def("find_shortest_path", [](RouteGraph& g, int start, int end, py::object metric,
+                                      const std::string& algorithm, bool with_stats) {
+                 std::vector<int> path = g.findShortestPath(start, end, parseMetric(metric), parseAlgorithm(algorithm));
+                 return withStats(path, g, with_stats);
+             },
+             py::arg("start"), py::arg("end"), py::arg("metric") = "time", py::kw_only(),
+             py::arg("algorithm") = "dijkstra", py::arg("with_stats") = false)
+        .def("find_path_with_waypoints", [](RouteGraph& g, int start, const std::vector<int>& waypoints, int end,
+                                            py::object metric, const std::string& algorithm, bool optimize_order,
+                                            bool with_stats) {
+                 std::vector<int> path =
+                     optimize_order ? g.findOptimalWaypointOrder(start, waypoints, end, parseMetric(metric), 12,
+                                                                 parseAlgorithm(algorithm)).path
+                                    : g.findPathWithWaypoints(start, waypoints, end, parseMetric(metric),
+                                                              parseAlgorithm(algorithm));
+                 return withStats(path, g, with_stats);
+             },
+             py::arg("start"), py::arg("waypoints"), py::arg("end"), py::arg("metric") = "time", py::kw_only(),
+             py::arg("algorithm") = "dijkstra", py::arg("optimize_order") = false, py::arg("with_stats") = false)
+        .def("optimize_waypoint_order", [](RouteGraph& g, int start, const std::vector<int>& waypoints, int end,
+                                           py::object metric, int exact_limit, const std::string& algorithm) {
+                 WaypointOrderResult r = g.findOptimalWaypointOrder(start, waypoints, end, parseMetric(metric), exact_limit,
+                                                                    parseAlgorithm(algorithm));
+                 py::dict out;
+                 out["path"] = r.path;
+                 out["order"] = r.order;
+                 out["cost"] = r.cost;
+                 out["exact"] = r.exact;
+                 return out;
+             },
+             py::arg("start"), py::arg("waypoints"), py::arg("end"), py::arg("metric") = "time",
+             py::arg("exact_limit") = 12, py::kw_only(), py::arg("algorithm") = "dijkstra")
+        .def("distance_matrix", [](RouteGraph& g, IntArray sources, IntArray targets, py::object metric, int threads) {
+                 checkLength(sources, sources.ndim() == 1 ? (size_t)sources.shape(0) : 0, "sources");
+                 checkLength(targets, targets.ndim() == 1 ? (size_t)targets.shape(0) : 0, "targets");
+                 std::vector<int> src(sources.data(), sources.data() + sources.shape(0));
+                 std::vector<int> dst(targets.data(), targets.data() + targets.shape(0));
+                 MetricWeights mw = parseMetric(metric);
+                 py::array_t<double> out({(py::ssize_t)src.size(), (py::ssize_t)dst.size()});
+                 double* data = out.mutable_data();
+                 // Finalizing mutates the graph, so it happens under the GIL.
+                 g.prepareQueries(SearchAlgorithm::DIJKSTRA, mw);
+                 {
+                     py::gil_scoped_release release;
+                     g.distanceMatrix(src, dst, mw, threads, data);
+                 }
+                 return out;
+             },
+             py::arg("sources"), py::arg("targets"), py::arg("metric") = "time", py::arg("threads") = 0)
+        .def("find_shortest_paths", [](RouteGraph& g, IntArray pairs, py::object metric, int threads,
+                                       const std::string& algorithm) {
+                 if (pairs.ndim() != 2 || pairs.shape(1) != 2) {
+                     throw std::invalid_argument("pairs must be an array of shape (n, 2)");
+                 }
+                 std::vector<std::pair<int, int>> queries((size_t)pairs.shape(0));
+                 const int* raw = pairs.data();
+                 for (size_t i = 0; i < queries.size(); i++) queries[i] = {raw[2 * i], raw[2 * i + 1]};
+                 MetricWeights mw = parseMetric(metric);
+                 SearchAlgorithm alg = parseAlgorithm(algorithm);
+                 std::vector<double> costs;
+                 std::vector<long long> offsets;
+                 std::vector<int> ids;
+                 // Finalizing and building landmarks or the hierarchy mutate
+                 // the graph, so they happen under the GIL.
+                 double prepared = g.prepareQueries(alg, mw);
+                 {
+                     py::gil_scoped_release release;
+                     g.findShortestPaths(queries, mw, alg, threads, costs, offsets, ids, prepared);
+                 }
+                 py::dict out;
+                 out["costs"] = py::array_t<double>(costs.size(), costs.data());
+                 out["offsets"] = py::array_t<long long>(offsets.size(), offsets.data());
+                 out["ids"] = py::array_t<int>(ids.size(), ids.data());
+                 return out;
+             },
+             py::arg("pairs"), py::arg("metric") = "time", py::kw_only(), py::arg("threads") = 0,
+             py::arg("algorithm") = "dijkstra")
+        .def("find_pareto_paths", [](RouteGraph& g, int start, int end, size_t max_labels) {
+                 bool complete = true;
+                 py::list paths;
+                 for (const ParetoPath& p : g.findParetoPaths(start, end, max_labels, complete)) {
+                     py::dict entry;
+                     entry["time"] = p.time;
+                     entry["cost"] = p.cost;
+                     entry["path"] = p.path;
+                     paths.append(entry);
+                 }
+                 py::dict out;
+                 out["paths"] = paths;
+                 out["complete"] = complete;
+                 return out;
+             },
+             py::arg("start"), py::arg("end"), py::arg("max_labels") = 1000000)
+        .def("find_k_shortest_paths", [](RouteGraph& g, int start, int end, int k, py::object metric,
+                                         double max_overlap, bool reuse_tree) {
+                 KShortestResult r = g.findKShortestPaths(start, end, k, parseMetric(metric), max_overlap, reuse_tree);
+                 py::list paths;
+                 for (const RankedPath& p : r.paths) {
+                     py::dict entry;
+                     entry["cost"] = p.cost;
+                     entry["path"] = p.path;
+                     paths.append(entry);
+                 }
+                 py::dict out;
+                 out["paths"] = paths;
+                 out["examined"] = r.examined;
+                 out["spur_searches"] = r.spur_searches;
+                 out["tree_spurs"] = r.tree_spurs;
+                 return out;
+             },
+             py::arg("start"), py::arg("end"), py::arg("k") = 3, py::arg("metric") = "time", py::kw_only(),
+             py::arg("max_overlap") = 1.0, py::arg("reuse_tree") = true)
+        // sources and budgets may be scalars or arrays of any shape.
+        .def("reachable_within", [](RouteGraph& g, const py::object& sources, const py::object& budgets,
+                                    py::object metric, bool reverse) {
+                 IntArray src = IntArray::ensure(sources);
+                 DoubleArray lim = DoubleArray::ensure(budgets);
+                 if (!src) throw std::invalid_argument("sources must be convertible to an int array");
+                 if (!lim) throw std::invalid_argument("budgets must be convertible to a float array");
+                 std::vector<int> ids(src.data(), src.data() + src.size());
+                 std::vector<double> limits(lim.data(), lim.data() + lim.size());
+                 ReachResult r = g.reachableWithin(ids, limits, parseMetric(metric), reverse);
+                 py::dict out;
+                 out["ids"] = py::array_t<int>(r.ids.size(), r.ids.data());
+                 out["costs"] = py::array_t<double>(r.costs.size(), r.costs.data());
+                 out["bands"] = py::array_t<int>(r.bands.size(), r.bands.data());
+                 out["origins"] = py::array_t<int>(r.origins.size(), r.origins.data());
+                 return out;
+             },
+             py::arg("sources"), py::arg("budgets"), py::arg("metric") = "time", py::kw_only(),
+             py::arg("reverse") = false)
+        .def("prepare_landmarks", [](RouteGraph& g, int count, py::object metric) {
+                 return g.prepareLandmarks(count, parseMetric(metric));
+             },
+             py::arg("count") = 8, py::arg("metric") = "time")
+        .def_property_readonly("landmarks", &RouteGraph::landmarkIds)
+        .def("prepare_contraction_hierarchy", [](RouteGraph& g, int sample_queries, py::object metric) {
+                 return reportToDict(g.prepareContractionHierarchy(sample_queries, parseMetric(metric)));
+             },
+             py::arg("sample_queries") = 0, py::arg("metric") = "time")
+        .def_property_readonly("has_contraction_hierarchy", &RouteGraph::hasContractionHierarchy)
+        .def("enable_query_cache", &RouteGraph::setCacheCapacity, py::arg("capacity") = 1024)
+        .def("disable_query_cache", [](RouteGraph& g) { g.setCacheCapacity(0); })
+        .def("clear_query_cache", &RouteGraph::clearCache)
+        .def("cache_stats", [](RouteGraph& g) {
+            std::vector<long long> stats = g.cacheStats();
+            py::dict out;
+            out["capacity"] = stats[0];
+            out["size"] = stats[1];
+            out["hits"] = stats[2];
+            out["misses"] = stats[3];
+            out["evictions"] = stats[4];
+            out["invalidations"] = stats[5];
+            return out;
+        })
+        .def("save", [](RouteGraph& g, const py::object& path) {
+                 std::string file = fsPath(path);
+                 py::gil_scoped_release release;
+                 g.saveSnapshot(file);
+             },
+             py::arg("path"))
+        .def_static("load", [](const py::object& path, bool mmap, bool verify) {
+                        std::string file = fsPath(path);
+                        auto graph = std::make_unique<RouteGraph>();
+                        py::gil_scoped_release release;
+                        graph->loadSnapshot(file, mmap, verify);
+                        return graph;
+                    },
+                    py::arg("path"), py::arg("mmap") = true, py::arg("verify") = false)
+        .def_property_readonly("last_query_stats", [](const RouteGraph& g) {
+            return statsToDict(g.lastStats());
+        })
+        .def("query_totals", [](RouteGraph& g) { return totalsToDict(g.searchTotals()); })
+        .def("reset_query_totals", &RouteGraph::resetSearchTotals)
+        // callback(start, end, stats) runs after every point-to-point query,
+        // including each leg of a waypoint route and each pair of a batch.
+        .def("set_stats_callback", [](RouteGraph& g, py::object callback) {
+                 if (callback.is_none()) {
+                     g.setQueryObserver(nullptr);
+                     return;
+                 }
+                 if (!PyCallable_Check(callback.ptr())) throw py::type_error("callback must be callable or None");
+                 auto fn = std::make_shared<py::function>(callback);
+                 g.setQueryObserver([fn](int start, int end, const SearchStats& stats) {
+                     py::gil_scoped_acquire acquire;
+                     (*fn)(start, end, statsToDict(stats));
+                 });
+             },
+             py::arg("callback"));
+}
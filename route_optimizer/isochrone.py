@@ -0,0 +1,180 @@
+"""Isochrones (service areas) over a RouteGraph, with outlines for Folium.
+
+RouteGraph.reachable_within does the search: one pass gives every node
+within the largest budget of its nearest source, tagged with the smallest
+budget that covers it. This module turns that into one polygon per budget.
+The outline is a concave hull dug out of the convex hull (Park & Oh): a
+hull edge is replaced by two edges through the nearest inside point while
+the edge is more than `concavity` times longer than the distance to that
+point, as long as the outline stays simple and keeps every point inside.
+"""
+import numpy as np
+
+from simplify import segment_distances, to_meters
+
+DEFAULT_CONCAVITY = 2.0
+# Points beyond this are thinned to one per grid cell before the hull is dug
+MAX_HULL_POINTS = 2000
+DEFAULT_COLORS = ("#1a9850", "#91cf60", "#fee08b", "#fc8d59", "#d73027")
+
+
+def _cross(o, a, b):
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+
+def _convex_hull(xy):
+    """Indices of the convex hull of xy, counter-clockwise (monotone chain)"""
+    # Points strictly inside the octagon of extremes cannot be on the hull,
+    # which leaves the Python loop below only a thin shell of candidates
+    x, y = xy[:, 0], xy[:, 1]
+    corners = [np.argmin(x), np.argmin(x + y), np.argmin(y), np.argmax(x - y),
+               np.argmax(x), np.argmax(x + y), np.argmax(y), np.argmin(x - y)]
+    _, first = np.unique(corners, return_index=True)
+    corners = np.array(corners)[np.sort(first)]
+    candidates = np.arange(len(xy))
+    if len(corners) >= 3:
+        a, b = xy[corners], xy[np.roll(corners, -1)]
+        inside = (_cross(a[None], b[None], xy[:, None]) > 0).all(axis=1)
+        candidates = np.flatnonzero(~inside)
+    order = candidates[np.lexsort((xy[candidates, 1], xy[candidates, 0]))]
+    lower, upper = [], []
+    for chain, indices in ((lower, order), (upper, order[::-1])):
+        for i in indices.tolist():
+            while len(chain) >= 2 and _cross(xy[chain[-2]], xy[chain[-1]], xy[i]) <= 0:
+                chain.pop()
+            chain.append(i)
+    return lower[:-1] + upper[:-1]
+
+
+def _thin(xy, max_points):
+    """Indices of at most about max_points rows of xy, one per grid cell"""
+    if len(xy) <= max_points:
+        return np.arange(len(xy))
+    span = np.ptp(xy, axis=0)
+    cell = max(float(np.sqrt(span[0] * span[1] / max_points)), float(span.max()) / max_points, 1e-9)
+    cells = np.floor((xy - xy.min(axis=0)) / cell).astype(np.int64)
+    _, keep = np.unique(cells, axis=0, return_index=True)
+    return np.sort(keep)
+
+
+def _crosses(xy, ring, a, b):
+    """Whether segment a-b properly crosses an edge of the ring not touching a or b"""
+    start = np.array(ring)
+    end = np.roll(start, -1)
+    free = (start != a) & (start != b) & (end != a) & (end != b)
+    if not free.any():
+        return False
+    p, q = xy[start[free]], xy[end[free]]
+    d1 = _cross(xy[a], xy[b], p)
+    d2 = _cross(xy[a], xy[b], q)
+    d3 = _cross(p, q, xy[a])
+    d4 = _cross(p, q, xy[b])
+    return bool(np.any((d1 * d2 < 0) & (d3 * d4 < 0)))
+
+
+def _in_triangle(xy, a, p, b):
+    """Mask of the rows of xy strictly inside the triangle with corners a, p, b"""
+    s1 = _cross(a, p, xy)
+    s2 = _cross(p, b, xy)
+    s3 = _cross(b, a, xy)
+    return ((s1 > 0) & (s2 > 0) & (s3 > 0)) | ((s1 < 0) & (s2 < 0) & (s3 < 0))
+
+
+def concave_hull(points, concavity=DEFAULT_CONCAVITY, min_edge_m=0.0, max_points=MAX_HULL_POINTS):
+    """Concave outline of (lat, lon) points as an Nx2 array of (lat, lon), not closed.
+
+    Lower concavity follows the points more tightly; edges shorter than
+    min_edge_m metres are never dug. Fewer than three distinct points are
+    returned as they are.
+    """
+    points = np.unique(np.asarray(points, dtype=np.float64).reshape(-1, 2), axis=0)
+    if len(points) < 3:
+        return points
+    full = to_meters(points)
+    # The outline is dug through the thinned points, starting from the
+    # convex hull of all of them; every dig is checked against all points
+    # (those in its x range) so the ones thinned away stay inside too.
+    hull = _convex_hull(full)
+    keep = np.union1d(_thin(full, max_points), hull)
+    points, xy = points[keep], full[keep]
+    ring = [int(i) for i in np.searchsorted(keep, hull)]
+    if len(ring) < 3:
+        return points[ring]
+    by_x = np.argsort(full[:, 0], kind="stable")
+    sorted_x = full[by_x, 0]
+
+    def empty_triangle(a, p, b):
+        lo, hi = min(a[0], p[0], b[0]), max(a[0], p[0], b[0])
+        near = full[by_x[np.searchsorted(sorted_x, lo):np.searchsorted(sorted_x, hi, side="right")]]
+        return not _in_triangle(near, a, p, b).any()
+
+    on_ring = np.zeros(len(xy), dtype=bool)
+    on_ring[ring] = True
+    i = 0
+    while i < len(ring) and not on_ring.all():
+        a, b = ring[i], ring[(i + 1) % len(ring)]
+        length = float(np.hypot(*(xy[b] - xy[a])))
+        inside = np.flatnonzero(~on_ring)
+        if length > min_edge_m:
+            p = int(inside[np.argmin(segment_distances(xy[inside], xy[a], xy[b]))])
+            near = min(np.hypot(*(xy[p] - xy[a])), np.hypot(*(xy[p] - xy[b])))
+            if (near > 0 and length / near > concavity
+                    and empty_triangle(xy[a], xy[p], xy[b])
+                    and not _crosses(xy, ring, a, p) and not _crosses(xy, ring, p, b)):
+                ring.insert(i + 1, p)
+                on_ring[p] = True
+                continue  # the new edge a-p may be dug further
+        i += 1
+    return points[ring]
+
+
+def node_coordinates(graph, ids):
+    """(lat, lon) rows for graph node ids"""
+    nodes = graph.nodes_as_arrays()
+    order = np.argsort(nodes["id"], kind="stable")
+    pos = order[np.searchsorted(nodes["id"], np.asarray(ids), sorter=order)]
+    return np.column_stack([nodes["latitude"][pos], nodes["longitude"][pos]])
+
+
+def isochrones(graph, sources, budgets, metric="time", reverse=False, hull=True,
+               concavity=DEFAULT_CONCAVITY):
+    """One dict per budget, smallest first.
+
+    Each has budget, ids, costs and origins (NumPy arrays of every node
+    within the budget, cheapest first, and the source each is reached
+    from), points (their lat, lon) and, with hull,
+    polygon (concave_hull of the points). reverse gives the nodes that
+    reach a source within the budget instead.
+    """
+    budgets = np.atleast_1d(np.asarray(budgets, dtype=np.float64))
+    reached = graph.reachable_within(sources, budgets, metric, reverse=reverse)
+    coords = node_coordinates(graph, reached["ids"])
+    bands = []
+    for budget in np.sort(budgets):
+        # costs ascend, so every band is a prefix of the result
+        count = int(np.searchsorted(reached["costs"], budget, side="right"))
+        band = {
+            "budget": float(budget),
+            "ids": reached["ids"][:count],
+            "costs": reached["costs"][:count],
+            "origins": reached["origins"][:count],
+            "points": coords[:count],
+        }
+        if hull:
+            band["polygon"] = concave_hull(band["points"], concavity)
+        bands.append(band)
+    return bands
+
+
+def add_to_map(m, bands, colors=DEFAULT_COLORS, opacity=0.35, label="{budget:g}"):
+    """Draw isochrones() polygons on a Folium map, largest underneath"""
+    import folium
+
+    for i, band in reversed(list(enumerate(bands))):
+        polygon = band.get("polygon")
+        if polygon is None or len(polygon) < 3:
+            continue
+        color = colors[min(i, len(colors) - 1)]
+        folium.Polygon(polygon.tolist(), color=color, weight=1, fill=True, fill_color=color,
+                       fill_opacity=opacity, tooltip=label.format(**band)).add_to(m)
+    return m
@@ -0,0 +1,70 @@
+#pragma once
+#include <list>
+#include <unordered_map>
+#include <utility>
+using namespace std;
+
+// Fixed-capacity map that evicts the least recently used entry. Not
+// thread-safe; callers serialize access. A capacity of 0 disables it.
+template <class Key, class Value, class Hash>
+class LruCache {
+private:
+    typedef pair<Key, Value> Entry;
+    size_t capacity_ = 0;
+    list<Entry> entries;  // most recently used first
+    unordered_map<Key, typename list<Entry>::iterator, Hash> index;
+
+public:
+    long long hits = 0;
+    long long misses = 0;
+    long long evictions = 0;
+    long long invalidations = 0;
+
+    size_t capacity() const { return capacity_; }
+    size_t size() const { return entries.size(); }
+    bool enabled() const { return capacity_ > 0; }
+
+    void setCapacity(size_t capacity) {
+        capacity_ = capacity;
+        while (entries.size() > capacity_) evictOldest();
+    }
+
+    // Returns the cached value or null, refreshing the entry on a hit.
+    const Value* get(const Key& key) {
+        auto it = index.find(key);
+        if (it == index.end()) {
+            misses++;
+            return nullptr;
+        }
+        hits++;
+        entries.splice(entries.begin(), entries, it->second);
+        return &it->second->second;
+    }
+
+    void put(const Key& key, Value value) {
+        if (capacity_ == 0) return;
+        auto it = index.find(key);
+        if (it != index.end()) {
+            it->second->second = move(value);
+            entries.splice(entries.begin(), entries, it->second);
+            return;
+        }
+        if (entries.size() >= capacity_) evictOldest();
+        entries.emplace_front(key, move(value));
+        index[key] = entries.begin();
+    }
+
+    void clear() {
+        if (entries.empty()) return;
+        entries.clear();
+        index.clear();
+        invalidations++;
+    }
+
+private:
+    void evictOldest() {
+        index.erase(entries.back().first);
+        entries.pop_back();
+        evictions++;
+    }
+};
@@ -0,0 +1,277 @@
+"""Offline road networks for RouteGraph.
+
+Two input formats are supported:
+
+* OpenStreetMap XML extracts (.osm, .osm.gz, .osm.bz2), read with iterparse
+  in two passes. The first pass collects the nodes used by routable ways.
+  The second pass keeps only those coordinates and emits edges as the ways
+  stream past. Memory grows with the road network, not with the file.
+* A plain CSV pair: nodes (id, lat, lon) and edges (source, target and the
+  optional columns distance, time, cost, speed, highway, oneway).
+
+OSM and CSV node ids are remapped to dense 0..n-1 graph ids. The loaders
+return the original ids as an array so graph ids can be mapped back. Edges
+are bulk-loaded in chunks of chunk_size. Distances are in metres, times in
+seconds and costs are 0.01 per metre, matching parse_to_graph.
+"""
+import bz2
+import csv
+import gzip
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+
+import route_optimizer
+
+# Free-flow speeds (km/h) for routable highway classes when a way has no
+# usable maxspeed tag.
+ROAD_SPEEDS = {
+    'motorway': 110, 'motorway_link': 60,
+    'trunk': 90, 'trunk_link': 50,
+    'primary': 70, 'primary_link': 45,
+    'secondary': 60, 'secondary_link': 40,
+    'tertiary': 50, 'tertiary_link': 35,
+    'unclassified': 40, 'residential': 30,
+    'living_street': 10, 'service': 20, 'road': 40,
+}
+DEFAULT_SPEED = 40
+COST_PER_METER = 0.01
+EARTH_RADIUS_M = 6371000.0
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance between coordinate arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _parse_speed(value, highway):
+    """km/h from a maxspeed tag ("50", "30 mph"), else the class default"""
+    if value:
+        number = value.split()[0].split(';')[0]
+        try:
+            speed = float(number)
+            return speed * 1.609344 if 'mph' in value else speed
+        except ValueError:
+            pass
+    return ROAD_SPEEDS.get(highway, DEFAULT_SPEED)
+
+
+def _direction(tags, highway):
+    """1 forward only, -1 backward only, 0 both ways"""
+    oneway = tags.get('oneway', '').lower()
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1' or oneway == 'reverse':
+        return -1
+    if oneway == 'no':
+        return 0
+    if highway in ('motorway', 'motorway_link') or tags.get('junction') == 'roundabout':
+        return 1
+    return 0
+
+
+class _EdgeBuffer:
+    """Collects edges and flushes them to the graph in fixed-size chunks"""
+
+    def __init__(self, graph, lats, lons, chunk_size):
+        self.graph = graph
+        self.lats = lats
+        self.lons = lons
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._reset()
+
+    def _reset(self):
+        self.src = array('i')
+        self.dst = array('i')
+        self.speed = array('d')
+        self.distance = array('d')
+        self.time = array('d')
+        self.cost = array('d')
+
+    def add(self, u, v, kmh, both_ways, distance=np.nan, time=np.nan, cost=np.nan):
+        """NaN distance/time/cost are derived from coordinates and speed"""
+        self.src.append(u)
+        self.dst.append(v)
+        self.speed.append(kmh)
+        self.distance.append(distance)
+        self.time.append(time)
+        self.cost.append(cost)
+        if both_ways:
+            self.add(v, u, kmh, False, distance, time, cost)
+        elif len(self.src) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.src:
+            return
+        src = np.frombuffer(self.src, dtype=np.int32)
+        dst = np.frombuffer(self.dst, dtype=np.int32)
+        lats = np.frombuffer(self.lats, dtype=np.float64)
+        lons = np.frombuffer(self.lons, dtype=np.float64)
+        distance = np.frombuffer(self.distance, dtype=np.float64).copy()
+        missing = np.isnan(distance)
+        if missing.any():
+            distance[missing] = haversine_meters(lats[src[missing]], lons[src[missing]],
+                                                 lats[dst[missing]], lons[dst[missing]])
+        time = np.frombuffer(self.time, dtype=np.float64).copy()
+        missing = np.isnan(time)
+        time[missing] = distance[missing] / (np.frombuffer(self.speed, dtype=np.float64)[missing] / 3.6)
+        cost = np.frombuffer(self.cost, dtype=np.float64).copy()
+        missing = np.isnan(cost)
+        cost[missing] = distance[missing] * COST_PER_METER
+        self.graph.add_edges(src, dst, time, cost=cost, distance=distance)
+        self.count += len(src)
+        self._reset()
+
+
+def _add_nodes(graph, lats, lons):
+    n = len(lats)
+    graph.add_nodes(np.arange(n, dtype=np.int32),
+                    np.frombuffer(lats, dtype=np.float64),
+                    np.frombuffer(lons, dtype=np.float64))
+
+
+def _iter_elements(path):
+    """Yield each top-level OSM element, dropping it from the tree afterwards"""
+    with _open(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        depth = 0
+        for event, elem in context:
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0:
+                yield elem
+                root.clear()
+
+
+def _routable_way(elem, highways):
+    """(node refs, tags) of a way worth routing on, else None"""
+    tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+    if tags.get('highway') not in highways or tags.get('area') == 'yes':
+        return None
+    return [int(nd.get('ref')) for nd in elem.iter('nd')], tags
+
+
+def load_osm(path, highways=None, chunk_size=100000):
+    """Import the routable ways of an OSM XML extract.
+
+    highways restricts the accepted highway classes (default: ROAD_SPEEDS).
+    Returns a new finalized graph and osm_ids, where osm_ids[i] is the OSM
+    id of graph node i.
+    """
+    graph = route_optimizer.RouteGraph()
+    highways = set(highways or ROAD_SPEEDS)
+
+    # Pass 1: which nodes are on a routable way
+    used = set()
+    for elem in _iter_elements(path):
+        if elem.tag == 'way':
+            way = _routable_way(elem, highways)
+            if way:
+                used.update(way[0])
+
+    # Pass 2: coordinates of those nodes (dense ids in file order), then
+    # edges as the ways stream past. OSM files list all nodes first.
+    index = {}
+    osm_ids = array('q')
+    lats = array('d')
+    lons = array('d')
+    buffer = _EdgeBuffer(graph, lats, lons, chunk_size)
+    for elem in _iter_elements(path):
+        if elem.tag == 'node':
+            osm_id = int(elem.get('id'))
+            if osm_id in used:
+                index[osm_id] = len(osm_ids)
+                osm_ids.append(osm_id)
+                lats.append(float(elem.get('lat')))
+                lons.append(float(elem.get('lon')))
+        elif elem.tag == 'way':
+            way = _routable_way(elem, highways)
+            if not way:
+                continue
+            refs, tags = way
+            highway = tags['highway']
+            kmh = _parse_speed(tags.get('maxspeed'), highway)
+            direction = _direction(tags, highway)
+            if direction == -1:
+                refs = refs[::-1]
+            # A ref missing from the extract (clipped at its boundary) splits
+            # the way; its neighbours are not joined straight across the gap
+            points = [index.get(r) for r in refs]
+            for u, v in zip(points, points[1:]):
+                if u is not None and v is not None and u != v:
+                    buffer.add(u, v, kmh, direction == 0)
+        elif elem.tag == 'relation':
+            break
+    buffer.flush()
+    _add_nodes(graph, lats, lons)
+    graph.finalize()
+    return graph, np.frombuffer(osm_ids, dtype=np.int64)
+
+
+def load_csv(nodes_path, edges_path, chunk_size=100000):
+    """Import a CSV node/edge network.
+
+    nodes_path needs the columns id, lat and lon. edges_path needs source
+    and target. It may also have distance (m), time (s), cost, speed (km/h)
+    or highway (either gives the speed when time is missing) and oneway
+    (1/yes/true; default two-way). Missing distances come from the coordinates and
+    missing costs from the distance. Returns (graph, ids) like load_osm;
+    ids holds the original CSV ids.
+    """
+    graph = route_optimizer.RouteGraph()
+    index = {}
+    ids = []
+    lats = array('d')
+    lons = array('d')
+    with open(nodes_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            key = row['id'].strip()
+            if key in index:
+                raise ValueError(f"Duplicate node id {key} in {nodes_path}")
+            index[key] = len(ids)
+            ids.append(key)
+            lats.append(float(row['lat']))
+            lons.append(float(row['lon']))
+
+    def number(row, column):
+        value = (row.get(column) or '').strip()
+        return float(value) if value else np.nan
+
+    buffer = _EdgeBuffer(graph, lats, lons, chunk_size)
+    with open(edges_path, newline='', encoding='utf-8') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                u = index[row['source'].strip()]
+                v = index[row['target'].strip()]
+            except KeyError as e:
+                raise ValueError(f"{edges_path}:{line}: unknown node {e.args[0]}")
+            both_ways = (row.get('oneway') or '').strip().lower() not in ('1', 'yes', 'true')
+            kmh = number(row, 'speed')
+            if np.isnan(kmh):
+                kmh = ROAD_SPEEDS.get((row.get('highway') or '').strip(), DEFAULT_SPEED)
+            buffer.add(u, v, kmh, both_ways, number(row, 'distance'), number(row, 'time'), number(row, 'cost'))
+    buffer.flush()
+    _add_nodes(graph, lats, lons)
+    graph.finalize()
+    try:
+        numeric = np.array(ids, dtype=np.int64)
+    except ValueError:
+        numeric = np.array(ids, dtype=object)
+    return graph, numeric
@@ -0,0 +1,116 @@
+"""Offline rail network for Train mode.
+
+data/rail_stations.csv is a small gazetteer of major stations (code,
+name, "|"-separated aliases, coordinates). data/rail_links.csv joins
+adjacent stations with the corridor they lie on and a typical express
+speed in km/h.
+Both are loaded with network_import.load_csv, so stations are dense graph
+ids and link distances are great-circle between the two stations. Track
+is longer than that, so distances and times are estimates. A journey is
+one search over the in-memory graph. Corridors are sections of track, not
+train services, so moving from one to the next is not a change of train.
+"""
+import csv
+import os
+import threading
+
+from network_import import load_csv
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+STATIONS_CSV = os.path.join(DATA_DIR, 'rail_stations.csv')
+LINKS_CSV = os.path.join(DATA_DIR, 'rail_links.csv')
+
+# Dropped from the end of a query when there is no exact match
+_SUFFIXES = (' railway station', ' station', ' junction', ' jn', ' jn.', ' central', ' cantt')
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class RailNetwork:
+    def __init__(self, stations_path=STATIONS_CSV, links_path=LINKS_CSV):
+        self.graph, codes = load_csv(stations_path, links_path)
+        self.codes = [str(code) for code in codes]
+        index = {code: i for i, code in enumerate(self.codes)}
+
+        self.names = [None] * len(self.codes)
+        self.coords = [None] * len(self.codes)
+        self.lookup = {}
+        with open(stations_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                i = index[row['id'].strip()]
+                self.names[i] = row['name'].strip()
+                self.coords[i] = (float(row['lat']), float(row['lon']))
+                aliases = [a for a in (row.get('aliases') or '').split('|') if a.strip()]
+                for key in [row['id'], row['name']] + aliases:
+                    # First come wins, so a city name keeps its main station
+                    self.lookup.setdefault(_normalize(key), i)
+
+        corridors = {}
+        with open(links_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                u, v = index[row['source'].strip()], index[row['target'].strip()]
+                corridors[(u, v)] = corridors[(v, u)] = row.get('corridor', '').strip()
+        edges = self.graph.edges_as_arrays()
+        self.links = {}
+        for u, v, time, distance in zip(edges['source'], edges['target'], edges['time'], edges['distance']):
+            self.links[(int(u), int(v))] = (float(time), float(distance), corridors.get((int(u), int(v)), ''))
+
+    def find_station(self, text):
+        """Graph id of a station by code, name or alias (case-insensitive), or None"""
+        key = _normalize(text)
+        if key in self.lookup:
+            return self.lookup[key]
+        for suffix in _SUFFIXES:
+            if key.endswith(suffix) and key[:-len(suffix)] in self.lookup:
+                return self.lookup[key[:-len(suffix)]]
+        return None
+
+    def route(self, origin, destination, metric='time'):
+        """Fastest journey between two stations as a dict of stations, coords, corridors and totals.
+
+        junctions are the stations where the journey moves from one
+        corridor to the next.
+        """
+        ends = []
+        for place in (origin, destination):
+            station = self.find_station(place)
+            if station is None:
+                raise Exception(f"No station found for '{place}'")
+            ends.append(station)
+
+        path = self.graph.find_shortest_path(ends[0], ends[1], metric)
+        if not path:
+            raise Exception(f"No rail connection between {self.names[ends[0]]} and {self.names[ends[1]]}")
+
+        legs = [self.links[(u, v)] for u, v in zip(path, path[1:])]
+        corridors = []
+        junctions = []
+        for (_, _, corridor), station in zip(legs, path):
+            if corridors and corridor != corridors[-1]:
+                junctions.append(self.names[station])
+            if not corridors or corridor != corridors[-1]:
+                corridors.append(corridor)
+        return {
+            'stations': [self.names[i] for i in path],
+            'codes': [self.codes[i] for i in path],
+            'coords': [self.coords[i] for i in path],
+            'corridors': corridors,
+            'junctions': junctions,
+            'time': sum(leg[0] for leg in legs),
+            'distance': sum(leg[1] for leg in legs),
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def rail_network():
+    """Process-wide network, loaded on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RailNetwork()
+        return _shared
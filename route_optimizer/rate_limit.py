@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Requests per second and burst size per host. Nominatim's usage policy
+# allows one request per second; the public OSRM demo is more lenient.
+HOST_LIMITS = {
+    "nominatim.openstreetmap.org": (1.0, 1),
+    "router.project-osrm.org": (5.0, 5),
+}
+DEFAULT_LIMIT = (10.0, 10)
+
+
+class TokenBucket:
+    """Thread-safe token bucket usable from both threads and coroutines"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token now and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def limiter_for(url):
+    """Process-wide bucket for the host of url, shared by every fetcher"""
+    host = urlsplit(url).hostname or ""
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(*HOST_LIMITS.get(host, DEFAULT_LIMIT))
+            _buckets[host] = bucket
+        return bucket
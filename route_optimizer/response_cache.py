@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "route_optimizer", "responses.sqlite3")
+
+
+def normalize_key(key):
+    """Case-fold and collapse whitespace so 'New  Delhi' and 'new delhi' share an entry"""
+    return " ".join(str(key).split()).casefold()
+
+
+class PersistentCache:
+    """SQLite-backed response cache shared by the fetchers.
+
+    Entries live in a namespace ('geocode', 'route', ...) and expire after
+    ttl seconds. A put that takes the cache past max_entries drops the
+    oldest writes straight away. Rows written by other processes are
+    counted from the next trim on, so with several writers the file can
+    briefly hold more. Values must be JSON-serializable.
+    """
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600, max_entries=50000):
+        self.path = path or os.environ.get("ROUTE_OPTIMIZER_CACHE", DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)")
+        # Rows as of the last count plus writes since; replacing an entry
+        # overcounts, which only brings the next trim forward.
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, namespace, key):
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE namespace = ? AND key = ?",
+                (namespace, normalize_key(key)),
+            ).fetchone()
+            if row is None or row[1] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, namespace, key, value, ttl=None):
+        """Store value under (namespace, key), replacing any previous entry"""
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (namespace, normalize_key(key), payload, now, expires),
+            )
+            # Trimming needs a COUNT(*), so it runs when the write may have
+            # crossed max_entries, and every so often to drop expired rows.
+            self._writes += 1
+            self._rows += 1
+            if self._rows > self.max_entries or self._writes % 100 == 1:
+                self._trim(now)
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM responses")
+            else:
+                self._conn.execute("DELETE FROM responses WHERE namespace = ?", (namespace,))
+            self._rows = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _trim(self, now):
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._rows - self.max_entries
+        if excess > 0:
+            # rowid breaks ties between writes in the same clock tick
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY stored_at, rowid LIMIT ?)",
+                (excess,),
+            )
+            self._rows = self.max_entries
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """Process-wide cache instance, opened on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PersistentCache()
+        return _shared
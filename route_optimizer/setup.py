@@ -3,7 +3,7 @@ import pybind11
 
 module = Extension(
     'route_optimizer',
-    sources=['Graph.cpp', 'graph_binding.cpp'],
+    sources=['Graph.cpp', 'AStar.cpp', 'ContractionHierarchy.cpp', 'MultiCriteria.cpp', 'WaypointOrder.cpp', 'BatchQueries.cpp', 'Snapshot.cpp', 'GraphMerge.cpp', 'SpatialIndex.cpp', 'KShortestPaths.cpp', 'Isochrone.cpp', 'graph_binding.cpp'],
     include_dirs=[
         pybind11.get_include(),
         pybind11.get_include(True)  
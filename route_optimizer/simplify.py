@@ -0,0 +1,134 @@
+"""Level-of-detail simplification of route polylines for map rendering.
+
+Douglas-Peucker is run once per route to give every point a significance:
+the largest tolerance (in metres) at which the point still survives. Any
+detail level is then a single comparison against that array, so a handful
+of zoom levels costs little more than one.
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Web-Mercator ground resolution at zoom 0 on the equator, metres per pixel
+METERS_PER_PIXEL_Z0 = 2 * np.pi * 6378137.0 / 256
+DEFAULT_ZOOMS = (6, 9, 12, 15)
+
+
+def zoom_tolerance(zoom, latitude=0.0, pixels=1.0):
+    """Tolerance in metres that hides deviations smaller than `pixels` at a zoom level"""
+    return float(pixels * METERS_PER_PIXEL_Z0 * np.cos(np.radians(latitude)) / 2 ** zoom)
+
+
+def to_meters(points):
+    """(lat, lon) degrees to planar metres, equirectangular around the mean latitude"""
+    lat = np.radians(points[:, 0])
+    lon = np.radians(points[:, 1])
+    x = EARTH_RADIUS_M * np.cos(lat.mean()) * lon
+    y = EARTH_RADIUS_M * lat
+    return np.column_stack([x, y])
+
+
+def segment_distances(xy, a, b):
+    """Distance from every row of xy to the segment a-b"""
+    ab = b - a
+    length2 = ab @ ab
+    if length2 == 0:
+        return np.hypot(*(xy - a).T)
+    t = np.clip((xy - a) @ ab / length2, 0.0, 1.0)
+    closest = a + t[:, None] * ab
+    return np.hypot(*(xy - closest).T)
+
+
+def significance(points):
+    """Douglas-Peucker significance of each (lat, lon) point, in metres.
+
+    Endpoints are inf. Keeping the points whose significance exceeds a
+    tolerance gives exactly what Douglas-Peucker returns for it.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    sig = np.zeros(n)
+    if n == 0:
+        return sig
+    sig[0] = sig[-1] = np.inf
+    xy = to_meters(points)
+    # Each split inherits the smaller of its own distance and its parent's,
+    # so a point never outranks the split that exposed it.
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, cap = stack.pop()
+        if j - i < 2:
+            continue
+        d = segment_distances(xy[i + 1:j], xy[i], xy[j])
+        k = int(np.argmax(d))
+        split = i + 1 + k
+        value = min(d[k], cap)
+        sig[split] = value
+        stack.append((i, split, value))
+        stack.append((split, j, value))
+    return sig
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker simplification of (lat, lon) points with a tolerance in metres"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points[significance(points) > tolerance]
+
+
+def build_levels(points, zooms=DEFAULT_ZOOMS, pixels=1.0):
+    """Precomputed detail levels, one per zoom.
+
+    Returns a list of dicts with zoom, tolerance (m), points (an Nx2 array
+    of lat, lon) and dropped (how many input points the level omits).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    sig = significance(points)
+    latitude = float(points[:, 0].mean()) if len(points) else 0.0
+    levels = []
+    for zoom in zooms:
+        tolerance = zoom_tolerance(zoom, latitude, pixels)
+        keep = sig > tolerance
+        levels.append({
+            "zoom": zoom,
+            "tolerance": tolerance,
+            "points": points[keep],
+            "dropped": int(len(points) - keep.sum()),
+        })
+    return levels
+
+
+def pick_level(levels, zoom):
+    """The coarsest level that is still detailed enough for `zoom`"""
+    for level in levels:
+        if level["zoom"] >= zoom:
+            return level
+    return levels[-1]
+
+
+def encode_polyline(points, precision=5):
+    """Google encoded-polyline string for (lat, lon) points"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    scaled = np.round(points * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    out = []
+    for value in values.tolist():
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def decode_polyline(text, precision=5):
+    """Inverse of encode_polyline; returns an Nx2 array of (lat, lon)"""
+    values = []
+    value = shift = 0
+    for char in text:
+        chunk = ord(char) - 63
+        value |= (chunk & 0x1f) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / 10 ** precision
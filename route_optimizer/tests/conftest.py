@@ -0,0 +1,9 @@
+"""Tests run against the built extension (python setup.py build_ext --inplace)
+and import the flat modules in route_optimizer/ directly, as the apps do.
+The synthetic graph generators are shared with benchmarks/."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "benchmarks"))
@@ -0,0 +1,46 @@
+import numpy as np
+
+import route_optimizer
+from graphs import build, grid
+
+
+def test_bulk_add_matches_single_adds():
+    rng = np.random.default_rng(81)
+    ids = np.array([5, 9, 5, 2, 9], dtype=np.int32)
+    lats, lons = 28 + rng.random(5), 77 + rng.random(5)
+    bulk = route_optimizer.RouteGraph()
+    bulk.add_nodes(ids, lats, lons)
+    single = route_optimizer.RouteGraph()
+    for i, lat, lon in zip(ids.tolist(), lats, lons):
+        single.add_node(route_optimizer.Node(i, lat, lon))
+    for name in ("id", "latitude", "longitude"):
+        np.testing.assert_array_equal(bulk.nodes_as_arrays()[name], single.nodes_as_arrays()[name])
+    assert bulk.node_count == 3
+
+
+def test_bulk_add_to_a_finalized_graph():
+    graph = build(grid(4_000, seed=82))
+    graph.enable_query_cache(64)
+    path = graph.find_shortest_path(0, 500)
+    graph.find_shortest_path(0, 500)
+    before = graph.cache_stats()
+    assert before["size"] == 1
+
+    # Moving existing nodes keeps the graph finalized but clears the cache once
+    nodes = graph.nodes_as_arrays()
+    graph.add_nodes(nodes["id"][:100], nodes["latitude"][:100] + 1e-6, nodes["longitude"][:100])
+    after = graph.cache_stats()
+    assert graph.is_finalized and after["size"] == 0
+    assert after["invalidations"] == before["invalidations"] + 1
+
+    # New nodes thaw it; the edges survive
+    graph.find_shortest_path(0, 500)
+    count, edges = graph.node_count, graph.edge_count
+    new = np.arange(count, count + 50, dtype=np.int32)
+    graph.add_nodes(new, np.full(50, 28.7), np.full(50, 77.3))
+    assert not graph.is_finalized
+    assert graph.cache_stats()["invalidations"] == after["invalidations"] + 1
+    graph.finalize()
+    assert (graph.node_count, graph.edge_count) == (count + 50, edges)
+    assert graph.find_shortest_path(0, 500) == path
+    assert graph.nearest([28.7], [77.3])["ids"][0, 0] >= count
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from async_fetcher import AsyncRouteFetcher
+from response_cache import PersistentCache
+
+PLACES = {"Delhi": ("28.61", "77.21"), "Kota": ("25.18", "75.83"), "Mumbai": ("19.08", "72.88")}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Nominatim search and OSRM route endpoints answering from PLACES"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.server.hits.append(self.path)
+        if url.path == "/search":
+            place = PLACES.get(parse_qs(url.query)["q"][0])
+            body = [{"lat": place[0], "lon": place[1]}] if place else []
+        elif url.path.startswith("/route/v1/driving/"):
+            stops = url.path.rsplit("/", 1)[1].split(";")
+            body = {"code": "Ok", "routes": [{"geometry": {"coordinates": [
+                [float(v) for v in stop.split(",")] for stop in stops]}}]}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.hits = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher_for(server, tmp_path):
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return AsyncRouteFetcher(geocode_url=f"{base}/search", route_url=f"{base}/route/v1/driving/",
+                             cache=PersistentCache(str(tmp_path / "cache.sqlite")))
+
+
+def test_geocode_many_keeps_order_and_shares_inflight_requests(stub, tmp_path):
+    async def run():
+        async with fetcher_for(stub, tmp_path) as fetcher:
+            return await fetcher.geocode_many(["Mumbai", "Delhi", "Mumbai", "Kota"])
+
+    coords = asyncio.run(run())
+    assert coords == ["72.88,19.08", "77.21,28.61", "72.88,19.08", "75.83,25.18"]
+    assert len(stub.hits) == 3
+
+
+def test_route_data_through_stops_and_cache(stub, tmp_path):
+    async def run():
+        async with fetcher_for(stub, tmp_path) as fetcher:
+            first = await fetcher.get_route_data("Delhi", "Mumbai", ["Kota"])
+            second = await fetcher.get_route_data("Delhi", "Mumbai", ["Kota"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert first["routes"][0]["geometry"]["coordinates"] == [[77.21, 28.61], [75.83, 25.18], [72.88, 19.08]]
+    # three geocodes and one route; the repeat is served from the cache
+    assert len(stub.hits) == 4
+
+
+def test_errors(stub, tmp_path):
+    async def run(coro_for):
+        async with fetcher_for(stub, tmp_path) as fetcher:
+            return await coro_for(fetcher)
+
+    with pytest.raises(Exception, match="Location not found: Atlantis"):
+        asyncio.run(run(lambda f: f.geocode("Atlantis")))
+    results = asyncio.run(run(lambda f: f.geocode_many(["Kota", "Atlantis"], return_exceptions=True)))
+    assert results[0] == "75.83,25.18" and isinstance(results[1], Exception)
+    with pytest.raises(RuntimeError):
+        # used outside 'async with'
+        asyncio.run(fetcher_for(stub, tmp_path).geocode("Delhi"))
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+
+import route_optimizer
+from graphs import grid, random_geometric
+
+
+def unfinalized(columns):
+    graph = route_optimizer.RouteGraph()
+    graph.add_nodes(columns["ids"], columns["lats"], columns["lons"])
+    graph.add_edges(columns["src"], columns["dst"], columns["time"],
+                    cost=columns["cost"], distance=columns["distance"])
+    return graph
+
+
+def single_cost(graph, start, end, metric="time"):
+    path = graph.find_shortest_path(start, end, metric)
+    if not path:
+        return np.inf
+    edges = graph.edges_as_arrays()
+    lookup = {}
+    for s, t, value in zip(edges["source"], edges["target"], edges[metric]):
+        lookup[(int(s), int(t))] = min(value, lookup.get((int(s), int(t)), np.inf))
+    return sum(lookup[(u, v)] for u, v in zip(path, path[1:]))
+
+
+def test_distance_matrix_matches_single_queries():
+    graph = unfinalized(random_geometric(4000, seed=5))
+    rng = np.random.default_rng(6)
+    sources = rng.integers(0, graph.node_count, 12)
+    targets = np.append(rng.integers(0, graph.node_count, 15), -1)  # -1 is unknown
+    matrix = graph.distance_matrix(sources, targets, "distance", threads=3)
+    assert matrix.shape == (12, 16)
+    assert np.all(np.isinf(matrix[:, -1]))
+    for i, s in enumerate(sources):
+        for j, t in enumerate(targets[:-1]):
+            np.testing.assert_allclose(matrix[i, j], single_cost(graph, int(s), int(t), "distance"))
+
+
+def test_distance_matrix_alongside_other_threads():
+    # The matrix call finalizes the graph; other threads query it meanwhile
+    graph = unfinalized(grid(20_000, seed=7))
+    pairs = np.random.default_rng(8).integers(0, graph.node_count, (40, 2))
+    costs = {}
+
+    def singles():
+        for s, t in pairs:
+            costs[(int(s), int(t))] = graph.find_shortest_path(int(s), int(t))
+
+    worker = threading.Thread(target=singles)
+    worker.start()
+    matrix = graph.distance_matrix(pairs[:, 0], pairs[:, 1], threads=2)
+    worker.join()
+    for i, (s, t) in enumerate(pairs):
+        assert costs[(int(s), int(t))]
+        np.testing.assert_allclose(matrix[i, i], single_cost(graph, int(s), int(t)))
+
+
+def test_find_shortest_paths_matches_single_queries():
+    pairs = np.random.default_rng(9).integers(0, 2500, (60, 2)).astype(np.int32)
+    for algorithm in ("dijkstra", "astar", "alt", "ch"):
+        graph = unfinalized(grid(10_000, seed=10))
+        graph.reset_query_totals()
+        # Preparing the algorithm happens inside the batch call
+        found = graph.find_shortest_paths(pairs, threads=3, algorithm=algorithm)
+        assert graph.query_totals()["prepare_seconds"] > 0
+        for i, (s, t) in enumerate(pairs):
+            path = found["ids"][found["offsets"][i]:found["offsets"][i + 1]].tolist()
+            np.testing.assert_allclose(found["costs"][i], single_cost(graph, int(s), int(t)))
+            assert path[:1] == [s] and path[-1:] == [t]
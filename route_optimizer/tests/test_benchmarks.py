@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+TIMING_KEYS = {"name", "unit", "count", "mean", "p50", "p90", "p99", "max", "throughput_per_s", "peak_rss_mb"}
+
+
+def test_run_smallest_case(tmp_path):
+    output = tmp_path / "report.json"
+    subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "run.py"), "--families", "grid",
+                    "--sizes", "1e3", "--queries", "5", "--waypoints", "1", "--fixture-repeat", "2",
+                    "-o", str(output)], check=True, env=os.environ.copy(), timeout=300)
+    with open(output) as f:
+        report = json.load(f)
+
+    assert {"timestamp", "git_commit", "python", "numpy", "platform", "cpu_count"} <= set(report["meta"])
+    names = [entry["name"] for entry in report["results"]]
+    assert len(names) == len(set(names))
+    for entry in report["results"]:
+        assert TIMING_KEYS <= set(entry), entry["name"]
+        assert entry["count"] > 0 and 0 <= entry["p50"] <= entry["p90"] <= entry["p99"] <= entry["max"]
+    assert any(name.startswith("grid/") for name in names)
+    for parser in ("parse_to_graph", "parse_to_arrays"):
+        assert f"fixture/handmade_delhi_3_stops/{parser}" in names
+        assert f"synthetic/route_2000/{parser}" in names
+
+
+def test_bundled_fixtures_are_osrm_responses():
+    fixtures = os.path.join(ROOT, "benchmarks", "fixtures")
+    for name in os.listdir(fixtures):
+        with open(os.path.join(fixtures, name)) as f:
+            data = json.load(f)
+        assert data["code"] == "Ok" and data["routes"][0]["geometry"]["type"] == "LineString"
+        if name.startswith("handmade_"):
+            assert "not a recorded response" in data["note"]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import route_optimizer
+from graphs import build, grid
+
+
+def random_graph(seed, nodes=300, edges=1200):
+    """Random digraph with parallel edges, and nodes with no edges at all"""
+    rng = np.random.default_rng(seed)
+    graph = route_optimizer.RouteGraph()
+    graph.add_nodes(np.arange(nodes, dtype=np.int32), 28 + rng.random(nodes) * 0.1, 77 + rng.random(nodes) * 0.1)
+    src = rng.integers(0, nodes - 20, edges).astype(np.int32)
+    dst = rng.integers(0, nodes - 20, edges).astype(np.int32)
+    src = np.concatenate([src, src[:100]])  # parallel edges with other weights
+    dst = np.concatenate([dst, dst[:100]])
+    graph.add_edges(src, dst, rng.uniform(1, 100, len(src)), distance=rng.uniform(10, 1000, len(src)))
+    graph.finalize()
+    return graph
+
+
+def cheapest_edges(graph, metric):
+    edges = graph.edges_as_arrays()
+    cheapest = {}
+    for u, v, w in zip(edges["source"], edges["target"], edges[metric]):
+        key = (int(u), int(v))
+        cheapest[key] = min(cheapest.get(key, np.inf), float(w))
+    return cheapest
+
+
+GRAPHS = {
+    "random": lambda: random_graph(41),
+    "grid": lambda: build(grid(4_000, seed=42)),
+}
+
+
+@pytest.mark.parametrize("name", sorted(GRAPHS))
+@pytest.mark.parametrize("metric", ["time", "distance"])
+def test_matches_dijkstra(name, metric):
+    graph = GRAPHS[name]()
+    report = graph.prepare_contraction_hierarchy(sample_queries=200, metric=metric)
+    assert report["mismatches"] == 0
+
+    rng = np.random.default_rng(43)
+    sources = rng.integers(0, graph.node_count, 30).astype(np.int32)
+    targets = rng.integers(0, graph.node_count, 30).astype(np.int32)
+    want = graph.distance_matrix(sources, targets, metric)
+    pairs = np.array([(s, t) for s in sources for t in targets], dtype=np.int32)
+    got = graph.find_shortest_paths(pairs, metric, algorithm="ch")["costs"].reshape(want.shape)
+    np.testing.assert_allclose(got, want, rtol=1e-9)
+    if name == "random":
+        assert np.isinf(want).any()  # the edgeless nodes
+
+    cheapest = cheapest_edges(graph, metric)
+    for s, t in pairs[:200]:
+        path = graph.find_shortest_path(int(s), int(t), metric, algorithm="ch")
+        cost = want[list(sources).index(s), list(targets).index(t)]
+        if np.isinf(cost):
+            assert path == []
+            continue
+        assert path[0] == s and path[-1] == t
+        assert sum(cheapest[(u, v)] for u, v in zip(path, path[1:])) == pytest.approx(cost)
@@ -0,0 +1,123 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+from data_fetcher import RouteDataFetcher, segment_weights, waypoint_points
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "osrm_three_stops.json")
+
+
+@pytest.fixture
+def response():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+
+def geometry(route):
+    return np.asarray(route["geometry"]["coordinates"], dtype=np.float64)
+
+
+def waypoints(data):
+    return np.asarray([w["location"] for w in data["waypoints"]], dtype=np.float64)
+
+
+def test_annotations_give_exact_segment_weights(response):
+    route = response["routes"][0]
+    segments = len(geometry(route)) - 1
+    durations, distances, exact = segment_weights(route, segments)
+    assert exact and len(durations) == len(distances) == segments
+    start = 0
+    for leg in route["legs"]:
+        count = len(leg["annotation"]["duration"])
+        assert durations[start:start + count].sum() == pytest.approx(leg["duration"])
+        assert distances[start:start + count].sum() == pytest.approx(leg["distance"])
+        start += count
+    assert durations.sum() == pytest.approx(route["duration"])
+    assert distances.sum() == pytest.approx(route["distance"])
+
+
+def test_waypoints_sit_at_leg_starts(response):
+    route = response["routes"][0]
+    path = geometry(route)
+    _, _, exact = segment_weights(route, len(path) - 1)
+    points = waypoint_points(route, waypoints(response), path, exact)
+    assert points.tolist() == [0, 4, 7]
+    np.testing.assert_array_equal(path[points], waypoints(response))
+
+
+@pytest.mark.parametrize("damage", ["short_leg", "mismatched_columns", "missing_leg", "no_annotations"])
+def test_unusable_annotations_spread_the_totals(response, damage):
+    route = copy.deepcopy(response["routes"][0])
+    legs = route["legs"]
+    if damage == "short_leg":
+        legs[1]["annotation"]["duration"].pop()
+        legs[1]["annotation"]["distance"].pop()
+    elif damage == "mismatched_columns":
+        legs[0]["annotation"]["distance"].pop()
+    elif damage == "missing_leg":
+        del legs[1]["annotation"]
+    else:
+        route.pop("legs")
+    path = geometry(route)
+    segments = len(path) - 1
+    durations, distances, exact = segment_weights(route, segments)
+    assert not exact
+    np.testing.assert_allclose(durations, route["duration"] / segments)
+    np.testing.assert_allclose(distances, route["distance"] / segments)
+    assert durations.sum() == pytest.approx(route["duration"])
+
+    # waypoints fall back to the nearest geometry point
+    moved = waypoints(response) + 1e-5
+    assert waypoint_points(route, moved, path, exact).tolist() == [0, 4, 7]
+
+
+def test_waypoints_without_geometry():
+    assert waypoint_points({}, np.zeros((2, 2)), np.empty((0, 2)), False).tolist() == [0, 0]
+    durations, distances, exact = segment_weights({"duration": 5, "distance": 9}, 0)
+    assert len(durations) == len(distances) == 0 and not exact
+
+
+def parse_both(data):
+    fetcher = RouteDataFetcher.__new__(RouteDataFetcher)  # parsing needs no session or cache
+    return fetcher.parse_to_graph(data), fetcher.parse_to_arrays(data)
+
+
+def assert_same_graph(graph, arrays):
+    assert graph["status"] == arrays["status"] == "success"
+    nodes = graph["nodes"]
+    np.testing.assert_array_equal(arrays["node_ids"], [n["id"] for n in nodes])
+    np.testing.assert_array_equal(arrays["latitude"], [n["latitude"] for n in nodes])
+    np.testing.assert_array_equal(arrays["longitude"], [n["longitude"] for n in nodes])
+    assert arrays["waypoint_count"] == sum(n["type"] == "waypoint" for n in nodes)
+    want = sorted((e["source"], e["target"], e["time"], e["cost"], e["distance"], e["weight"])
+                  for e in graph["edges"])
+    got = sorted(zip(*(arrays[f"edge_{c}"].tolist() for c in ("source", "target", "time", "cost", "distance", "weight"))))
+    assert got == pytest.approx(want)
+    assert arrays["annotated"] == graph["annotated"]
+    assert (arrays["total_time"], arrays["total_distance"]) == (graph["total_time"], graph["total_distance"])
+
+
+def test_columnar_parse_matches_parse_to_graph(response):
+    graph, arrays = parse_both(response)
+    assert arrays["annotated"] and arrays["segment_count"] == 7
+    assert_same_graph(graph, arrays)
+
+
+def test_columnar_parse_of_ragged_coordinates(response):
+    coordinates = response["routes"][0]["geometry"]["coordinates"]
+    coordinates[2] = coordinates[2] + [171.0]  # elevation
+    coordinates.insert(5, "bad point")
+    coordinates.insert(1, [78.0])
+    graph, arrays = parse_both(response)
+    assert arrays["segment_count"] == 7
+    assert_same_graph(graph, arrays)
+
+
+def test_columnar_parse_errors():
+    for data in ([], {"routes": []}):
+        graph, arrays = parse_both(data)
+        assert graph["status"].startswith("error") and arrays["status"].startswith("error")
+        assert len(arrays["node_ids"]) == len(arrays["edge_source"]) == 0
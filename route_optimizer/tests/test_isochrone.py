@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import route_optimizer
+from graphs import build, random_geometric
+from isochrone import concave_hull, isochrones
+
+
+def directed_graph(seed, nodes=400, edges=1600):
+    """Random one-way edges, so forward and reverse reach differ"""
+    rng = np.random.default_rng(seed)
+    graph = route_optimizer.RouteGraph()
+    graph.add_nodes(np.arange(nodes, dtype=np.int32), 28 + rng.random(nodes) * 0.1, 77 + rng.random(nodes) * 0.1)
+    graph.add_edges(rng.integers(0, nodes, edges).astype(np.int32), rng.integers(0, nodes, edges).astype(np.int32),
+                    rng.uniform(1, 100, edges))
+    graph.finalize()
+    return graph
+
+
+def inside_or_on(polygon, points, tolerance=1e-9):
+    """Mask of points inside the closed polygon or within tolerance of its outline"""
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    x, y = points[:, None, 0], points[:, None, 1]
+    crosses = ((a[:, 1] > y) != (b[:, 1] > y)) & (
+        x < (b[:, 0] - a[:, 0]) * (y - a[:, 1]) / np.where(b[:, 1] == a[:, 1], 1, b[:, 1] - a[:, 1]) + a[:, 0])
+    inside = crosses.sum(axis=1) % 2 == 1
+    ab = b - a
+    t = np.clip(((points[:, None, :] - a) * ab).sum(-1) / np.maximum((ab * ab).sum(-1), 1e-300), 0, 1)
+    gap = np.hypot(*(points[:, None, :] - (a + t[..., None] * ab)).transpose(2, 0, 1))
+    return inside | (gap.min(axis=1) <= tolerance)
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_reach_matches_distance_matrix(reverse):
+    graph = directed_graph(51)
+    sources = np.array([3, 77, 150], dtype=np.int32)
+    budgets = [120.0, 40.0, 80.0]
+    reached = graph.reachable_within(sources, budgets, reverse=reverse)
+
+    everything = np.arange(graph.node_count, dtype=np.int32)
+    if reverse:
+        matrix = graph.distance_matrix(everything, sources).T
+    else:
+        matrix = graph.distance_matrix(sources, everything)
+    best = matrix.min(axis=0)
+    want = np.flatnonzero(best <= max(budgets))
+    assert sorted(reached["ids"]) == sorted(want)
+    np.testing.assert_allclose(reached["costs"], best[reached["ids"]])
+    assert np.all(np.diff(reached["costs"]) >= 0)
+    np.testing.assert_allclose(matrix[[list(sources).index(o) for o in reached["origins"]], reached["ids"]],
+                               reached["costs"])
+    # band i is the smallest of the given (unsorted) budgets covering the cost
+    for cost, band in zip(reached["costs"], reached["bands"]):
+        assert cost <= budgets[band]
+        assert not any(cost <= b < budgets[band] for b in budgets)
+
+
+def test_bands_are_prefixes():
+    graph = directed_graph(52)
+    bands = isochrones(graph, [5], [90.0, 30.0, 60.0], hull=False)
+    assert [band["budget"] for band in bands] == [30.0, 60.0, 90.0]
+    for small, large in zip(bands, bands[1:]):
+        assert set(small["ids"]) <= set(large["ids"])
+        assert np.all(large["costs"] <= large["budget"])
+
+
+@pytest.mark.parametrize("concavity", [1.0, 2.0, 4.0])
+def test_hull_covers_every_reached_point(concavity):
+    graph = build(random_geometric(8_000, seed=53))
+    bands = isochrones(graph, [0, 400], [100.0, 200.0], metric="distance", concavity=concavity)
+    for band in bands:
+        points, polygon = band["points"], band["polygon"]
+        assert len(polygon) >= 3
+        assert inside_or_on(polygon, points).all()
+
+
+def test_hull_of_a_thinned_cloud():
+    rng = np.random.default_rng(54)
+    points = np.column_stack([28 + rng.normal(0, 0.01, 6000), 77 + rng.normal(0, 0.01, 6000)])
+    assert inside_or_on(concave_hull(points), points).all()
+    assert len(concave_hull(points[:2])) == 2
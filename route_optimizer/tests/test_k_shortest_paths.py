@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+import route_optimizer
+from graphs import build, grid
+
+
+def random_graph(seed):
+    """Small random digraph with integer times, and its cheapest time per (u, v)"""
+    rng = random.Random(seed)
+    n = rng.randint(3, 9)
+    graph = route_optimizer.RouteGraph()
+    for i in range(n):
+        graph.add_node(route_optimizer.Node(i, 28 + rng.random() * 0.1, 77 + rng.random() * 0.1))
+    times = {}
+    for _ in range(3 * n):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            t = rng.randint(1, 20)
+            graph.add_edge(route_optimizer.Edge(u, v, time=t))
+            times[(u, v)] = min(times.get((u, v), t), t)
+    graph.finalize()
+    return graph, times, n
+
+
+def all_simple_path_costs(times, s, t):
+    """Cost of every loopless s-t path, cheapest first"""
+    adj = {}
+    for (u, v), w in times.items():
+        adj.setdefault(u, []).append((v, w))
+    costs = []
+
+    def walk(u, seen, cost):
+        if u == t:
+            costs.append(cost)
+            return
+        for v, w in adj.get(u, ()):
+            if v not in seen:
+                walk(v, seen | {v}, cost + w)
+
+    walk(s, {s}, 0)
+    return sorted(costs)
+
+
+def check_paths(paths, times, s, t):
+    for entry in paths:
+        path = entry["path"]
+        assert path[0] == s and path[-1] == t
+        assert len(set(path)) == len(path)
+        assert sum(times[(u, v)] for u, v in zip(path, path[1:])) == pytest.approx(entry["cost"])
+    assert len({tuple(entry["path"]) for entry in paths}) == len(paths)
+    assert [entry["cost"] for entry in paths] == sorted(entry["cost"] for entry in paths)
+
+
+@pytest.mark.parametrize("reuse_tree", [True, False])
+def test_matches_brute_force(reuse_tree):
+    for seed in range(150):
+        graph, times, n = random_graph(seed)
+        result = graph.find_k_shortest_paths(0, n - 1, 6, reuse_tree=reuse_tree)
+        check_paths(result["paths"], times, 0, n - 1)
+        assert [p["cost"] for p in result["paths"]] == all_simple_path_costs(times, 0, n - 1)[:6]
+
+
+@pytest.mark.parametrize("max_overlap", [0.8, 0.5, 0.2])
+def test_overlap_limit(max_overlap):
+    for seed in range(60):
+        graph, times, n = random_graph(seed)
+        paths = graph.find_k_shortest_paths(0, n - 1, 4, max_overlap=max_overlap)["paths"]
+        check_paths(paths, times, 0, n - 1)
+        costs = all_simple_path_costs(times, 0, n - 1)
+        if costs:
+            assert paths[0]["cost"] == costs[0]
+        for j, later in enumerate(paths):
+            edges = list(zip(later["path"], later["path"][1:]))
+            for earlier in paths[:j]:
+                used = set(zip(earlier["path"], earlier["path"][1:]))
+                shared = sum(times[e] for e in edges if e in used)
+                assert shared <= max_overlap * later["cost"] + 1e-9
+
+
+def test_grid_alternatives():
+    graph = build(grid(40_000, seed=22))
+    exact = graph.find_k_shortest_paths(0, 9000, 5)["paths"]
+    assert len(exact) == 5 and exact[0]["cost"] == pytest.approx(
+        graph.find_k_shortest_paths(0, 9000, 1, reuse_tree=False)["paths"][0]["cost"])
+    assert len(graph.find_k_shortest_paths(0, 9000, 5, max_overlap=0.5)["paths"]) > 1
+    # equal-cost paths may come in another order
+    plain = graph.find_k_shortest_paths(0, 9000, 5, reuse_tree=False)["paths"]
+    assert [p["cost"] for p in plain] == pytest.approx([p["cost"] for p in exact])
+
+
+def test_edge_cases():
+    graph, _, _ = random_graph(1)
+    assert graph.find_k_shortest_paths(0, 0, 3)["paths"] == [{"cost": 0.0, "path": [0]}]
+    assert graph.find_k_shortest_paths(0, 12345, 3)["paths"] == []
+    with pytest.raises(ValueError):
+        graph.find_k_shortest_paths(0, 1, 0)
+    with pytest.raises(ValueError):
+        graph.find_k_shortest_paths(0, 1, 3, max_overlap=1.5)
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+import route_optimizer
+from graphs import build, grid
+
+
+def test_metric_change_keeps_requested_landmark_count(tmp_path):
+    graph = build(grid(10_000, seed=19))
+    assert len(graph.prepare_landmarks(3, "time")) == 3
+    path = graph.find_shortest_path(0, graph.node_count - 1, "distance", algorithm="alt")
+    assert path == graph.find_shortest_path(0, graph.node_count - 1, "distance")
+    assert len(graph.landmarks) == 3
+
+    # A loaded snapshot rebuilds with the count it was saved with
+    snapshot = os.fspath(tmp_path / "graph.bin")
+    graph.save(snapshot)
+    loaded = route_optimizer.RouteGraph.load(snapshot, mmap=False)
+    loaded.find_shortest_path(0, 5, "time", algorithm="alt")
+    assert len(loaded.landmarks) == 3
+
+
+def test_alt_matches_dijkstra():
+    graph = build(grid(10_000, seed=20))
+    graph.prepare_landmarks(4)
+    for s, t in np.random.default_rng(21).integers(0, graph.node_count, (30, 2)):
+        alt = graph.find_shortest_path(int(s), int(t), "cost", algorithm="alt")
+        assert alt == graph.find_shortest_path(int(s), int(t), "cost")
@@ -0,0 +1,49 @@
+import numpy as np
+
+import route_optimizer
+
+
+def path_totals(graph, path):
+    """Summed time, cost, distance and weight of the edges along a path of node ids"""
+    edges = graph.edges_as_arrays()
+    lookup = {(int(s), int(t)): i for i, (s, t) in enumerate(zip(edges["source"], edges["target"]))}
+    rows = [lookup[(u, v)] for u, v in zip(path, path[1:])]
+    return [float(edges[column][rows].sum()) for column in ("time", "cost", "distance", "weight")]
+
+
+def test_collapsed_segments_keep_their_metrics():
+    # The second point is ~1 m from the first, so it snaps onto it
+    lats = np.array([28.0, 28.00001, 28.001, 28.002])
+    lons = np.array([77.0, 77.0, 77.0, 77.0])
+    graph = route_optimizer.RouteGraph()
+    merged = graph.merge_polyline(lats, lons, np.array([10.0, 10.0, 100.0]))
+    ids = merged["ids"].tolist()
+    assert len(ids) == 3
+    assert path_totals(graph, graph.find_shortest_path(ids[0], ids[-1]))[0] == 120.0
+
+
+def test_trailing_collapsed_segment_goes_to_last_edge():
+    lats = np.array([28.0, 28.001, 28.00101])
+    lons = np.array([77.0, 77.0, 77.0])
+    graph = route_optimizer.RouteGraph()
+    ids = graph.merge_polyline(lats, lons, np.array([100.0, 5.0]), bidirectional=True)["ids"].tolist()
+    assert path_totals(graph, graph.find_shortest_path(ids[0], ids[-1]))[0] == 105.0
+    assert path_totals(graph, graph.find_shortest_path(ids[-1], ids[0]))[0] == 105.0
+
+
+def test_merged_path_matches_input_totals():
+    rng = np.random.default_rng(3)
+    # A dense trace: many steps are shorter than the 5 m tolerance
+    steps = rng.uniform(0.5, 12.0, 2000)
+    lats = 28.0 + np.concatenate([[0.0], np.cumsum(steps)]) / 111320.0
+    lons = np.full(len(lats), 77.0)
+    time = rng.uniform(0.1, 2.0, len(steps))
+    cost = rng.uniform(0.0, 1.0, len(steps))
+    distance = steps.copy()
+    weight = np.ones(len(steps))
+    graph = route_optimizer.RouteGraph()
+    merged = graph.merge_polyline(lats, lons, time, cost=cost, distance=distance, weight=weight)
+    ids = merged["ids"].tolist()
+    assert merged["snapped"] > 0
+    totals = path_totals(graph, graph.find_shortest_path(ids[0], ids[-1]))
+    np.testing.assert_allclose(totals, [time.sum(), cost.sum(), distance.sum(), weight.sum()])
@@ -0,0 +1,25 @@
+from network_import import load_osm
+
+EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="28.600" lon="77.200"/>
+  <node id="2" lat="28.601" lon="77.200"/>
+  <node id="4" lat="28.603" lon="77.200"/>
+  <node id="5" lat="28.604" lon="77.200"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><nd ref="5"/>
+    <tag k="highway" v="residential"/>
+  </way>
+</osm>
+"""
+
+
+def test_way_splits_at_missing_ref(tmp_path):
+    path = tmp_path / "clipped.osm"
+    path.write_text(EXTRACT, encoding="utf-8")
+    graph, osm_ids = load_osm(str(path))
+    assert list(osm_ids) == [1, 2, 4, 5]
+    edges = graph.edges_as_arrays()
+    pairs = {(int(osm_ids[u]), int(osm_ids[v])) for u, v in zip(edges["source"], edges["target"])}
+    assert pairs == {(1, 2), (2, 1), (4, 5), (5, 4)}
+    assert graph.find_shortest_path(0, 3, "time") == []
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import route_optimizer
+
+
+def random_graph(seed):
+    """Small random digraph whose time and cost pull apart, with some parallel edges"""
+    rng = random.Random(seed)
+    n = rng.randint(4, 8)
+    graph = route_optimizer.RouteGraph()
+    for i in range(n):
+        graph.add_node(route_optimizer.Node(i, 28 + rng.random() * 0.1, 77 + rng.random() * 0.1))
+    edges = []
+    for _ in range(3 * n):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            time = rng.randint(1, 20)
+            cost = rng.randint(1, 25 - time)
+            edges.append((u, v, time, cost))
+            graph.add_edge(route_optimizer.Edge(u, v, time=time, cost=cost))
+    graph.finalize()
+    return graph, edges, n
+
+
+def all_path_values(edges, s, t):
+    """(time, cost) of every loopless s-t path, each parallel edge a separate choice"""
+    out = {}
+    for u, v, time, cost in edges:
+        out.setdefault(u, []).append((v, time, cost))
+    values = []
+
+    def walk(u, seen, time, cost):
+        if u == t:
+            values.append((time, cost))
+            return
+        for v, dt, dc in out.get(u, ()):
+            if v not in seen:
+                walk(v, seen | {v}, time + dt, cost + dc)
+
+    walk(s, {s}, 0, 0)
+    return values
+
+
+def front(values):
+    return sorted({a for a in values if not any(b[0] <= a[0] and b[1] <= a[1] and b != a for b in values)})
+
+
+def path_values(edges, path):
+    """Cheapest (time, cost) pairs a node path can be travelled at"""
+    options = [(0, 0)]
+    for u, v in zip(path, path[1:]):
+        steps = [(time, cost) for a, b, time, cost in edges if (a, b) == (u, v)]
+        options = [(t0 + t1, c0 + c1) for t0, c0 in options for t1, c1 in steps]
+    return options
+
+
+def test_front_matches_brute_force():
+    for seed in range(200):
+        graph, edges, n = random_graph(seed)
+        result = graph.find_pareto_paths(0, n - 1)
+        assert result["complete"]
+        got = [(p["time"], p["cost"]) for p in result["paths"]]
+        assert got == front(all_path_values(edges, 0, n - 1))
+        # no label dominates another: cost falls strictly as time rises
+        assert all(a[0] < b[0] and a[1] > b[1] for a, b in zip(got, got[1:]))
+        for p in result["paths"]:
+            assert p["path"][0] == 0 and p["path"][-1] == n - 1
+            assert (p["time"], p["cost"]) in path_values(edges, p["path"])
+
+
+def test_truncated_search_returns_only_optimal_paths():
+    truncated = 0
+    for seed in range(200):
+        graph, edges, n = random_graph(seed)
+        exact = front(all_path_values(edges, 0, n - 1))
+        result = graph.find_pareto_paths(0, n - 1, max_labels=4)
+        if not result["complete"]:
+            truncated += 1
+        got = [(p["time"], p["cost"]) for p in result["paths"]]
+        assert set(got) <= set(exact)
+        assert got == sorted(got)
+    assert truncated > 0
+
+
+@pytest.mark.parametrize("weights", [{"time": 1.0, "cost": 2.0}, {"time": 0.5, "cost": 0.25}, {"cost": 1.0}])
+def test_weighted_metric_is_the_best_combination(weights):
+    for seed in range(100):
+        graph, edges, n = random_graph(seed)
+        values = all_path_values(edges, 0, n - 1)
+        path = graph.find_shortest_path(0, n - 1, weights)
+        if not values:
+            assert path == []
+            continue
+        best = min(weights.get("time", 0) * t + weights.get("cost", 0) * c for t, c in values)
+        got = min(weights.get("time", 0) * t + weights.get("cost", 0) * c for t, c in path_values(edges, path))
+        assert got == pytest.approx(best)
@@ -0,0 +1,30 @@
+import threading
+
+import numpy as np
+
+from graphs import build, grid
+
+
+def test_batch_queries_while_capacity_changes():
+    graph = build(grid(10_000, seed=11))
+    pairs = np.random.default_rng(12).integers(0, graph.node_count, (400, 2)).astype(np.int32)
+    expected = graph.find_shortest_paths(pairs, threads=1)["costs"]
+    done = threading.Event()
+
+    def toggle():
+        capacity = 0
+        while not done.is_set():
+            graph.enable_query_cache(capacity)
+            capacity = 64 - capacity
+
+    toggler = threading.Thread(target=toggle)
+    toggler.start()
+    try:
+        for _ in range(10):
+            found = graph.find_shortest_paths(pairs, threads=4)
+            np.testing.assert_allclose(found["costs"], expected)
+    finally:
+        done.set()
+        toggler.join()
+    capacity, size = graph.cache_stats()["capacity"], graph.cache_stats()["size"]
+    assert size <= capacity
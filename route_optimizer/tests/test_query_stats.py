@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from graphs import build, grid
+
+STATS = ("nodes_settled", "edges_relaxed", "heap_pushes", "heap_pops", "stale_pops")
+
+
+@pytest.fixture
+def graph():
+    return build(grid(4_000, seed=61))
+
+
+def test_callback_per_waypoint_leg(graph):
+    calls = []
+    graph.set_stats_callback(lambda start, end, stats: calls.append((start, end, stats)))
+    path, stats = graph.find_path_with_waypoints(0, [500, 120], 999, with_stats=True)
+    assert [(s, e) for s, e, _ in calls] == [(0, 500), (500, 120), (120, 999)]
+    for key in STATS:
+        assert stats[key] == sum(c[2][key] for c in calls)
+    graph.set_stats_callback(None)
+    graph.find_shortest_path(0, 999)
+    assert len(calls) == 3
+
+
+def test_callback_per_batch_pair_and_totals(graph):
+    calls = []
+    graph.set_stats_callback(lambda start, end, stats: calls.append((start, end, stats)))
+    graph.find_shortest_path(3, 900)
+    graph.reset_query_totals()
+    calls.clear()
+    pairs = np.random.default_rng(62).integers(0, graph.node_count, (50, 2)).astype(np.int32)
+    graph.find_shortest_paths(pairs, threads=4)
+    single, stats = graph.find_shortest_path(7, 800, with_stats=True)
+    assert sorted((s, e) for s, e, _ in calls[:-1]) == sorted(map(tuple, pairs.tolist()))
+    assert calls[-1][:2] == (7, 800) and calls[-1][2] == stats
+
+    totals = graph.query_totals()
+    assert totals["queries"] == len(calls) == 51
+    for key in STATS:
+        assert totals[key] == sum(c[2][key] for c in calls)
+    assert totals["elapsed_seconds"] == pytest.approx(sum(c[2]["elapsed_seconds"] for c in calls))
+    assert totals["max_elapsed_seconds"] == max(c[2]["elapsed_seconds"] for c in calls)
+    assert totals["cache_hits"] == sum(c[2]["cache_hit"] for c in calls)
+
+    graph.reset_query_totals()
+    totals = graph.query_totals()
+    assert totals["queries"] == 0 and all(totals[key] == 0 for key in STATS)
+
+
+def test_callback_exception_leaves_batch_call(graph):
+    def fail(start, end, stats):
+        raise RuntimeError(f"stop at {start}->{end}")
+
+    graph.set_stats_callback(fail)
+    pairs = np.array([[0, 10], [20, 30]], dtype=np.int32)
+    with pytest.raises(RuntimeError, match="stop at 0->10"):
+        graph.find_shortest_paths(pairs, threads=2)
+    with pytest.raises(RuntimeError, match="stop at 0->500"):
+        graph.find_path_with_waypoints(0, [500], 999)
+    graph.set_stats_callback(None)
+    assert graph.find_shortest_paths(pairs)["costs"].shape == (2,)
+    with pytest.raises(TypeError):
+        graph.set_stats_callback(42)
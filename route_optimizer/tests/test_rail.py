@@ -0,0 +1,21 @@
+from network_import import load_csv
+from rail import rail_network
+
+
+def test_journey_reports_corridors_and_junctions():
+    journey = rail_network().route("Bangalore", "Delhi")
+    assert journey["stations"][0] == "KSR Bengaluru" and journey["stations"][-1] == "New Delhi"
+    assert "changes" not in journey and "lines" not in journey
+    assert len(journey["junctions"]) == len(journey["corridors"]) - 1
+    assert set(journey["junctions"]) <= set(journey["stations"][1:-1])
+    assert rail_network().route("Mumbai", "Delhi")["junctions"] == []
+
+
+def test_load_csv_reads_utf8(tmp_path):
+    nodes = tmp_path / "nodes.csv"
+    edges = tmp_path / "edges.csv"
+    nodes.write_text("id,lat,lon\nKöln,50.94,6.96\nDüsseldorf,51.22,6.79\n", encoding="utf-8")
+    edges.write_text("source,target,speed\nKöln,Düsseldorf,100\n", encoding="utf-8")
+    graph, ids = load_csv(str(nodes), str(edges))
+    assert list(ids) == ["Köln", "Düsseldorf"]
+    assert graph.find_shortest_path(0, 1, "time") == [0, 1]
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from response_cache import PersistentCache, normalize_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.sqlite3"), ttl=60, max_entries=10)
+    yield cache
+    cache.close()
+
+
+def test_round_trip_and_namespaces(cache):
+    cache.put("route", "a", {"legs": [1, 2]})
+    assert cache.get("route", "a") == {"legs": [1, 2]}
+    assert cache.get("geocode", "a") is None
+    cache.put("route", "a", [3])
+    assert cache.get("route", "a") == [3] and len(cache) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_keys_are_normalized(cache):
+    assert normalize_key("  New   Delhi ") == normalize_key("new delhi") == "new delhi"
+    cache.put("geocode", "New  Delhi", "77.2,28.6")
+    assert cache.get("geocode", "new delhi") == "77.2,28.6"
+    assert cache.get("geocode", "NEW DELHI\t") == "77.2,28.6"
+    assert cache.get("geocode", "newdelhi") is None
+
+
+def test_entries_expire(cache):
+    cache.put("geocode", "short", 1, ttl=0.05)
+    cache.put("geocode", "long", 2)
+    assert cache.get("geocode", "short") == 1
+    time.sleep(0.1)
+    assert cache.get("geocode", "short") is None
+    assert cache.get("geocode", "long") == 2
+
+
+def test_size_is_bounded_by_max_entries(cache, tmp_path):
+    for i in range(250):
+        cache.put("route", f"key {i}", i)
+        assert len(cache) <= 10
+    assert len(cache) == 10
+    assert [cache.get("route", f"key {i}") for i in range(240, 250)] == list(range(240, 250))
+    assert cache.get("route", "key 239") is None
+
+    # replacing entries does not evict others
+    for _ in range(30):
+        cache.put("route", "key 249", 0)
+    assert len(cache) == 10 and cache.get("route", "key 240") == 240
+
+    # a reopened cache counts the rows already there
+    reopened = PersistentCache(cache.path, max_entries=10)
+    reopened.put("route", "new", 1)
+    assert len(reopened) == 10
+    reopened.close()
+
+
+def test_clear(cache):
+    cache.put("route", "a", 1)
+    cache.put("geocode", "b", 2)
+    cache.clear("route")
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
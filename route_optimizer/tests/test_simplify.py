@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from simplify import (build_levels, decode_polyline, encode_polyline, pick_level, segment_distances,
+                      significance, simplify, to_meters)
+
+# Example from Google's encoded polyline algorithm format documentation
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+GOOGLE_ENCODED = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def wiggly_route(n=3000, seed=71):
+    """A winding road of about 60 km with small jitter"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, n)
+    lat = 28.6 + 0.4 * t + 0.02 * np.sin(40 * t) + rng.normal(0, 2e-5, n)
+    lon = 77.2 + 0.3 * t + 0.03 * np.cos(25 * t) + rng.normal(0, 2e-5, n)
+    return np.column_stack([lat, lon])
+
+
+def test_encode_matches_google_reference():
+    assert encode_polyline(GOOGLE_POINTS) == GOOGLE_ENCODED
+    np.testing.assert_allclose(decode_polyline(GOOGLE_ENCODED), GOOGLE_POINTS)
+    assert encode_polyline([]) == "" and decode_polyline("").shape == (0, 2)
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_decode_round_trip(precision):
+    points = wiggly_route(500)
+    decoded = decode_polyline(encode_polyline(points, precision), precision)
+    np.testing.assert_allclose(decoded, np.round(points, precision), atol=0.6 * 10 ** -precision)
+
+
+def test_levels_stay_within_their_tolerance():
+    points = wiggly_route()
+    xy = to_meters(points)
+    sig = significance(points)
+    levels = build_levels(points)
+    assert [level["zoom"] for level in levels] == [6, 9, 12, 15]
+    for level in levels:
+        keep = np.flatnonzero(sig > level["tolerance"])
+        assert keep[0] == 0 and keep[-1] == len(points) - 1
+        np.testing.assert_array_equal(level["points"], points[keep])
+        np.testing.assert_array_equal(level["points"], simplify(points, level["tolerance"]))
+        # every dropped point is within tolerance of the kept segment spanning it
+        for i, j in zip(keep, keep[1:]):
+            if j - i > 1:
+                assert segment_distances(xy[i + 1:j], xy[i], xy[j]).max() <= level["tolerance"] + 1e-6
+
+
+def test_dropped_counts():
+    points = wiggly_route()
+    levels = build_levels(points)
+    dropped = [level["dropped"] for level in levels]
+    assert dropped == [len(points) - len(level["points"]) for level in levels]
+    assert dropped == sorted(dropped, reverse=True)  # finer zooms drop fewer points
+    assert dropped[0] > 0.9 * len(points)
+    assert pick_level(levels, 10)["zoom"] == 12 and pick_level(levels, 20)["zoom"] == 15
+    assert build_levels(points[:2])[0]["dropped"] == 0
@@ -0,0 +1,132 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import route_optimizer
+from graphs import build, grid
+
+# Header: magic, version, byte order, node and edge counts, A* scale, three
+# metric weight vectors, section count and header CRC; then the section table
+HEADER = struct.Struct("<8sIIQQd4d4d4dII")
+ENTRY = struct.Struct("<IIQQII")
+SECTIONS = {"targets": 6, "landmarks": 11, "ch_child1": 18, "ch_up_edges": 21}
+
+
+def sections(data):
+    """Section id -> (offset, count) of a snapshot's bytes"""
+    count = HEADER.unpack_from(data)[-2]
+    entries = (ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size) for i in range(count))
+    return {e[0]: (e[2], e[3]) for e in entries}
+
+
+@pytest.fixture(scope="module")
+def original():
+    graph = build(grid(4_000, seed=31))
+    graph.prepare_landmarks(4)
+    graph.prepare_contraction_hierarchy()
+    return graph
+
+
+@pytest.fixture
+def saved(original, tmp_path):
+    path = os.fspath(tmp_path / "grid.snap")
+    original.save(path)
+    return path
+
+
+def pairs(graph, count=40):
+    return np.random.default_rng(32).integers(0, graph.node_count, (count, 2)).astype(np.int32)
+
+
+def write_int(path, section, index, value):
+    with open(path, "r+b") as f:
+        data = f.read()
+        offset, count = sections(data)[SECTIONS[section]]
+        assert index < count
+        f.seek(offset + 4 * index)
+        f.write(struct.pack("<i", value))
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(original, saved, mmap):
+    loaded = route_optimizer.RouteGraph.load(saved, mmap=mmap, verify=True)
+    assert (loaded.node_count, loaded.edge_count) == (original.node_count, original.edge_count)
+    assert loaded.has_contraction_hierarchy
+    assert sorted(loaded.landmarks) == sorted(original.landmarks)
+    for name in ("id", "latitude", "longitude"):
+        np.testing.assert_array_equal(loaded.nodes_as_arrays()[name], original.nodes_as_arrays()[name])
+    queries = pairs(original)
+    for algorithm in ("dijkstra", "alt", "ch"):
+        got = loaded.find_shortest_paths(queries, "time", algorithm=algorithm)
+        want = original.find_shortest_paths(queries, "time", algorithm=algorithm)
+        np.testing.assert_allclose(got["costs"], want["costs"])
+    np.testing.assert_allclose(loaded.distance_matrix(queries[:, 0], queries[:, 1]),
+                               original.distance_matrix(queries[:, 0], queries[:, 1]))
+
+
+def test_mutating_a_mapped_graph_leaves_the_file_alone(original, saved):
+    with open(saved, "rb") as f:
+        before = f.read()
+    loaded = route_optimizer.RouteGraph.load(saved)
+    loaded.prepare_landmarks(2, "distance")
+    loaded.prepare_contraction_hierarchy(metric="distance")
+    loaded.add_edge(route_optimizer.Edge(0, original.node_count - 1, time=1.0))
+    loaded.finalize()
+    assert loaded.find_shortest_path(0, original.node_count - 1) == [0, original.node_count - 1]
+    with open(saved, "rb") as f:
+        assert f.read() == before
+    again = route_optimizer.RouteGraph.load(saved)
+    assert again.find_shortest_path(0, original.node_count - 1) == original.find_shortest_path(0, original.node_count - 1)
+
+
+def test_bad_magic_version_and_truncation(saved, tmp_path):
+    with open(saved, "rb") as f:
+        data = bytearray(f.read())
+    broken = os.fspath(tmp_path / "broken.snap")
+
+    def load(content, **kwargs):
+        with open(broken, "wb") as f:
+            f.write(content)
+        return route_optimizer.RouteGraph.load(broken, **kwargs)
+
+    with pytest.raises(ValueError, match="not a route graph snapshot"):
+        load(b"NOTAGRPH" + bytes(data[8:]))
+    with pytest.raises(ValueError, match="snapshot version 99"):
+        load(bytes(data[:8]) + struct.pack("<I", 99) + bytes(data[12:]))
+    for mmap in (True, False):
+        with pytest.raises(ValueError, match="truncated or corrupt"):
+            load(bytes(data[:len(data) // 2]), mmap=mmap)
+        with pytest.raises(ValueError, match="not a route graph snapshot"):
+            load(bytes(data[:20]), mmap=mmap)
+
+
+def test_flipped_byte_is_caught_by_verify(saved):
+    with open(saved, "r+b") as f:
+        offset, _ = sections(f.read())[2]  # latitudes
+        f.seek(offset + 3)
+        f.write(b"\xff")
+    route_optimizer.RouteGraph.load(saved)  # coordinates are not range-checked
+    with pytest.raises(ValueError, match="checksum mismatch in section 2"):
+        route_optimizer.RouteGraph.load(saved, verify=True)
+
+
+@pytest.mark.parametrize("section, value", [
+    ("targets", 1 << 30), ("targets", -1), ("landmarks", 1 << 20),
+    ("ch_child1", 1 << 20), ("ch_up_edges", -5),
+])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_corrupt_index_is_rejected_without_verify(saved, section, value, mmap):
+    write_int(saved, section, 2, value)
+    with pytest.raises(ValueError, match="index out of range"):
+        route_optimizer.RouteGraph.load(saved, mmap=mmap)
+
+
+def test_decreasing_offsets_are_rejected(saved):
+    with open(saved, "r+b") as f:
+        offset, _ = sections(f.read())[5]  # offsets
+        f.seek(offset + 4 * 10)
+        f.write(struct.pack("<i", 0))
+    with pytest.raises(ValueError, match="section 5"):
+        route_optimizer.RouteGraph.load(saved)
@@ -0,0 +1,46 @@
+import threading
+
+import numpy as np
+
+import route_optimizer
+
+
+def random_graph(n, seed):
+    rng = np.random.default_rng(seed)
+    graph = route_optimizer.RouteGraph()
+    graph.add_nodes(np.arange(n), rng.uniform(8, 35, n), rng.uniform(68, 97, n))
+    return graph
+
+
+def test_concurrent_lookups_on_a_fresh_index():
+    graph = random_graph(50_000, 1)
+    rng = np.random.default_rng(2)
+    lats, lons = rng.uniform(8, 35, 2000), rng.uniform(68, 97, 2000)
+    results = [None] * 8
+
+    def lookup(slot):
+        if slot % 2:
+            results[slot] = graph.nearest(lats, lons, 3)["ids"]
+        else:
+            results[slot] = graph.within_radius(lats, lons, 20_000)["ids"]
+
+    # Every thread finds the index unbuilt; only one may build it
+    threads = [threading.Thread(target=lookup, args=(slot,)) for slot in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for slot in range(2, len(results)):
+        np.testing.assert_array_equal(results[slot], results[slot % 2])
+
+
+def test_nearest_matches_brute_force():
+    graph = random_graph(2000, 3)
+    nodes = graph.nodes_as_arrays()
+    rng = np.random.default_rng(4)
+    lats, lons = rng.uniform(8, 35, 50), rng.uniform(68, 97, 50)
+    found = graph.nearest(lats, lons)["ids"][:, 0]
+    lat1, lon1 = np.radians(lats)[:, None], np.radians(lons)[:, None]
+    lat2, lon2 = np.radians(nodes["latitude"])[None, :], np.radians(nodes["longitude"])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    np.testing.assert_array_equal(found, nodes["id"][np.argmin(a, axis=1)])
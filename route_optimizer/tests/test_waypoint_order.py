@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+
+from graphs import build, random_geometric
+
+
+def route_cost(graph, stops):
+    matrix = graph.distance_matrix(stops[:-1], stops[1:])
+    return float(np.trace(matrix))
+
+
+def test_exact_order_matches_brute_force():
+    graph = build(random_geometric(6000, seed=13))
+    rng = np.random.default_rng(14)
+    for _ in range(5):
+        start, end, *waypoints = [int(v) for v in rng.choice(graph.node_count, 7, replace=False)]
+        found = graph.optimize_waypoint_order(start, waypoints, end)
+        best = min(route_cost(graph, [start, *order, end]) for order in itertools.permutations(waypoints))
+        assert found["exact"]
+        np.testing.assert_allclose(found["cost"], best)
+        np.testing.assert_allclose(route_cost(graph, [start, *found["order"], end]), best)
+
+
+def test_algorithm_and_stats_cover_the_whole_query():
+    graph = build(random_geometric(6000, seed=15))
+    start, end, *waypoints = [int(v) for v in np.random.default_rng(16).choice(graph.node_count, 8, replace=False)]
+    dijkstra = graph.optimize_waypoint_order(start, waypoints, end)
+    for algorithm in ("astar", "alt", "ch"):
+        found = graph.optimize_waypoint_order(start, waypoints, end, algorithm=algorithm)
+        assert found["order"] == dijkstra["order"]
+        assert found["path"][0] == start and found["path"][-1] == end
+        assert graph.find_path_with_waypoints(start, waypoints, end, optimize_order=True, algorithm=algorithm)
+
+    graph.optimize_waypoint_order(start, waypoints, end)
+    combined = graph.last_query_stats["nodes_settled"]
+    graph.find_path_with_waypoints(start, dijkstra["order"], end)
+    legs_only = graph.last_query_stats["nodes_settled"]
+    # The multi-target searches settle nodes the legs never touch
+    assert combined > legs_only
+
+
+def test_large_exact_limit_falls_back_to_heuristic():
+    graph = build(random_geometric(6000, seed=17))
+    start, end, *waypoints = [int(v) for v in np.random.default_rng(18).choice(graph.node_count, 19, replace=False)]
+    found = graph.optimize_waypoint_order(start, waypoints, end, exact_limit=20)
+    assert not found["exact"]
+    assert sorted(found["order"]) == sorted(waypoints)
@@ -0,0 +1,46 @@
+#pragma once
+#include <atomic>
+#include <exception>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+using namespace std;
+
+// Number of workers to use when the caller asks for `requested` (0 means
+// one per hardware thread), never more than there are tasks.
+inline int resolveThreadCount(int requested, size_t tasks) {
+    int threads = requested > 0 ? requested : (int)thread::hardware_concurrency();
+    if (threads < 1) threads = 1;
+    if ((size_t)threads > tasks) threads = tasks > 0 ? (int)tasks : 1;
+    return threads;
+}
+
+// Runs task(index, worker) for every index in [0, count) on a pool of
+// `threads` workers (the calling thread is one of them). Workers pull the
+// next index from a shared counter, so uneven tasks balance themselves.
+// The first exception thrown by a task is rethrown once all workers stop.
+inline void parallelFor(size_t count, int threads, const function<void(size_t, int)>& task) {
+    threads = resolveThreadCount(threads, count);
+    atomic<size_t> next(0);
+    exception_ptr error;
+    mutex error_lock;
+
+    auto worker = [&](int id) {
+        for (size_t i = next++; i < count; i = next++) {
+            try {
+                task(i, id);
+            } catch (...) {
+                lock_guard<mutex> guard(error_lock);
+                if (!error) error = current_exception();
+                next = count;
+            }
+        }
+    };
+
+    vector<thread> pool;
+    for (int id = 1; id < threads; id++) pool.emplace_back(worker, id);
+    worker(0);
+    for (thread& t : pool) t.join();
+    if (error) rethrow_exception(error);
+}
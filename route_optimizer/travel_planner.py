@@ -1,9 +1,14 @@
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
+import asyncio
 import requests
-import time
 import json 
+from async_fetcher import AsyncRouteFetcher
+from response_cache import shared_cache
+from rate_limit import limiter_for
+from simplify import build_levels, pick_level
+from rail import rail_network
 
 # Initialize session state for map_data, route_info, and last_error
 if 'map_data' not in st.session_state:
@@ -18,25 +23,29 @@ class RouteDataFetcher:
         self.base_url = "http://router.project-osrm.org/route/v1/driving/"
         self.geocode_url = "https://nominatim.openstreetmap.org/search"
         self.user_agent = "SmartTravelPlanner/1.0"
-        self.last_request = 0
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = self.user_agent
+        self.cache = shared_cache()
 
     def geocode(self, location):
+        cached = self.cache.get('geocode', location)
+        if cached is not None:
+            lon, lat = cached.split(',')
+            return float(lat), float(lon)
+
         # Rate limiting to avoid hitting API limits
-        time_since_last = time.time() - self.last_request
-        if time_since_last < 1.0:
-            time.sleep(1.0 - time_since_last)
-        
+        limiter_for(self.geocode_url).acquire()
         try:
-            response = requests.get(
+            response = self.session.get(
                 self.geocode_url,
-                params={'q': location, 'format': 'json', 'limit': 1},
-                headers={'User-Agent': self.user_agent}
+                params={'q': location, 'format': 'json', 'limit': 1}
             )
-            self.last_request = time.time()
             
             if response.status_code == 200:
                 data = response.json()
                 if data and isinstance(data, list) and len(data) > 0: # Ensure data is a non-empty list
+                    # Stored as "lon,lat" like data_fetcher so both apps share entries
+                    self.cache.put('geocode', location, f"{data[0]['lon']},{data[0]['lat']}")
                     return float(data[0]['lat']), float(data[0]['lon'])
             st.session_state.last_error = f"Geocoding failed: Location not found or invalid response for '{location}'"
             return None
@@ -59,10 +68,16 @@ class RouteDataFetcher:
             return None
             
         url = f"{self.base_url}{origin_coords[1]},{origin_coords[0]};{dest_coords[1]},{dest_coords[0]}?overview=full&geometries=geojson" # Added geometries=geojson for clarity
+        cached = self.cache.get('route', url)
+        if cached is not None:
+            return cached
         try:
-            response = requests.get(url, headers={'User-Agent': self.user_agent})
+            limiter_for(url).acquire()
+            response = self.session.get(url)
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                self.cache.put('route', url, data)
+                return data
             elif response.status_code == 400:
                  st.session_state.last_error = f"OSRM API error 400: Bad request. Often means no route found or invalid coordinates. Response: {response.text}"
                  return None
@@ -82,22 +97,31 @@ class RouteDataFetcher:
             st.session_state.last_error = f"An unexpected error occurred during route fetching: {e}"
             return None
 
-# Predefined train routes
-TRAIN_ROUTES = {
-    ("delhi", "mumbai"): ["Delhi", "Mathura", "Kota", "Ratlam", "Mumbai"],
-    ("delhi", "kolkata"): ["Delhi", "Kanpur", "Prayagraj", "Patna", "Asansol", "Kolkata"],
-    ("mumbai", "chennai"): ["Mumbai", "Pune", "Solapur", "Guntakal", "Chennai"],
-}
+async def geocode_all(locations):
+    """(lat, lon) of every location, geocoded concurrently over one pooled session"""
+    async with AsyncRouteFetcher(user_agent="SmartTravelPlanner/1.0") as fetcher:
+        coords = await fetcher.geocode_many(locations)
+    return [(float(lat), float(lon)) for lon, lat in (c.split(',') for c in coords)]
+
+# Road geometry is simplified to stay within a pixel of the true line at
+# this zoom (roughly city level)
+ROAD_DETAIL_ZOOM = 12
 
 def show_map(route_type, locations, names=None):
+    """Build the Folium map; returns the road detail levels (None for other modes)"""
     if not locations:
         st.session_state.map_data = None # Clear map if no locations
-        return
+        return None
     
     m = folium.Map(location=locations[0], zoom_start=6)
+    levels = None
     
     if route_type == "road":
-        folium.PolyLine(locations, color="green", weight=5).add_to(m)
+        # overview=full can be tens of thousands of points; only ship the
+        # ones visible at ROAD_DETAIL_ZOOM
+        levels = build_levels(locations)
+        level = pick_level(levels, ROAD_DETAIL_ZOOM)
+        folium.PolyLine(level["points"].tolist(), color="green", weight=5).add_to(m)
     elif route_type == "train":
         folium.PolyLine(locations, color="blue", weight=5).add_to(m)
         if names:
@@ -111,6 +135,7 @@ def show_map(route_type, locations, names=None):
     
     # Store the Folium map object in session state for persistence
     st.session_state.map_data = m
+    return levels
 
 def main():
     st.set_page_config(page_title="Travel Planner", layout="centered")
@@ -138,26 +163,20 @@ def main():
             
         with st.spinner(f"Finding {mode.lower()} route..."):
             if mode == "Train":
-                route = TRAIN_ROUTES.get((origin.lower(), destination.lower())) or \
-                        TRAIN_ROUTES.get((destination.lower(), origin.lower()))[::-1]
-                if not route:
-                    st.session_state.last_error = "No train route found for these cities."
-                    return
+                # Stations and links are local, so this is one in-memory
+                # search with no geocoding or network calls
+                try:
+                    journey = rail_network().route(origin, destination)
+                except Exception as e:
+                    st.session_state.last_error = str(e)
+                    journey = None
                 
-                coords = []
-                valid_stops = []
-                for stop in route:
-                    coord = fetcher.geocode(stop)
-                    if coord:
-                        coords.append(coord)
-                        valid_stops.append(stop)
-                    
-                if len(coords) >= 2:
-                    show_map("train", coords, valid_stops)
-                    st.session_state.route_info = f"Train Route: {' → '.join(valid_stops)}"
-                else:
-                    if st.session_state.last_error is None: 
-                        st.session_state.last_error = "Could not map train route (insufficient valid stops or geocoding issues)."
+                if journey:
+                    show_map("train", journey['coords'], journey['stations'])
+                    corridors = f"\nVia: {' → '.join(journey['corridors'])}" if len(journey['corridors']) > 1 else ""
+                    st.session_state.route_info = (f"Train Route: {' → '.join(journey['stations'])}"
+                                                   f"\nDistance: ~{journey['distance']/1000:.0f} km | Time: ~{journey['time']/3600:.1f} hours"
+                                                   f"{corridors}")
             
             elif mode == "Road":
                 route_data = fetcher.get_route(origin, destination)
@@ -176,16 +195,21 @@ def main():
                     distance = route_data['routes'][0]['distance']/1000
                     duration = route_data['routes'][0]['duration']/60
                     
-                    show_map("road", coords)
-                    st.session_state.route_info = f"Road Route: {origin} → {destination}\nDistance: {distance:.1f} km | Time: {duration:.1f} minutes"
+                    levels = show_map("road", coords)
+                    dropped = ", ".join(f"z{level['zoom']}: -{level['dropped']}" for level in levels)
+                    st.session_state.route_info = (f"Road Route: {origin} → {destination}\nDistance: {distance:.1f} km | Time: {duration:.1f} minutes"
+                                                   f"\nMap points: {len(coords)} (dropped per zoom level {dropped})")
                 else:
                     # Only set generic error if no specific API error was captured by get_route
                     if st.session_state.last_error is None: 
                         st.session_state.last_error = "Could not find road route, or OSRM response was malformed/empty for coordinates."
             
             elif mode == "Flight":
-                origin_coords = fetcher.geocode(origin)
-                dest_coords = fetcher.geocode(destination)
+                try:
+                    origin_coords, dest_coords = asyncio.run(geocode_all([origin, destination]))
+                except Exception as e:
+                    st.session_state.last_error = f"Geocoding failed: {e}"
+                    origin_coords = dest_coords = None
                 
                 if origin_coords and dest_coords:
                     # Simple straight-line distance and estimated flight time for demo